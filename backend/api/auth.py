@@ -1,24 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from database import get_db
 from models import User
 from schemas import UserCreate, UserLogin, TokenResponse, UserResponse, UserUpdate
-from services.auth_service import AuthService
+from services.auth_service import AuthService, UserSnapshot, token_cache, user_claims
 from config import settings
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     
     # Check if user already exists
-    existing_user = db.query(User).filter(
-        (User.email == user_data.email) | (User.username == user_data.username)
-    ).first()
+    existing_user = await db.scalar(
+        select(User).where(
+            (User.email == user_data.email) | (User.username == user_data.username)
+        ).limit(1)
+    )
     
     if existing_user:
         raise HTTPException(
@@ -27,7 +30,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = AuthService.hash_password(user_data.password)
+    hashed_password = await AuthService.hash_password_async(user_data.password)
     user = User(
         email=user_data.email,
         username=user_data.username,
@@ -35,19 +38,19 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user and return tokens"""
     
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     
-    if not user or not AuthService.verify_password(credentials.password, user.password_hash):
+    if not user or not await AuthService.verify_password_async(credentials.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -61,7 +64,7 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     
     # Create tokens
     access_token = AuthService.create_access_token(
-        data={"sub": str(user.id), "email": user.email}
+        data=user_claims(user)
     )
     refresh_token = AuthService.create_refresh_token(
         data={"sub": str(user.id)}
@@ -75,7 +78,7 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(token_data: dict):
+async def refresh_token(token_data: dict, db: AsyncSession = Depends(get_db)):
     """Refresh access token using refresh token"""
     
     payload = AuthService.verify_token(token_data.get("refresh_token", ""))
@@ -86,9 +89,17 @@ async def refresh_token(token_data: dict):
             detail="Invalid refresh token"
         )
     
-    user_id = payload.get("sub")
+    # Reload the user so the new token carries current claims
+    user = await db.get(User, int(payload.get("sub")))
+    
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+    
     access_token = AuthService.create_access_token(
-        data={"sub": user_id}
+        data=user_claims(user)
     )
     
     return {
@@ -100,9 +111,14 @@ async def refresh_token(token_data: dict):
 
 async def get_current_user(
     authorization: str = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current user from JWT token"""
+    db: AsyncSession = Depends(get_db)
+) -> UserSnapshot:
+    """Get current user from JWT token
+
+    Verified tokens are cached for TOKEN_CACHE_TTL seconds. With
+    AUTH_TRUST_TOKEN_CLAIMS the user is built from the token's signed claims
+    and the database is not queried at all.
+    """
     
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
@@ -111,6 +127,11 @@ async def get_current_user(
         )
     
     token = authorization.replace("Bearer ", "")
+    
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     payload = AuthService.verify_token(token)
     
     if not payload:
@@ -119,13 +140,26 @@ async def get_current_user(
             detail="Invalid token"
         )
     
-    user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    
-    if not user:
+    if settings.AUTH_TRUST_TOKEN_CLAIMS and "plan" in payload and "is_active" in payload:
+        current_user = UserSnapshot.from_claims(payload)
+    else:
+        user_id = payload.get("sub")
+        user = await db.get(User, int(user_id))
+        
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        current_user = UserSnapshot.from_user(user)
+    
+    if not current_user.is_active:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is inactive"
         )
     
-    return user
+    token_cache.set(token, current_user, payload.get("exp"))
+    
+    return current_user
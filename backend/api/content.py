@@ -1,32 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.background import BackgroundTask
+from typing import List, Optional
+import asyncio
+import json
 import os
 
+from config import settings
 from database import get_db
-from models import Content, User
-from schemas import ContentCreate, ContentResponse, ContentUpdate
-from services.content_service import ContentParser, FileHandler
+from models import Content, ContentSignature
+from schemas import (
+    BulkContentCreate, ContentCreate, ContentResponse, ContentSearchResult, ContentSummary, ContentUpdate
+)
+from services.content_service import ContentParser, FileHandler, FileTooLargeError
+from services.dedup_service import dedup_index
+from services.digest_service import store_digests
+from services.extraction_service import DocumentExtractor
+from services.ingest_service import BulkIngestor, IngestItem
+from services.pagination import (
+    NEXT_CURSOR_HEADER, InvalidCursorError, excerpt, keyset_page, next_cursor
+)
+from services.search_service import search_service
+from services.url_service import UrlCache, UrlFetcher
 from api.auth import get_current_user
+from services.auth_service import UserSnapshot
 
 router = APIRouter()
-file_handler = FileHandler()
+file_handler = FileHandler(settings.UPLOAD_DIR)
+document_extractor = DocumentExtractor(
+    max_workers=settings.EXTRACTION_WORKERS,
+    timeout=settings.EXTRACTION_TIMEOUT,
+    memory_limit_mb=settings.EXTRACTION_MEMORY_LIMIT_MB,
+    parallel_page_threshold=settings.EXTRACTION_PARALLEL_PAGE_THRESHOLD,
+    pages_per_task=settings.EXTRACTION_PAGES_PER_TASK
+)
+url_fetcher = UrlFetcher(
+    timeout=settings.URL_FETCH_TIMEOUT,
+    max_bytes=settings.URL_FETCH_MAX_BYTES,
+    max_connections=settings.URL_FETCH_MAX_CONNECTIONS,
+    parser=settings.HTML_PARSER,
+    cache=UrlCache(
+        max_bytes=settings.URL_CACHE_MAX_BYTES,
+        freshness=settings.URL_CACHE_FRESHNESS
+    )
+)
+bulk_ingestor = BulkIngestor(
+    url_fetcher,
+    document_extractor,
+    concurrency=settings.BULK_INGEST_CONCURRENCY,
+    batch_size=settings.BULK_INGEST_BATCH_SIZE,
+    dedup_index=dedup_index
+)
+
+
+async def _find_duplicate(db: AsyncSession, user_id: int, signature, response: Response):
+    """The user's near-identical existing content, flagged in the response
+
+    Answers 200 instead of 201 with ``X-Duplicate-Of`` and
+    ``X-Duplicate-Similarity`` headers when a duplicate is found.
+    """
+    match = await dedup_index.find_duplicate(db, user_id, signature)
+    if match is None:
+        return None
+    
+    content_id, similarity = match
+    content = await db.scalar(
+        select(Content).where(
+            Content.id == content_id,
+            Content.user_id == user_id
+        )
+    )
+    if content is None:
+        return None
+    
+    response.status_code = status.HTTP_200_OK
+    response.headers["X-Duplicate-Of"] = str(content.id)
+    response.headers["X-Duplicate-Similarity"] = f"{similarity:.2f}"
+    return content
+
+
+def _signature_row(user_id: int, signature):
+    if signature is None:
+        return None
+    return ContentSignature(user_id=user_id, signature=signature.tobytes())
 
 
 @router.post("/upload", response_model=ContentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_content(
     content_data: ContentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
-    """Upload or input content"""
+    """Upload or input content
+
+    Near-duplicates of the user's existing content return that content
+    (see ``_find_duplicate``) unless ``allow_duplicate`` is set.
+    """
     
     original_content = content_data.original_content
     
     # If URL, extract content
     if content_data.content_type == "url":
         try:
-            original_content = ContentParser.extract_from_url(content_data.original_content)
+            original_content = await url_fetcher.extract(content_data.original_content)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -36,6 +117,12 @@ async def upload_content(
     # Clean content
     original_content = ContentParser.clean_content(original_content)
     
+    signature = await asyncio.to_thread(dedup_index.signature, original_content)
+    if not content_data.allow_duplicate:
+        existing = await _find_duplicate(db, current_user.id, signature, response)
+        if existing is not None:
+            return existing
+    
     # Count words
     word_count = ContentParser.count_words(original_content)
     
@@ -46,43 +133,65 @@ async def upload_content(
         original_content=original_content,
         content_type=content_data.content_type,
         source_url=content_data.original_content if content_data.content_type == "url" else None,
-        word_count=word_count
+        word_count=word_count,
+        digest=None,
+        signature=_signature_row(current_user.id, signature)
     )
     
     db.add(content)
-    db.commit()
-    db.refresh(content)
+    await db.commit()
+    await db.refresh(content)
+    dedup_index.add(current_user.id, content.id, signature)
+    
+    background_tasks.add_task(store_digests, [content.id])
     
     return content
 
 
 @router.post("/upload-file", response_model=ContentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(
+    response: Response,
+    background_tasks: BackgroundTasks,
     title: str = None,
+    allow_duplicate: bool = False,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
-    """Upload file and extract content"""
+    """Upload file and extract content
+
+    Near-duplicates are handled as in ``/upload``.
+    """
     
     # Validate file extension
     file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in ['.txt', '.md', '.pdf', '.docx']:
+    if file_ext not in settings.ALLOWED_FILE_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Unsupported file type. Allowed: .txt, .md, .pdf, .docx"
         )
     
+    # Request bodies over the limit were already refused by
+    # BodySizeLimitMiddleware; the exact file size is checked while copying
     try:
-        # Save file
-        contents = await file.read()
-        file_path = f"{current_user.id}/{file.filename}"
-        full_path = await file_handler.save_uploaded_file(file_path, contents)
+        # Copy the spooled upload into place in chunks, hashing as we go
+        full_path, _, _ = await file_handler.save_upload_stream(
+            file,
+            str(current_user.id),
+            file_ext,
+            settings.MAX_UPLOAD_SIZE
+        )
         
         # Extract text
-        original_content = file_handler.extract_text_from_file(full_path)
+        original_content = await document_extractor.extract(full_path)
         original_content = ContentParser.clean_content(original_content)
         
+        signature = await asyncio.to_thread(dedup_index.signature, original_content)
+        if not allow_duplicate:
+            existing = await _find_duplicate(db, current_user.id, signature, response)
+            if existing is not None:
+                return existing
+        
         # Create content record
         word_count = ContentParser.count_words(original_content)
         content = Content(
@@ -90,14 +199,24 @@ async def upload_file(
             title=title or file.filename,
             original_content=original_content,
             content_type="file",
-            word_count=word_count
+            word_count=word_count,
+            digest=None,
+            signature=_signature_row(current_user.id, signature)
         )
         
         db.add(content)
-        db.commit()
-        db.refresh(content)
+        await db.commit()
+        await db.refresh(content)
+        dedup_index.add(current_user.id, content.id, signature)
+        
+        background_tasks.add_task(store_digests, [content.id])
         
         return content
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -105,34 +224,214 @@ async def upload_file(
         )
 
 
-@router.get("/", response_model=List[ContentResponse])
+def _ndjson_stream(user_id: int, items: List[IngestItem]) -> StreamingResponse:
+    """Stream bulk ingest results as newline-delimited JSON"""
+    
+    # Digests are computed once the response is finished, off the stream
+    created_ids = []
+    
+    async def lines():
+        async for result in bulk_ingestor.run(user_id, items):
+            if result.get("status") == "created":
+                created_ids.append(result["content_id"])
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(store_digests, created_ids)
+    )
+
+
+@router.post("/bulk")
+async def bulk_upload_content(
+    request: BulkContentCreate,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Ingest many texts and URLs in one request
+
+    Streams one JSON line per item as it is saved, found to duplicate
+    existing content or fails, in completion order, followed by a
+    ``summary`` line.
+    """
+    
+    if len(request.items) > settings.BULK_INGEST_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_INGEST_MAX_ITEMS} items per request"
+        )
+    
+    items = []
+    for index, item in enumerate(request.items):
+        if item.content_type not in ("text", "url"):
+            items.append(IngestItem(index, item.content_type, None, error="content_type must be text or url"))
+        else:
+            items.append(IngestItem(
+                index,
+                item.content_type,
+                item.original_content,
+                title=item.title,
+                allow_duplicate=request.allow_duplicate or item.allow_duplicate
+            ))
+    
+    return _ndjson_stream(current_user.id, items)
+
+
+@router.post("/bulk-upload")
+async def bulk_upload_files(
+    allow_duplicate: bool = False,
+    file: UploadFile = File(...),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Ingest every supported file in a zip archive
+
+    Streams results in the same format as ``/bulk``; each item's index is
+    the file's position in the archive.
+    """
+    
+    if os.path.splitext(file.filename)[1].lower() != ".zip":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload a .zip archive"
+        )
+    
+    try:
+        zip_path, _, _ = await file_handler.save_upload_stream(
+            file,
+            str(current_user.id),
+            ".zip",
+            settings.MAX_UPLOAD_SIZE
+        )
+        members = await asyncio.to_thread(
+            file_handler.unpack_zip,
+            zip_path,
+            str(current_user.id),
+            settings.ALLOWED_FILE_EXTENSIONS,
+            settings.BULK_INGEST_MAX_ITEMS,
+            settings.BULK_ZIP_MAX_UNCOMPRESSED,
+            settings.MAX_UPLOAD_SIZE
+        )
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing archive: {str(e)}"
+        )
+    
+    items = [
+        IngestItem(
+            index,
+            "file",
+            member["path"],
+            title=member["filename"],
+            error=member["error"],
+            allow_duplicate=allow_duplicate
+        )
+        for index, member in enumerate(members)
+    ]
+    
+    return _ndjson_stream(current_user.id, items)
+
+
+# Columns of ContentSummary, without the full text
+CONTENT_SUMMARY_COLUMNS = (
+    Content.id,
+    Content.user_id,
+    Content.title,
+    excerpt(Content.original_content),
+    Content.content_type,
+    Content.source_url,
+    Content.word_count,
+    Content.created_at,
+    Content.updated_at,
+)
+
+
+@router.get("/", response_model=List[ContentSummary])
 async def list_content(
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
-    """List user's content"""
+    """List user's content, newest first
+
+    Returns excerpts; the full text comes from ``GET /{content_id}``. Pass
+    the ``X-Next-Cursor`` response header as ``cursor`` for the next page.
+    """
     
-    contents = db.query(Content).filter(
-        Content.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    query = select(*CONTENT_SUMMARY_COLUMNS).where(Content.user_id == current_user.id)
+    
+    try:
+        query = keyset_page(query, Content.created_at, Content.id, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    contents, cursor = next_cursor((await db.execute(query)).all(), limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     
     return contents
 
 
+@router.get("/search", response_model=List[ContentSearchResult])
+async def search_content(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Search the user's content by title and text, best matches first"""
+    
+    if not search_service.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not supported on this database"
+        )
+    
+    try:
+        results, cursor = await search_service.search(
+            db,
+            Content,
+            Content.original_content,
+            CONTENT_SUMMARY_COLUMNS,
+            [Content.user_id == current_user.id],
+            q,
+            cursor,
+            limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    
+    return results
+
+
 @router.get("/{content_id}", response_model=ContentResponse)
 async def get_content(
     content_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Get specific content"""
     
-    content = db.query(Content).filter(
-        Content.id == content_id,
-        Content.user_id == current_user.id
-    ).first()
+    content = await db.scalar(
+        select(Content).where(
+            Content.id == content_id,
+            Content.user_id == current_user.id
+        )
+    )
     
     if not content:
         raise HTTPException(
@@ -140,6 +439,10 @@ async def get_content(
             detail="Content not found"
         )
     
+    # Content stored before digests existed gets one on first read
+    if content.digest is None:
+        background_tasks.add_task(store_digests, [content.id])
+    
     return content
 
 
@@ -147,15 +450,17 @@ async def get_content(
 async def update_content(
     content_id: int,
     content_update: ContentUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Update content"""
     
-    content = db.query(Content).filter(
-        Content.id == content_id,
-        Content.user_id == current_user.id
-    ).first()
+    content = await db.scalar(
+        select(Content).where(
+            Content.id == content_id,
+            Content.user_id == current_user.id
+        )
+    )
     
     if not content:
         raise HTTPException(
@@ -166,8 +471,8 @@ async def update_content(
     if content_update.title:
         content.title = content_update.title
     
-    db.commit()
-    db.refresh(content)
+    await db.commit()
+    await db.refresh(content)
     
     return content
 
@@ -175,15 +480,17 @@ async def update_content(
 @router.delete("/{content_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_content(
     content_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Delete content"""
     
-    content = db.query(Content).filter(
-        Content.id == content_id,
-        Content.user_id == current_user.id
-    ).first()
+    content = await db.scalar(
+        select(Content).where(
+            Content.id == content_id,
+            Content.user_id == current_user.id
+        ).options(selectinload(Content.generations), selectinload(Content.signature))
+    )
     
     if not content:
         raise HTTPException(
@@ -191,7 +498,8 @@ async def delete_content(
             detail="Content not found"
         )
     
-    db.delete(content)
-    db.commit()
+    await db.delete(content)
+    await db.commit()
+    dedup_index.remove(current_user.id, content_id)
     
     return None
@@ -1,30 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import func, null, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
 
-from database import get_db
-from models import Content, Generation, User
-from schemas import GenerationCreate, GenerationResponse, RegenerateRequest, BatchGenerationResponse
+from config import settings
+from database import get_db, AsyncSessionLocal
+from models import Content, Generation, BrandVoice
+from schemas import (
+    GenerationCreate, GenerationResponse, GenerationSearchResult, GenerationSummary,
+    RegenerateRequest, BatchGenerationResponse, BatchGenerationCreate, JobResponse
+)
 from services.ai_service import AIService
+from services.token_service import TokenUsage
+from services.job_service import Job, JobQueue, JobQueueFull, insert_generations
+from services.search_service import search_service
+from services.usage_service import QuotaExceeded, Reservation, usage_meter
+from services.pagination import (
+    NEXT_CURSOR_HEADER, InvalidCursorError, excerpt, keyset_page, next_cursor
+)
 from api.auth import get_current_user
+from services.auth_service import UserSnapshot
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 ai_service = AIService()
+job_queue = JobQueue(ai_service)
 
 
-@router.post("/repurpose", response_model=BatchGenerationResponse)
-async def repurpose_content(
-    request: GenerationCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Generate repurposed content for multiple platforms"""
+async def _get_content_and_brand_voice(db: AsyncSession, request: GenerationCreate, current_user: UserSnapshot):
+    """Load the requested content and brand voice instructions for a user"""
     
     # Get content
-    content = db.query(Content).filter(
-        Content.id == request.content_id,
-        Content.user_id == current_user.id
-    ).first()
+    content = await db.scalar(
+        select(Content).where(
+            Content.id == request.content_id,
+            Content.user_id == current_user.id
+        )
+    )
     
     if not content:
         raise HTTPException(
@@ -32,47 +50,79 @@ async def repurpose_content(
             detail="Content not found"
         )
     
-    # Get brand voice if specified
-    brand_voice_text = None
-    if request.brand_voice_id:
-        brand_voice = db.query(BrandVoice).filter(
-            BrandVoice.id == request.brand_voice_id,
+    brand_voice_text = await _get_brand_voice_text(db, request.brand_voice_id, current_user)
+    
+    return content, brand_voice_text
+
+
+async def _get_brand_voice_text(db: AsyncSession, brand_voice_id: int, current_user: UserSnapshot):
+    """Load a user's brand voice instructions, if one is specified"""
+    
+    if not brand_voice_id:
+        return None
+    
+    brand_voice = await db.scalar(
+        select(BrandVoice).where(
+            BrandVoice.id == brand_voice_id,
             BrandVoice.user_id == current_user.id
-        ).first()
-        if brand_voice:
-            brand_voice_text = brand_voice.instructions
+        )
+    )
+    return brand_voice.instructions if brand_voice else None
+
+
+@router.post("/repurpose", response_model=BatchGenerationResponse)
+async def repurpose_content(
+    request: GenerationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Generate repurposed content for multiple platforms"""
+    
+    content, brand_voice_text = await _get_content_and_brand_voice(db, request, current_user)
+    
+    platforms = list(dict.fromkeys(request.platforms))
+    reservation = await _reserve_generations(current_user, len(platforms))
     
     # Generate content
+    usage = {}
     try:
         results = await ai_service.generate_repurposed_content(
             original_content=content.original_content,
-            platforms=request.platforms,
+            platforms=platforms,
             tone=request.tone,
-            brand_voice=brand_voice_text
+            brand_voice=brand_voice_text,
+            use_cache=request.use_cache,
+            mode=request.generation_mode,
+            usage=usage
         )
     except Exception as e:
+        usage_meter.settle(reservation, len(platforms), 0, usage.values())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating content: {str(e)}"
         )
     
     # Save generations
-    generations = []
-    for platform, generated_data in results.items():
-        if "error" not in generated_data:
-            generation = Generation(
-                content_id=content.id,
-                user_id=current_user.id,
-                platform=platform,
-                generated_text=str(generated_data),
-                tone=request.tone,
-                brand_voice_id=request.brand_voice_id,
-                platform_metadata=generated_data
-            )
-            db.add(generation)
-            generations.append(generation)
-    
-    db.commit()
+    try:
+        generations = await insert_generations(db, [
+            {
+                "content_id": content.id,
+                "user_id": current_user.id,
+                "platform": platform,
+                "output": generated_data,
+                "tone": request.tone,
+                "brand_voice_id": request.brand_voice_id,
+                **usage[platform].as_dict(),
+            }
+            for platform, generated_data in results.items()
+            if "error" not in generated_data
+        ])
+        
+        await db.commit()
+    except Exception:
+        usage_meter.settle(reservation, len(platforms), 0, usage.values())
+        raise
+    usage_meter.settle(reservation, len(platforms), len(generations), usage.values())
     
     return {
         "content_id": content.id,
@@ -81,20 +131,314 @@ async def repurpose_content(
     }
 
 
+@router.post("/repurpose/stream")
+async def stream_repurpose_content(
+    request: GenerationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Stream generated content for multiple platforms as server-sent events
+
+    Emits ``token`` events (``{"platform", "delta"}``) as the model writes,
+    a ``result`` event (``{"platform", "generation_id", "result"}``) once a
+    platform's output is parsed and saved, ``error`` events for failed
+    platforms and a final ``done`` event.
+    """
+    
+    content, brand_voice_text = await _get_content_and_brand_voice(db, request, current_user)
+    
+    reservation = await _reserve_generations(current_user, len(set(request.platforms)))
+    
+    # Started here rather than in the stream, which never runs if the
+    # client disconnects before the response starts
+    events, producer = _start_generations(
+        reservation,
+        content_id=content.id,
+        original_content=content.original_content,
+        request=request,
+        brand_voice_text=brand_voice_text
+    )
+    
+    return StreamingResponse(
+        _stream_events(events, producer, content.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Runs after the response, also after a disconnect
+        background=BackgroundTask(producer.cancel)
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _start_generations(
+    reservation: Reservation,
+    content_id: int,
+    original_content: str,
+    request: GenerationCreate,
+    brand_voice_text: str = None
+) -> Tuple[asyncio.Queue, asyncio.Task]:
+    """Start generating for each platform, returning the SSE event queue and the producer task
+
+    The queue ends with None. The reservation is settled once the
+    producer is done, even if it is cancelled before it starts.
+    """
+    
+    platforms = list(dict.fromkeys(request.platforms))
+    events = asyncio.Queue()
+    usages = {platform: TokenUsage() for platform in platforms}
+    saved = set()
+    
+    def settle(producer: asyncio.Task) -> None:
+        usage_meter.settle(reservation, len(platforms), len(saved), usages.values())
+        events.put_nowait(None)
+        if not producer.cancelled() and producer.exception():
+            logger.error(f"Streaming generations failed: {str(producer.exception())}")
+    
+    producer = asyncio.create_task(_produce_generations(
+        events, usages, saved, content_id, reservation.user_id, original_content, request, brand_voice_text
+    ))
+    producer.add_done_callback(settle)
+    return events, producer
+
+
+async def _produce_generations(
+    events: asyncio.Queue,
+    usages: Dict[str, TokenUsage],
+    saved: Set[str],
+    content_id: int,
+    user_id: int,
+    original_content: str,
+    request: GenerationCreate,
+    brand_voice_text: str = None
+) -> None:
+    """Put SSE events for each platform in ``usages`` on ``events``
+
+    Adds the platforms whose generation was saved to ``saved``.
+    """
+    
+    semaphore = asyncio.Semaphore(max(1, settings.GENERATION_CONCURRENCY))
+    
+    async def produce(platform: str):
+        usage = usages[platform]
+        async with semaphore:
+            async for kind, value in ai_service.stream_for_platform(
+                original_content,
+                platform,
+                request.tone,
+                brand_voice_text,
+                use_cache=request.use_cache,
+                usage=usage
+            ):
+                if kind == "token":
+                    await events.put(_sse("token", {"platform": platform, "delta": value}))
+                elif kind == "error":
+                    await events.put(_sse("error", {"platform": platform, "error": value}))
+                else:
+                    try:
+                        generation_id = await _save_generation(
+                            content_id, user_id, platform, value, request.tone, request.brand_voice_id, usage
+                        )
+                    except Exception as e:
+                        # Not saved, so not counted: the stream goes on for the other platforms
+                        logger.error(f"Saving the {platform} generation failed: {str(e)}")
+                        await events.put(_sse("error", {
+                            "platform": platform,
+                            "error": "The generation could not be saved"
+                        }))
+                        continue
+                    saved.add(platform)
+                    await events.put(_sse("result", {
+                        "platform": platform,
+                        "generation_id": generation_id,
+                        "result": value
+                    }))
+    
+    # Waits for every platform, also when one fails or all are cancelled
+    results = await asyncio.gather(*(produce(platform) for platform in usages), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def _stream_events(events: asyncio.Queue, producer: asyncio.Task, content_id: int):
+    """Relay the producer's events as one SSE stream"""
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        yield _sse("done", {"content_id": content_id})
+    finally:
+        # Client disconnected or stream finished: stop any in-flight calls
+        producer.cancel()
+
+
+async def _save_generation(
+    content_id: int,
+    user_id: int,
+    platform: str,
+    generated_data: dict,
+    tone: str,
+    brand_voice_id: int = None,
+    usage: TokenUsage = None
+) -> int:
+    """Persist one streamed generation with its own session"""
+    async with AsyncSessionLocal() as db:
+        generation, = await insert_generations(db, [{
+            "content_id": content_id,
+            "user_id": user_id,
+            "platform": platform,
+            "output": generated_data,
+            "tone": tone,
+            "brand_voice_id": brand_voice_id,
+            **(usage or TokenUsage()).as_dict(),
+        }])
+        await db.commit()
+        return generation.id
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(
+    request: GenerationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Queue a repurposing job and return its id for polling"""
+    
+    content, brand_voice_text = await _get_content_and_brand_voice(db, request, current_user)
+    
+    job = Job(
+        user_id=current_user.id,
+        contents={content.id: content.original_content},
+        platforms=request.platforms,
+        tone=request.tone,
+        brand_voice_id=request.brand_voice_id,
+        brand_voice=brand_voice_text,
+        use_cache=request.use_cache,
+        generation_mode=request.generation_mode
+    )
+    
+    return await _submit_job(job, current_user)
+
+
+@router.post("/batch", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_batch_generation_job(
+    request: BatchGenerationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Queue generation of several contents for several platforms as one job
+
+    Poll progress with ``GET /jobs/{job_id}``.
+    """
+    
+    content_ids = list(dict.fromkeys(request.content_ids))
+    platforms = list(dict.fromkeys(request.platforms))
+    
+    if len(content_ids) * len(platforms) > settings.BATCH_GENERATION_MAX_TASKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {settings.BATCH_GENERATION_MAX_TASKS} content/platform pairs"
+        )
+    
+    rows = (await db.execute(
+        select(Content.id, Content.original_content).where(
+            Content.id.in_(content_ids),
+            Content.user_id == current_user.id
+        )
+    )).all()
+    found = {row.id: row.original_content for row in rows}
+    
+    missing = [content_id for content_id in content_ids if content_id not in found]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Content not found: {', '.join(str(content_id) for content_id in missing)}"
+        )
+    
+    brand_voice_text = await _get_brand_voice_text(db, request.brand_voice_id, current_user)
+    
+    job = Job(
+        user_id=current_user.id,
+        contents={content_id: found[content_id] for content_id in content_ids},
+        platforms=platforms,
+        tone=request.tone,
+        brand_voice_id=request.brand_voice_id,
+        brand_voice=brand_voice_text,
+        use_cache=request.use_cache,
+        generation_mode=request.generation_mode,
+        concurrency=settings.LLM_MAX_CONCURRENCY
+    )
+    
+    return await _submit_job(job, current_user)
+
+
+async def _reserve_generations(current_user: UserSnapshot, count: int) -> Reservation:
+    """Count generations against the user's plan quota, answering 429 when it is used up"""
+    try:
+        return await usage_meter.reserve(current_user.id, current_user.plan, count)
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+async def _submit_job(job: Job, current_user: UserSnapshot) -> Job:
+    """Reserve a job's generations and queue it, answering 503 when the queue is full
+
+    The job worker settles the reservation when the job finishes.
+    """
+    job.reservation = await _reserve_generations(current_user, len(job.tasks))
+    try:
+        return job_queue.submit(job)
+    except JobQueueFull as e:
+        usage_meter.release(job.reservation, len(job.tasks))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_generation_job(
+    job_id: str,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Get progress and per-platform results of a generation job"""
+    
+    job = job_queue.get(job_id, current_user.id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job
+
+
 @router.post("/regenerate/{generation_id}", response_model=GenerationResponse)
 async def regenerate_content(
     generation_id: int,
     request: RegenerateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Regenerate a specific generated content"""
     
     # Get existing generation
-    generation = db.query(Generation).filter(
-        Generation.id == generation_id,
-        Generation.user_id == current_user.id
-    ).first()
+    generation = await db.scalar(
+        select(Generation).where(
+            Generation.id == generation_id,
+            Generation.user_id == current_user.id
+        )
+    )
     
     if not generation:
         raise HTTPException(
@@ -103,7 +447,7 @@ async def regenerate_content(
         )
     
     # Get original content
-    content = db.query(Content).filter(Content.id == generation.content_id).first()
+    content = await db.get(Content, generation.content_id)
     
     if not content:
         raise HTTPException(
@@ -117,70 +461,172 @@ async def regenerate_content(
     # Get brand voice if exists
     brand_voice_text = None
     if generation.brand_voice_id:
-        from models import BrandVoice
-        brand_voice = db.query(BrandVoice).filter(
-            BrandVoice.id == generation.brand_voice_id
-        ).first()
+        brand_voice = await db.get(BrandVoice, generation.brand_voice_id)
         if brand_voice:
             brand_voice_text = brand_voice.instructions
     
-    # Regenerate
+    reservation = await _reserve_generations(current_user, 1)
+    
+    # Regenerate (always a fresh sample, bypassing the generation cache)
+    usage = {}
     try:
         results = await ai_service.generate_repurposed_content(
             original_content=content.original_content,
             platforms=[generation.platform],
             tone=tone,
-            brand_voice=brand_voice_text
+            brand_voice=brand_voice_text,
+            use_cache=False,
+            usage=usage
         )
     except Exception as e:
+        usage_meter.settle(reservation, 1, 0, usage.values())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error regenerating content: {str(e)}"
         )
     
+    result = results.get(generation.platform) or {"error": "No content was generated"}
+    if "error" in result:
+        # Keep the existing output; the failed attempt doesn't count
+        usage_meter.settle(reservation, 1, 0, usage.values())
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error regenerating content: {result['error']}"
+        )
+    
     # Update generation
-    generation.generated_text = str(results.get(generation.platform, {}))
+    generation.output = result
     generation.tone = tone
-    generation.platform_metadata = results.get(generation.platform, {})
+    # Rows from before JSON storage carry the old output in the legacy columns
+    generation.legacy_text = ""
+    generation.platform_metadata = null()
+    generation.prompt_tokens = usage[generation.platform].prompt_tokens
+    generation.completion_tokens = usage[generation.platform].completion_tokens
     
-    db.commit()
-    db.refresh(generation)
+    await db.commit()
+    usage_meter.settle(reservation, 1, 1, usage.values())
+    await db.refresh(generation)
     
     return generation
 
 
-@router.get("/history", response_model=List[GenerationResponse])
+# Where the rendered text of each platform's output starts (see
+# utils.render_output), so list excerpts don't need the whole output
+OUTPUT_LEAD_PATHS = (
+    ("post",),
+    ("caption",),
+    ("tweets", 0, "text"),
+    ("hook",),
+    ("body",),
+    ("tldr",),
+    ("content",),
+)
+
+# Columns of GenerationSummary, without the full output
+GENERATION_SUMMARY_COLUMNS = (
+    Generation.id,
+    Generation.content_id,
+    Generation.platform,
+    excerpt(func.coalesce(
+        *(Generation.output[path].as_string() for path in OUTPUT_LEAD_PATHS),
+        Generation.legacy_text
+    )),
+    Generation.tone,
+    Generation.prompt_tokens,
+    Generation.completion_tokens,
+    Generation.created_at,
+)
+
+
+@router.get("/history", response_model=List[GenerationSummary])
 async def get_generation_history(
-    skip: int = 0,
-    limit: int = 50,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     platform: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
-    """Get generation history"""
+    """Get generation history, newest first
+
+    Returns excerpts; the full output comes from ``GET /{generation_id}``.
+    Pass the ``X-Next-Cursor`` response header as ``cursor`` for the next
+    page.
+    """
     
-    query = db.query(Generation).filter(Generation.user_id == current_user.id)
+    query = select(*GENERATION_SUMMARY_COLUMNS).where(Generation.user_id == current_user.id)
     
     if platform:
-        query = query.filter(Generation.platform == platform)
+        query = query.where(Generation.platform == platform)
+    
+    try:
+        query = keyset_page(query, Generation.created_at, Generation.id, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    generations = query.offset(skip).limit(limit).all()
+    generations, cursor = next_cursor((await db.execute(query)).all(), limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     
     return generations
 
 
+@router.get("/search", response_model=List[GenerationSearchResult])
+async def search_generations(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    platform: str = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Search generated content, best matches first"""
+    
+    if not search_service.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not supported on this database"
+        )
+    
+    filters = [Generation.user_id == current_user.id]
+    if platform:
+        filters.append(Generation.platform == platform)
+    
+    try:
+        results, cursor = await search_service.search(
+            db,
+            Generation,
+            Generation.output,
+            GENERATION_SUMMARY_COLUMNS,
+            filters,
+            q,
+            cursor,
+            limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    
+    return results
+
+
 @router.get("/{generation_id}", response_model=GenerationResponse)
 async def get_generation(
     generation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Get specific generation"""
     
-    generation = db.query(Generation).filter(
-        Generation.id == generation_id,
-        Generation.user_id == current_user.id
-    ).first()
+    generation = await db.scalar(
+        select(Generation).where(
+            Generation.id == generation_id,
+            Generation.user_id == current_user.id
+        )
+    )
     
     if not generation:
         raise HTTPException(
@@ -194,15 +640,17 @@ async def get_generation(
 @router.delete("/{generation_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_generation(
     generation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Delete generation"""
     
-    generation = db.query(Generation).filter(
-        Generation.id == generation_id,
-        Generation.user_id == current_user.id
-    ).first()
+    generation = await db.scalar(
+        select(Generation).where(
+            Generation.id == generation_id,
+            Generation.user_id == current_user.id
+        )
+    )
     
     if not generation:
         raise HTTPException(
@@ -210,7 +658,7 @@ async def delete_generation(
             detail="Generation not found"
         )
     
-    db.delete(generation)
-    db.commit()
+    await db.delete(generation)
+    await db.commit()
     
     return None
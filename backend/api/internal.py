@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+import secrets
+
+from config import settings
+from database import async_engine, pool_metrics
+from api import generate
+
+router = APIRouter()
+
+
+async def require_internal_access(x_internal_token: str = Header(None)):
+    """Allow access with INTERNAL_API_TOKEN, or without a token in DEBUG"""
+    
+    if settings.INTERNAL_API_TOKEN:
+        if x_internal_token and secrets.compare_digest(x_internal_token, settings.INTERNAL_API_TOKEN):
+            return
+    elif settings.DEBUG:
+        return
+    
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Not Found"
+    )
+
+
+@router.get("/db-pool", dependencies=[Depends(require_internal_access)])
+async def get_db_pool_stats():
+    """Connection pool saturation and wait-time statistics"""
+    return pool_metrics.snapshot(async_engine.sync_engine.pool)
+
+
+@router.get("/generation-cache", dependencies=[Depends(require_internal_access)])
+async def get_generation_cache_stats():
+    """Generation cache size and hit rate since startup"""
+    return generate.ai_service.cache.stats()
+
+
+@router.get("/llm-scheduler", dependencies=[Depends(require_internal_access)])
+async def get_llm_scheduler_stats():
+    """Model call slots in use, queue depth and retry counters"""
+    return generate.ai_service.scheduler.stats()
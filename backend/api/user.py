@@ -1,48 +1,78 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from database import get_db
 from models import User, BrandVoice
-from schemas import UserResponse, UserUpdate, BrandVoiceCreate, BrandVoiceResponse, BrandVoiceUpdate
+from schemas import UserResponse, UserUpdate, UsageResponse, BrandVoiceCreate, BrandVoiceResponse, BrandVoiceUpdate
 from api.auth import get_current_user
+from services.auth_service import UserSnapshot, token_cache
+from services.usage_service import usage_meter
 
 router = APIRouter()
 
 
 @router.get("/profile", response_model=UserResponse)
 async def get_profile(
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Get current user profile"""
+    
+    # Token claims don't carry every profile field
+    if current_user.trusted_claims:
+        return await _get_user(db, current_user.id)
+    
     return current_user
 
 
 @router.put("/profile", response_model=UserResponse)
 async def update_profile(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Update user profile"""
     
+    user = await _get_user(db, current_user.id)
+    
     if user_update.username:
-        current_user.username = user_update.username
+        user.username = user_update.username
+    
+    await db.commit()
+    await db.refresh(user)
+    token_cache.invalidate_user(user.id)
+    
+    return user
+
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(current_user: UserSnapshot = Depends(get_current_user)):
+    """Get usage in the current quota window and the plan's limits"""
     
-    if user_update.plan:
-        current_user.plan = user_update.plan
+    return await usage_meter.snapshot(current_user.id, current_user.plan)
+
+
+async def _get_user(db: AsyncSession, user_id: int) -> User:
+    """Load a user row or raise 404"""
     
-    db.commit()
-    db.refresh(current_user)
+    user = await db.get(User, user_id)
     
-    return current_user
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    return user
 
 
 @router.post("/brand-voice", response_model=BrandVoiceResponse, status_code=status.HTTP_201_CREATED)
 async def create_brand_voice(
     brand_voice_data: BrandVoiceCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Create a brand voice template"""
     
@@ -53,22 +83,22 @@ async def create_brand_voice(
     )
     
     db.add(brand_voice)
-    db.commit()
-    db.refresh(brand_voice)
+    await db.commit()
+    await db.refresh(brand_voice)
     
     return brand_voice
 
 
 @router.get("/brand-voices", response_model=List[BrandVoiceResponse])
 async def get_brand_voices(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Get user's brand voice templates"""
     
-    brand_voices = db.query(BrandVoice).filter(
-        BrandVoice.user_id == current_user.id
-    ).all()
+    brand_voices = (await db.scalars(
+        select(BrandVoice).where(BrandVoice.user_id == current_user.id)
+    )).all()
     
     return brand_voices
 
@@ -76,15 +106,17 @@ async def get_brand_voices(
 @router.get("/brand-voice/{brand_voice_id}", response_model=BrandVoiceResponse)
 async def get_brand_voice(
     brand_voice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Get specific brand voice"""
     
-    brand_voice = db.query(BrandVoice).filter(
-        BrandVoice.id == brand_voice_id,
-        BrandVoice.user_id == current_user.id
-    ).first()
+    brand_voice = await db.scalar(
+        select(BrandVoice).where(
+            BrandVoice.id == brand_voice_id,
+            BrandVoice.user_id == current_user.id
+        )
+    )
     
     if not brand_voice:
         raise HTTPException(
@@ -99,15 +131,17 @@ async def get_brand_voice(
 async def update_brand_voice(
     brand_voice_id: int,
     brand_voice_update: BrandVoiceUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Update brand voice"""
     
-    brand_voice = db.query(BrandVoice).filter(
-        BrandVoice.id == brand_voice_id,
-        BrandVoice.user_id == current_user.id
-    ).first()
+    brand_voice = await db.scalar(
+        select(BrandVoice).where(
+            BrandVoice.id == brand_voice_id,
+            BrandVoice.user_id == current_user.id
+        )
+    )
     
     if not brand_voice:
         raise HTTPException(
@@ -124,8 +158,8 @@ async def update_brand_voice(
     if brand_voice_update.is_default is not None:
         brand_voice.is_default = brand_voice_update.is_default
     
-    db.commit()
-    db.refresh(brand_voice)
+    await db.commit()
+    await db.refresh(brand_voice)
     
     return brand_voice
 
@@ -133,15 +167,17 @@ async def update_brand_voice(
 @router.delete("/brand-voice/{brand_voice_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_brand_voice(
     brand_voice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Delete brand voice"""
     
-    brand_voice = db.query(BrandVoice).filter(
-        BrandVoice.id == brand_voice_id,
-        BrandVoice.user_id == current_user.id
-    ).first()
+    brand_voice = await db.scalar(
+        select(BrandVoice).where(
+            BrandVoice.id == brand_voice_id,
+            BrandVoice.user_id == current_user.id
+        )
+    )
     
     if not brand_voice:
         raise HTTPException(
@@ -149,7 +185,7 @@ async def delete_brand_voice(
             detail="Brand voice not found"
         )
     
-    db.delete(brand_voice)
-    db.commit()
+    await db.delete(brand_voice)
+    await db.commit()
     
     return None
@@ -0,0 +1,162 @@
+"""History-query throughput with blocking vs async database sessions
+
+Before the async engine, routes ran the synchronous Session inside their
+``async def`` handlers, so every query blocked the event loop. This
+serves the history query both ways from one FastAPI app, on the app's
+own engines, and drives each with concurrent clients over ASGI. A probe
+polls a route that does no database work every 10 ms meanwhile; its
+latency, counted from when each poll was due, is what every other
+request on the worker waits.
+
+    python benchmarks/bench_async_db.py [--database-url URL]
+        [--clients 32] [--requests 2000] [--latency 0.005]
+
+``--latency`` adds a pg_sleep() to every request (Postgres only) to stand
+in for the round trip to a database on another host. Without a URL the
+run uses a scratch SQLite file; a Postgres database should be empty or
+disposable, since the script creates the schema and seed rows in it.
+"""
+import argparse
+import asyncio
+import time
+
+import common
+
+
+PROBE_INTERVAL = 0.01
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=500, help="generations seeded for the user")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of pg_sleep per request")
+    return parser.parse_args()
+
+
+args = parse_args()
+common.configure(args.database_url)
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from database import SessionLocal, async_engine, engine, get_db  # noqa: E402
+from models import Content, Generation, User  # noqa: E402
+
+
+def seed(rows: int) -> int:
+    suffix = common.unique_suffix()
+    with SessionLocal() as db:
+        user = User(email=f"bench-{suffix}@example.com", username=f"bench-{suffix}", password_hash="x")
+        db.add(user)
+        db.flush()
+        content = Content(user_id=user.id, original_content="Benchmark content. " * 50, content_type="text")
+        db.add(content)
+        db.flush()
+        db.add_all([
+            Generation(
+                content_id=content.id,
+                user_id=user.id,
+                platform="twitter",
+                tone="casual",
+                output={"post": f"Generated post {i}", "hashtags": ["#bench"]}
+            )
+            for i in range(rows)
+        ])
+        db.commit()
+        return user.id
+
+
+def history_query(user_id: int):
+    return select(Generation.id, Generation.platform, Generation.created_at).where(
+        Generation.user_id == user_id
+    ).order_by(Generation.created_at.desc(), Generation.id.desc()).limit(50)
+
+
+def build_app(user_id: int, latency: float) -> FastAPI:
+    app = FastAPI()
+    sleep = text("SELECT pg_sleep(:seconds)") if latency else None
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    @app.get("/blocking")
+    async def blocking_history():
+        # The pre-async pattern: a sync Session inside an async handler
+        with SessionLocal() as db:
+            if sleep is not None:
+                db.execute(sleep, {"seconds": latency})
+            return len(db.execute(history_query(user_id)).all())
+
+    @app.get("/async")
+    async def async_history(db: AsyncSession = Depends(get_db)):
+        if sleep is not None:
+            await db.execute(sleep, {"seconds": latency})
+        return len((await db.execute(history_query(user_id))).all())
+
+    return app
+
+
+async def drive(client: httpx.AsyncClient, path: str, clients: int, total: int):
+    latencies = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    probes = []
+    done = False
+
+    async def probe():
+        due = time.perf_counter()
+        while not done:
+            due += PROBE_INTERVAL
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/ping")
+            probes.append((time.perf_counter() - due) * 1000)
+            # Polls that were due while the loop was blocked count as one
+            due = max(due, time.perf_counter() - PROBE_INTERVAL)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await prober
+    return total / elapsed, latencies, probes
+
+
+async def main():
+    if args.latency and engine.dialect.name != "postgresql":
+        raise SystemExit("--latency needs a Postgres database")
+    common.create_tables()
+    user_id = seed(args.rows)
+    app = build_app(user_id, args.latency)
+
+    print(
+        f"{engine.dialect.name}, {args.clients} clients, {args.requests} requests, "
+        f"{args.latency * 1000:g} ms added latency"
+    )
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for path in ("/blocking", "/async"):
+            await drive(client, path, args.clients, 50)  # warm up the pools
+            throughput, latencies, probes = await drive(client, path, args.clients, args.requests)
+            print(f"  {path[1:]:<9} {throughput:8.1f} req/s")
+            print(f"    query  {common.describe(latencies)}")
+            print(f"    probe  {common.describe(probes)}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Prompt tokens and latency of per-platform vs combined generation
+
+Runs AIService.generate_repurposed_content for a long article across all
+seven platforms in both modes against a stub model client. Token counts
+come from the app's own accounting (the tokenizer when tiktoken is
+installed). The stub answers with ``--output-tokens`` per platform and
+takes as long as a simple serving model says:
+
+    latency = --overhead + prompt tokens / --prefill-tps
+              + completion tokens / --decode-tps
+
+The defaults are rough figures for a hosted Llama-class model; pass the
+provider's numbers to model it. Content condensing is off, so both modes
+see the same article.
+
+    python benchmarks/bench_combined_mode.py [--words 5000] [--output-tokens 350]
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import types
+
+import common
+
+PLATFORMS = ["twitter", "linkedin", "instagram", "facebook", "tiktok", "email", "summary"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--output-tokens", type=int, default=350, help="completion tokens per platform")
+    parser.add_argument("--overhead", type=float, default=0.25, help="seconds per call")
+    parser.add_argument("--prefill-tps", type=float, default=10000)
+    parser.add_argument("--decode-tps", type=float, default=250)
+    return parser.parse_args()
+
+
+args = parse_args()
+common.configure(LONG_CONTENT_THRESHOLD_TOKENS=0, GENERATION_MODE="per_platform")
+
+from services.ai_service import AIService  # noqa: E402
+from services.token_service import TokenUsage, count_tokens  # noqa: E402
+
+SINGLE = re.compile(r"repurpose content for (\w+)\. ")
+COMBINED = re.compile(r"repurpose content for these platforms: ([\w, ]+)\. ")
+
+
+class StubCompletions:
+    """Answers like a model: JSON per requested platform, after a modeled delay"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _section(self, platform: str) -> dict:
+        words = ("a", "post", "about", "the", "content", "for", platform)
+        # One token per common word
+        return {"post": " ".join(words[i % len(words)] for i in range(args.output_tokens)), "hashtags": ["#bench"]}
+
+    async def create(self, model, messages, max_tokens=None, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        combined = COMBINED.search(prompt)
+        if combined:
+            text = json.dumps({platform: self._section(platform) for platform in combined.group(1).split(", ")})
+        else:
+            text = json.dumps(self._section(SINGLE.search(prompt).group(1)))
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        completion_tokens = count_tokens(text)
+        await asyncio.sleep(
+            args.overhead + prompt_tokens / args.prefill_tps + completion_tokens / args.decode_tps
+        )
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=text))],
+            usage=types.SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+def article(words: int) -> str:
+    vocabulary = "content teams repurpose long articles into posts threads scripts and newsletters every week".split()
+    sentences = []
+    for i in range(0, words, 12):
+        sentence = " ".join(vocabulary[(i + j) % len(vocabulary)] for j in range(12))
+        sentences.append(sentence.capitalize() + ".")
+    return " ".join(sentences)
+
+
+async def run(mode: str, content: str):
+    service = AIService()
+    completions = StubCompletions()
+    service.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    usage = {platform: TokenUsage() for platform in PLATFORMS}
+    start = time.perf_counter()
+    results = await service.generate_repurposed_content(
+        content, PLATFORMS, "professional", use_cache=False, mode=mode, usage=usage
+    )
+    elapsed = time.perf_counter() - start
+    assert all("error" not in result for result in results.values()), results
+    prompt_tokens = sum(item.prompt_tokens for item in usage.values())
+    completion_tokens = sum(item.completion_tokens for item in usage.values())
+    return completions.calls, prompt_tokens, completion_tokens, elapsed
+
+
+def main():
+    content = article(args.words)
+    print(
+        f"{args.words}-word article, {len(PLATFORMS)} platforms, {args.output_tokens} output tokens each; "
+        f"model: {args.overhead:g} s + {args.prefill_tps:g} prompt tok/s + {args.decode_tps:g} output tok/s"
+    )
+    print(f"  {'mode':<13}{'calls':>6}{'prompt tok':>12}{'output tok':>12}{'latency':>10}")
+    for mode in ("per_platform", "combined"):
+        calls, prompt_tokens, completion_tokens, elapsed = asyncio.run(run(mode, content))
+        print(f"  {mode:<13}{calls:>6}{prompt_tokens:>12,}{completion_tokens:>12,}{elapsed:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Saving generations: session add + commit vs insert_generations()
+
+For 1, 7 and 700 rows, times inserting generations and building their
+GenerationResponse models, and counts the statements sent. "session"
+adds one Generation per row and commits (the old /repurpose path);
+"insert" uses the single INSERT ... RETURNING of insert_generations().
+
+    python benchmarks/bench_insert_generations.py [--database-url URL] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import common
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url")
+    parser.add_argument("--repeat", type=int, default=20)
+    return parser.parse_args()
+
+
+args = parse_args()
+common.configure(args.database_url)
+
+from sqlalchemy import event  # noqa: E402
+
+from database import AsyncSessionLocal, SessionLocal, async_engine  # noqa: E402
+from models import Content, Generation, User  # noqa: E402
+from schemas import GenerationResponse  # noqa: E402
+from services.job_service import insert_generations  # noqa: E402
+
+statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+def seed(rows: int):
+    """A user with one content per 7 rows (each row is a unique content/platform pair)"""
+    suffix = common.unique_suffix()
+    with SessionLocal() as db:
+        user = User(email=f"bench-{suffix}@example.com", username=f"bench-{suffix}", password_hash="x")
+        db.add(user)
+        db.flush()
+        contents = [
+            Content(user_id=user.id, original_content="Benchmark content.", content_type="text")
+            for _ in range((rows + 6) // 7)
+        ]
+        db.add_all(contents)
+        db.commit()
+        return user.id, [content.id for content in contents]
+
+
+PLATFORMS = ["twitter", "linkedin", "instagram", "facebook", "tiktok", "email", "summary"]
+
+
+def make_rows(user_id: int, content_ids: list, count: int) -> list:
+    return [
+        {
+            "content_id": content_ids[i // 7],
+            "user_id": user_id,
+            "platform": PLATFORMS[i % 7],
+            "output": {"post": f"Generated post {i}", "hashtags": ["#bench"]},
+            "tone": "casual",
+            "prompt_tokens": 500,
+            "completion_tokens": 120,
+        }
+        for i in range(count)
+    ]
+
+
+async def with_session(rows: list) -> list:
+    async with AsyncSessionLocal() as db:
+        generations = [Generation(**row) for row in rows]
+        db.add_all(generations)
+        await db.commit()
+        return [GenerationResponse.model_validate(generation) for generation in generations]
+
+
+async def with_insert(rows: list) -> list:
+    async with AsyncSessionLocal() as db:
+        generations = await insert_generations(db, rows)
+        await db.commit()
+        return [GenerationResponse.model_validate(generation) for generation in generations]
+
+
+async def measure(save, rows: int):
+    global statements
+    timings = []
+    for _ in range(args.repeat):
+        user_id, content_ids = seed(rows)
+        batch = make_rows(user_id, content_ids, rows)
+        statements = 0
+        start = time.perf_counter()
+        responses = await save(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert len(responses) == rows
+    # Statements sent by the last run
+    return statistics.median(timings), statements
+
+
+async def main():
+    common.create_tables()
+    await measure(with_insert, 7)  # warm up the pool and statement caches
+    print(f"{async_engine.dialect.name}, median of {args.repeat} runs")
+    print(f"  {'rows':>5}  {'session add + commit':>24}  {'insert_generations':>24}")
+    for rows in (1, 7, 700):
+        session_ms, session_statements = await measure(with_session, rows)
+        insert_ms, insert_statements = await measure(with_insert, rows)
+        print(
+            f"  {rows:>5}  {session_ms:>9.2f} ms / {session_statements:>3} stmts"
+            f"  {insert_ms:>9.2f} ms / {insert_statements:>3} stmts"
+        )
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""History latency while a burst of logins is in flight
+
+Drives the real app over ASGI: a client polls GET /api/generate/history
+every 10 ms while ``--logins`` concurrent logins run, once with bcrypt
+on the password thread pool (the app's code) and once with bcrypt called
+on the event loop, as the handlers did before. Poll latency is counted
+from when each poll was due.
+
+    python benchmarks/bench_login.py [--logins 16] [--rounds 12]
+"""
+import argparse
+import asyncio
+import time
+
+import common
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor")
+    return parser.parse_args()
+
+
+args = parse_args()
+common.configure(BCRYPT_ROUNDS=args.rounds)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from services.auth_service import AuthService  # noqa: E402
+
+POLL_INTERVAL = 0.01
+CREDENTIALS = {"email": "bench@example.com", "password": "password123"}
+
+
+async def on_event_loop(plain_password: str, hashed_password: str) -> bool:
+    return AuthService.verify_password(plain_password, hashed_password)
+
+
+async def burst(client: httpx.AsyncClient, headers: dict):
+    latencies = []
+    done = False
+
+    async def poll():
+        due = time.perf_counter()
+        while not done:
+            due += POLL_INTERVAL
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            response = await client.get("/api/generate/history", headers=headers)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - due) * 1000)
+            due = max(due, time.perf_counter() - POLL_INTERVAL)
+
+    poller = asyncio.create_task(poll())
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/api/auth/login", json=CREDENTIALS) for _ in range(args.logins)
+    ))
+    elapsed = time.perf_counter() - start
+    done = True
+    await poller
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed, latencies
+
+
+async def main_async():
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/api/auth/register", json={**CREDENTIALS, "username": "bench"})
+            token = (await client.post("/api/auth/login", json=CREDENTIALS)).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            print(f"{args.logins} concurrent logins, bcrypt rounds {args.rounds}")
+            thread_pool = AuthService.verify_password_async
+            for label, verify in (("event loop", on_event_loop), ("thread pool", thread_pool)):
+                AuthService.verify_password_async = staticmethod(verify)
+                elapsed, latencies = await burst(client, headers)
+                print(f"  {label:<11} logins {elapsed:5.2f} s  history {common.describe(latencies)}")
+            AuthService.verify_password_async = thread_pool
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
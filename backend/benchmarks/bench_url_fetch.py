@@ -0,0 +1,114 @@
+"""URL extraction throughput against a local test server
+
+Serves a ~100 KB article from a threaded local HTTP server that adds
+``--latency`` seconds per response, then extracts it ``--pages`` times:
+
+- before: requests.get + html.parser, one page at a time (the blocking
+  call inside the upload handler serialized every URL upload)
+- UrlFetcher with each installed parser, all pages concurrently over the
+  shared connection pool (the URL cache is off)
+
+    python benchmarks/bench_url_fetch.py [--pages 40] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import http.server
+import socketserver
+import threading
+import time
+
+import common
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the server waits per response")
+    return parser.parse_args()
+
+
+args = parse_args()
+common.configure()
+
+import requests  # noqa: E402
+
+from services.content_service import ContentParser, USER_AGENT  # noqa: E402
+from services.url_service import UrlFetcher  # noqa: E402
+
+PAGE = (
+    "<html><head><script>var x = 1;</script><style>p {}</style></head><body>"
+    + "".join(
+        f"<div><h2>Section {i}</h2><p>Paragraph {i} with some <b>bold</b> text "
+        f"and a <a href='#'>link</a>.</p></div>"
+        for i in range(800)
+    )
+    + "</body></html>"
+).encode()
+
+
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(args.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def installed_parsers():
+    parsers = ["html.parser"]
+    for module, name in (("lxml", "lxml"), ("selectolax", "selectolax")):
+        try:
+            __import__(module)
+            parsers.append(name)
+        except ImportError:
+            pass
+    return parsers
+
+
+def blocking_extract(url: str) -> str:
+    response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
+    response.raise_for_status()
+    return ContentParser.html_to_text(response.content, "html.parser")
+
+
+async def fetcher_run(url: str, parser: str) -> float:
+    fetcher = UrlFetcher(parser=parser)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(fetcher.extract(url) for _ in range(args.pages)))
+        return time.perf_counter() - start
+    finally:
+        await fetcher.close()
+
+
+def main():
+    server = ThreadingServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/article"
+
+    print(f"{args.pages} pages of {len(PAGE) // 1024} KB, {args.latency * 1000:g} ms server latency")
+    start = time.perf_counter()
+    for _ in range(args.pages):
+        blocking_extract(url)
+    elapsed = time.perf_counter() - start
+    print(f"  {'before (requests + html.parser)':<34} {args.pages / elapsed:7.1f} pages/s")
+
+    for parser in installed_parsers():
+        elapsed = asyncio.run(fetcher_run(url, parser))
+        print(f"  {'UrlFetcher + ' + parser:<34} {args.pages / elapsed:7.1f} pages/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Shared setup for the benchmark scripts
+
+The application reads its settings and creates its engines on import, so
+scripts call ``configure()`` before importing anything from the backend.
+Unless a database URL is given, each run uses a fresh SQLite file.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(database_url: str = None, **overrides) -> str:
+    """Point the settings at a scratch directory and return its path"""
+    data_dir = tempfile.mkdtemp(prefix="repurpose-bench-")
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{data_dir}/bench.db"
+    os.environ["UPLOAD_DIR"] = os.path.join(data_dir, "uploads")
+    os.environ["GENERATION_CACHE_BACKEND"] = "none"
+    os.environ["GROQ_API_KEY"] = ""
+    os.environ["DEBUG"] = "False"
+    for name, value in overrides.items():
+        os.environ[name] = str(value)
+    sys.path.insert(0, BACKEND_DIR)
+    return data_dir
+
+
+def create_tables() -> None:
+    """Create the schema as the app does on startup, with the sync engine"""
+    from database import Base, engine
+    from migrations import upgrade
+    import models  # noqa: F401  registers the tables
+
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        upgrade(connection)
+
+
+def unique_suffix() -> str:
+    """Suffix for rows a run creates, so runs can share a database"""
+    return f"{os.getpid()}-{int(time.time() * 1000)}"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def describe(latencies_ms: List[float]) -> str:
+    """p50 / p95 / max of a list of latencies in milliseconds"""
+    if not latencies_ms:
+        return "no samples"
+    return (
+        f"p50 {statistics.median(latencies_ms):7.1f} ms  "
+        f"p95 {percentile(latencies_ms, 0.95):7.1f} ms  "
+        f"max {max(latencies_ms):7.1f} ms"
+    )
@@ -1,25 +1,42 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from config import settings
-from database import engine, Base
-from api import auth, content, generate, user
+from database import async_engine, Base
+from middleware import BodySizeLimitMiddleware
+from migrations import upgrade
+from api import auth, content, generate, user, internal
+from services.token_service import load_tokenizer
+from services.usage_service import usage_meter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MULTIPART_OVERHEAD = 64 * 1024
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create database tables
     logger.info("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade)
     logger.info("Database tables created successfully")
+    await asyncio.to_thread(load_tokenizer)
+    await generate.job_queue.start()
+    await usage_meter.start()
     yield
     # Shutdown
+    await generate.job_queue.stop()
+    await usage_meter.stop()
+    content.document_extractor.shutdown()
+    await content.url_fetcher.close()
+    await async_engine.dispose()
     logger.info("Application shutdown")
 
 
@@ -41,11 +58,23 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Refuse oversized uploads before they are parsed and spooled; the
+# allowance covers the multipart framing around the file
+UPLOAD_BODY_LIMIT = settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/api/content/upload-file": UPLOAD_BODY_LIMIT,
+        "/api/content/bulk-upload": UPLOAD_BODY_LIMIT,
+    }
+)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(content.router, prefix="/api/content", tags=["content"])
 app.include_router(generate.router, prefix="/api/generate", tags=["generate"])
 app.include_router(user.router, prefix="/api/user", tags=["user"])
+app.include_router(internal.router, prefix="/api/internal", tags=["internal"])
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,88 @@
+"""Convert generations stored before JSON output to the ``output`` column
+
+Older rows hold a Python repr of the generated dict in ``generated_text``
+and a copy of it in ``platform_metadata``. This moves the data into
+``output`` and empties both legacy columns.
+
+Rows are converted in small batches, each in its own short transaction and
+selected by primary key, so the table stays readable and writable while it
+runs. Already converted rows are skipped, so it can be stopped and rerun.
+
+Usage: python migrate_generation_output.py [--batch-size 500] [--pause 0.1]
+"""
+import argparse
+import ast
+import sys
+import time
+sys.path.insert(0, '.')
+
+from sqlalchemy import bindparam, null, select, update
+
+from database import engine
+from models import Generation
+
+generations = Generation.__table__
+
+
+def legacy_output(platform: str, text: str, metadata) -> dict:
+    """The generated dict of a pre-JSON row"""
+    if isinstance(metadata, dict) and metadata:
+        return metadata
+    try:
+        output = ast.literal_eval(text)
+        if isinstance(output, dict):
+            return output
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    # Same shape as an unparsable model response
+    return {"content": text, "platform": platform}
+
+
+def migrate(batch_size: int, pause: float) -> int:
+    convert = update(generations).where(
+        generations.c.id == bindparam("row_id"),
+        generations.c.output.is_(None)
+    ).values(
+        output=bindparam("new_output"),
+        generated_text="",
+        platform_metadata=null()
+    )
+
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(
+                    generations.c.id,
+                    generations.c.platform,
+                    generations.c.generated_text,
+                    generations.c.platform_metadata
+                ).where(
+                    generations.c.output.is_(None),
+                    generations.c.id > last_id
+                ).order_by(generations.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            conn.execute(convert, [
+                {"row_id": row.id, "new_output": legacy_output(row.platform, row.generated_text, row.platform_metadata)}
+                for row in rows
+            ])
+
+        converted += len(rows)
+        last_id = rows[-1].id
+        print(f"Converted {converted} generations (up to id {last_id})")
+        if pause:
+            time.sleep(pause)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to wait between batches")
+    args = parser.parse_args()
+
+    total = migrate(args.batch_size, args.pause)
+    print(f"\n=== Done: {total} generations converted ===\n")
@@ -0,0 +1,39 @@
+"""Build the Postgres full-text search indexes
+
+Each GIN index is built with CREATE INDEX CONCURRENTLY, so the tables stay
+readable and writable while it runs. That cannot happen inside a
+transaction, so it is not part of the startup schema upgrade; until this
+has run, search works but scans the tables. Indexes that already exist are
+skipped and ones left invalid by an interrupted run are rebuilt, so it can
+be stopped and rerun. SQLite databases build their search tables on
+startup and need nothing here.
+
+Usage: python migrate_search_index.py
+"""
+import argparse
+import logging
+import sys
+sys.path.insert(0, '.')
+
+from database import engine
+from services.search_service import PostgresSearchBackend, create_search_backend
+
+
+def migrate() -> bool:
+    backend = create_search_backend(engine.dialect.name)
+    if not isinstance(backend, PostgresSearchBackend):
+        return False
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        backend.create_schema(conn)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if migrate():
+        print("\n=== Done: search indexes are up to date ===\n")
+    else:
+        print(f"\n=== Nothing to do for {engine.dialect.name} ===\n")
@@ -0,0 +1,59 @@
+"""Schema upgrades that create_all does not cover
+
+create_all only creates missing tables, so columns and indexes added to
+existing tables, and SQLite's full-text search tables, are added here.
+Every step checks the live schema first and can run on each startup.
+Steps that touch every row run separately: data conversions in batches
+(migrate_generation_output.py) and the Postgres search indexes, which are
+built concurrently outside a transaction (migrate_search_index.py).
+"""
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from models import Content, Generation
+from services.search_service import SQLiteSearchBackend, create_search_backend
+
+logger = logging.getLogger(__name__)
+
+# Columns added after their table was first created
+ADDED_COLUMNS = [
+    Generation.__table__.c.prompt_tokens,
+    Generation.__table__.c.completion_tokens,
+    Generation.__table__.c.output,
+]
+
+# Tables that gained indexes after they were first created
+INDEXED_TABLES = [Content.__table__, Generation.__table__]
+
+
+def add_missing_columns(connection) -> None:
+    """ALTER TABLE ... ADD COLUMN for each added column the table lacks"""
+    inspector = inspect(connection)
+    existing = {}
+    for column in ADDED_COLUMNS:
+        table = column.table.name
+        if table not in existing:
+            existing[table] = {c["name"] for c in inspector.get_columns(table)}
+        if column.name in existing[table]:
+            continue
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+        logger.info(f"Added column {table}.{column.name}")
+
+
+def add_missing_indexes(connection) -> None:
+    """CREATE INDEX for each model index the database lacks"""
+    for table in INDEXED_TABLES:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def upgrade(connection) -> None:
+    """Bring an existing database up to the current models"""
+    add_missing_columns(connection)
+    add_missing_indexes(connection)
+    search_backend = create_search_backend(connection.dialect.name)
+    if isinstance(search_backend, SQLiteSearchBackend):
+        search_backend.create_schema(connection)
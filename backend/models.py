@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
+from utils import render_output
 
 
 class User(Base):
@@ -26,6 +28,10 @@ class User(Base):
 class Content(Base):
     """Content model for storing original content"""
     __tablename__ = "content"
+    __table_args__ = (
+        # Newest-first keyset pagination of a user's content
+        Index("ix_content_user_created", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -40,26 +46,88 @@ class Content(Base):
     # Relationships
     owner = relationship("User", back_populates="contents")
     generations = relationship("Generation", back_populates="content", cascade="all, delete-orphan")
+    digest = relationship(
+        "ContentDigest",
+        back_populates="content",
+        uselist=False,
+        cascade="all, delete-orphan",
+        lazy="selectin"
+    )
+    signature = relationship(
+        "ContentSignature",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
+
+
+class ContentSignature(Base):
+    """MinHash signature of a content's text, for near-duplicate detection"""
+    __tablename__ = "content_signatures"
+    __table_args__ = (
+        # Loading a user's signatures
+        Index("ix_content_signatures_user_content", "user_id", "content_id"),
+    )
+    
+    content_id = Column(Integer, ForeignKey("content.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # DEDUP_NUM_PERM uint32 values
+
+
+class ContentDigest(Base):
+    """Summary statistics computed once per content after ingest"""
+    __tablename__ = "content_digests"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_id = Column(Integer, ForeignKey("content.id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
+    key_points = Column(JSON, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    language = Column(String(16), nullable=True)
+    reading_time_minutes = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    content = relationship("Content", back_populates="digest")
 
 
 class Generation(Base):
     """Generated content for different platforms"""
     __tablename__ = "generations"
+    __table_args__ = (
+        # Newest-first keyset pagination of history, optionally by platform
+        Index("ix_generations_user_created", "user_id", "created_at", "id"),
+        Index("ix_generations_user_platform_created", "user_id", "platform", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     content_id = Column(Integer, ForeignKey("content.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     platform = Column(String(50), nullable=False, index=True)  # twitter, linkedin, etc.
-    generated_text = Column(Text, nullable=False)
+    # Generated JSON for the platform, as returned by the model
+    output = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+    # Pre-JSON storage: a repr of the output plus a copy of it. New rows leave
+    # them empty; migrate_generation_output.py converts older rows to ``output``
+    legacy_text = Column("generated_text", Text, nullable=False, default="")
+    platform_metadata = Column(JSON, nullable=True)
     tone = Column(String(50), nullable=False)  # professional, casual, etc.
     brand_voice_id = Column(Integer, ForeignKey("brand_voices.id"), nullable=True)
-    platform_metadata = Column(JSON, nullable=True)  # Additional platform-specific metadata
+    # Model tokens spent on this generation (0 for cache hits, NULL on older rows)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
     content = relationship("Content", back_populates="generations")
     owner = relationship("User", back_populates="generations")
     brand_voice = relationship("BrandVoice")
+    
+    @property
+    def generated_text(self) -> str:
+        """Plain-text rendering of the output, computed on access"""
+        if self.output is None:
+            return self.legacy_text or ""
+        return render_output(self.platform, self.output)
 
 
 class BrandVoice(Base):
@@ -75,3 +143,15 @@ class BrandVoice(Base):
     
     # Relationships
     owner = relationship("User", back_populates="brand_voices")
+
+
+class UsageCounter(Base):
+    """Generations and model tokens a user used in one metering window"""
+    __tablename__ = "usage_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    generations = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
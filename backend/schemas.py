@@ -27,9 +27,18 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UsageResponse(BaseModel):
+    window_start: datetime
+    window_end: datetime
+    generations: int
+    prompt_tokens: int
+    completion_tokens: int
+    generation_limit: Optional[int] = None
+    token_limit: Optional[int] = None
+
+
 class UserUpdate(BaseModel):
     username: Optional[str] = None
-    plan: Optional[str] = None
 
 
 # Token Schemas
@@ -48,6 +57,18 @@ class ContentCreate(BaseModel):
     title: Optional[str] = None
     original_content: str
     content_type: str  # text, url, file
+    allow_duplicate: bool = False  # store even if near-identical content exists
+
+
+class ContentDigestResponse(BaseModel):
+    key_points: Optional[List[str]] = None
+    token_count: Optional[int] = None
+    language: Optional[str] = None
+    reading_time_minutes: Optional[int] = None
+    content_hash: str
+    
+    class Config:
+        from_attributes = True
 
 
 class ContentResponse(BaseModel):
@@ -59,11 +80,38 @@ class ContentResponse(BaseModel):
     word_count: Optional[int]
     created_at: datetime
     updated_at: datetime
+    digest: Optional[ContentDigestResponse] = None  # computed in the background after upload
+    
+    class Config:
+        from_attributes = True
+
+
+class ContentSummary(BaseModel):
+    """List view of content: an excerpt instead of the full text"""
+    id: int
+    user_id: int
+    title: Optional[str]
+    excerpt: str
+    content_type: str
+    source_url: Optional[str] = None
+    word_count: Optional[int]
+    created_at: datetime
+    updated_at: Optional[datetime]
     
     class Config:
         from_attributes = True
 
 
+class ContentSearchResult(ContentSummary):
+    score: float
+    snippet: Optional[str] = None  # matching fragments, terms wrapped in <b></b>
+
+
+class BulkContentCreate(BaseModel):
+    items: List[ContentCreate] = Field(..., min_length=1)
+    allow_duplicate: bool = False
+
+
 class ContentUpdate(BaseModel):
     title: Optional[str] = None
 
@@ -74,20 +122,45 @@ class GenerationCreate(BaseModel):
     platforms: List[str]
     tone: str = Field(..., min_length=3)
     brand_voice_id: Optional[int] = None
+    use_cache: bool = True
+    generation_mode: Optional[str] = Field(None, pattern="^(per_platform|combined)$")
 
 
 class GenerationResponse(BaseModel):
     id: int
     content_id: int
     platform: str
-    generated_text: str
+    output: Optional[dict] = None  # generated JSON; null on rows not yet migrated
+    generated_text: str  # plain-text rendering of output
     tone: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class GenerationSummary(BaseModel):
+    """List view of a generation: an excerpt instead of the full text"""
+    id: int
+    content_id: int
+    platform: str
+    excerpt: str
+    tone: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class GenerationSearchResult(GenerationSummary):
+    score: float
+    snippet: Optional[str] = None  # matching fragments, terms wrapped in <b></b>
+
+
 class RegenerateRequest(BaseModel):
     generation_id: int
     tone: Optional[str] = None
@@ -122,3 +195,42 @@ class BatchGenerationResponse(BaseModel):
     content_id: int
     platform_results: dict  # {platform: generated_text}
     generations: List[GenerationResponse]
+
+
+class BatchGenerationCreate(BaseModel):
+    content_ids: List[int] = Field(..., min_length=1)
+    platforms: List[str] = Field(..., min_length=1)
+    tone: str = Field(..., min_length=3)
+    brand_voice_id: Optional[int] = None
+    use_cache: bool = True
+    generation_mode: Optional[str] = Field(None, pattern="^(per_platform|combined)$")
+
+
+# Generation job schemas
+class JobTaskResponse(BaseModel):
+    content_id: int
+    platform: str
+    status: str  # pending, running, completed, failed
+    generation_id: Optional[int] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobResponse(BaseModel):
+    job_id: str = Field(..., validation_alias="id")
+    status: str  # queued, running, completed, completed_with_errors, failed
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    elapsed_seconds: Optional[float] = None
+    generations_per_minute: Optional[float] = None
+    tasks: List[JobTaskResponse]
+
+    class Config:
+        from_attributes = True
@@ -1,9 +1,28 @@
 from config import settings
+from services.cache_service import GenerationCache, create_generation_cache
+from services.content_service import ContentParser
+from services.llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, estimate_request_tokens
+from services.token_service import (
+    MAX_OUTPUT_TOKENS, TokenUsage, count_tokens, max_output_tokens, truncate_to_tokens
+)
+from typing import Dict
+import asyncio
 import logging
 import json
+import re
 
 logger = logging.getLogger(__name__)
 
+# Output budget of one combined multi-platform call
+COMBINED_MAX_TOKENS = 8000
+
+SYSTEM_MESSAGE = "You are an expert content repurposing assistant that creates engaging, platform-optimized content."
+
+SUMMARY_SYSTEM_MESSAGE = "You condense parts of long documents into faithful, information-dense summaries."
+
+# Max map-reduce passes when a digest is still over the threshold
+MAX_REDUCE_ROUNDS = 3
+
 
 class AIService:
     """Service for interacting with Groq API (falls back to mock if Groq client fails)"""
@@ -12,66 +31,454 @@ class AIService:
         self.model = settings.GROQ_MODEL
         self.client = None
         try:
-            from groq import Groq
-            self.client = Groq(api_key=settings.GROQ_API_KEY)
+            from groq import AsyncGroq
+            # Retries are handled by the scheduler
+            self.client = AsyncGroq(api_key=settings.GROQ_API_KEY, max_retries=0)
         except Exception as e:
             logger.warning(f"Groq client unavailable, using mock AI service: {e}")
+        self.cache = create_generation_cache()
+        # Shared by every request and job so the process as a whole stays
+        # under the provider's concurrency and rate limits
+        self.scheduler = LLMScheduler(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            requests_per_minute=settings.GROQ_RPM_LIMIT,
+            tokens_per_minute=settings.GROQ_TPM_LIMIT,
+            max_retries=settings.LLM_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY
+        )
+        # Chunk summaries being generated, shared by concurrent callers
+        self._chunk_summaries = {}
+    
+    async def _create_completion(
+        self,
+        messages: list,
+        timeout: float,
+        max_tokens: int = MAX_OUTPUT_TOKENS,
+        temperature: float = 0.7,
+        usage: TokenUsage = None,
+        **kwargs
+    ):
+        """Call the chat completions API through the scheduler
+
+        Callers must hold a scheduler slot. Each attempt is bounded by
+        ``timeout``. Token usage of non-streaming calls is added to
+        ``usage`` when given. Streaming callers settle the scheduler's
+        token reservation themselves once the stream ends.
+        """
+        estimated = estimate_request_tokens(messages, max_tokens)
+        response = await self.scheduler.call(
+            lambda: asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **kwargs
+                ),
+                timeout=timeout
+            ),
+            estimated
+        )
+        response_usage = getattr(response, "usage", None)
+        if response_usage is not None:
+            self.scheduler.record_usage(estimated, response_usage.total_tokens)
+        if usage is not None and not kwargs.get("stream"):
+            usage.add_response(
+                response_usage,
+                prompt="".join(message["content"] for message in messages),
+                completion=response.choices[0].message.content or ""
+            )
+        return response
     
     async def generate_repurposed_content(
         self,
         original_content: str,
         platforms: list,
         tone: str,
-        brand_voice: str = None
+        brand_voice: str = None,
+        max_concurrency: int = None,
+        use_cache: bool = True,
+        mode: str = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: Dict[str, TokenUsage] = None
     ) -> dict:
-        """Generate content for multiple platforms"""
-        
-        results = {}
+        """Generate content for multiple platforms concurrently
 
-        # If Groq client not available, return mocked outputs for testing
-        if not self.client:
+        At most ``max_concurrency`` platforms (default
+        ``settings.GENERATION_CONCURRENCY``) are in flight at once. A failure
+        or timeout on one platform is reported as ``{"error": ...}`` for that
+        platform only. ``use_cache=False`` skips cached results and forces a
+        fresh sample.
+
+        ``mode`` (default ``settings.GENERATION_MODE``) is "per_platform" or
+        "combined". Combined mode asks for all platforms in one call so the
+        original content is only sent once; platforms missing or invalid in
+        that response fall back to individual calls.
+
+        When ``usage`` is given it receives a TokenUsage per platform.
+        """
+        
+        if usage is not None:
             for platform in platforms:
-                snippet = (original_content or "").strip()[:400]
-                mock = {
-                    "content": f"[MOCK {platform.upper()}] {snippet}",
-                    "platform": platform
-                }
-                results[platform] = mock
-            return results
+                usage.setdefault(platform, TokenUsage())
+        
+        results = {}
+        if (mode or settings.GENERATION_MODE) == "combined" and self.client and len(set(platforms)) > 1:
+            results = await self._generate_combined(
+                original_content, list(dict.fromkeys(platforms)), tone, brand_voice, use_cache, priority, usage
+            )
+        
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or settings.GENERATION_CONCURRENCY))
 
-        for platform in platforms:
-            try:
-                prompt = self._build_prompt(
+        async def run(platform: str) -> dict:
+            async with semaphore:
+                return await self.generate_for_platform(
                     original_content,
                     platform,
                     tone,
-                    brand_voice
+                    brand_voice,
+                    use_cache=use_cache,
+                    priority=priority,
+                    usage=usage[platform] if usage is not None else None
                 )
 
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert content repurposing assistant that creates engaging, platform-optimized content."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=2000
-                )
+        remaining = [platform for platform in platforms if platform not in results]
+        outputs = await asyncio.gather(*(run(platform) for platform in remaining))
+        results.update(zip(remaining, outputs))
+        return {platform: results[platform] for platform in platforms}
 
-                content = response.choices[0].message.content
-                results[platform] = self._parse_response(content, platform)
+    async def _generate_combined(
+        self,
+        original_content: str,
+        platforms: list,
+        tone: str,
+        brand_voice: str = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: Dict[str, TokenUsage] = None
+    ) -> dict:
+        """Generate several platforms with one call
 
-            except Exception as e:
-                logger.error(f"Error generating content for {platform}: {str(e)}")
-                results[platform] = {"error": str(e)}
+        Returns only the platforms that came back as valid JSON objects
+        (plus cache hits); the caller generates the rest individually.
+        The call's token usage is shared evenly by the requested platforms.
+        """
+        results = {}
+        cache_keys = {
+            platform: GenerationCache.make_key(original_content, platform, tone, brand_voice, self.model)
+            for platform in platforms
+        }
+        if use_cache:
+            for platform, cache_key in cache_keys.items():
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    results[platform] = cached
+
+        pending = [platform for platform in platforms if platform not in results]
+        if len(pending) < 2:
+            return results
+
+        # Output grows with the number of platforms, so does the time it takes
+        timeout = settings.GENERATION_TIMEOUT * len(pending)
+        call_usage = TokenUsage()
+        try:
+            content = await self.prepare_content(original_content, priority, call_usage)
+            prompt = self._build_combined_prompt(content, pending, tone, brand_voice)
+            async with self.scheduler.slot(priority):
+                response = await self._create_completion(
+                    self._build_messages(prompt),
+                    timeout,
+                    max_tokens=min(sum(max_output_tokens(platform) for platform in pending), COMBINED_MAX_TOKENS),
+                    usage=call_usage
+                )
+            sections = self._parse_combined_response(response.choices[0].message.content, pending)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out generating combined content after {timeout}s")
+            return results
+        except Exception as e:
+            logger.error(f"Error generating combined content: {str(e)}")
+            return results
+        finally:
+            if usage is not None:
+                share = call_usage.share(len(pending))
+                for platform in pending:
+                    usage[platform].add(share.prompt_tokens, share.completion_tokens)
 
+        for platform, section in sections.items():
+            await self.cache.set(cache_keys[platform], section)
+            results[platform] = section
+
+        missing = [platform for platform in pending if platform not in sections]
+        if missing:
+            logger.warning(f"Combined response missing {', '.join(missing)}; generating individually")
         return results
+
+    async def generate_for_platform(
+        self,
+        original_content: str,
+        platform: str,
+        tone: str,
+        brand_voice: str = None,
+        timeout: float = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: TokenUsage = None
+    ) -> dict:
+        """Generate content for a single platform, never raising
+
+        Errors and timeouts are returned as ``{"error": ...}`` so callers can
+        keep the results of the other platforms. Successful results are
+        stored in the generation cache even when ``use_cache`` is False.
+        Background work passes ``PRIORITY_BATCH`` so queued interactive
+        calls go first. Tokens spent are added to ``usage`` when given.
+        """
+        # If Groq client not available, return mocked outputs for testing
+        if not self.client:
+            snippet = (original_content or "").strip()[:400]
+            return {
+                "content": f"[MOCK {platform.upper()}] {snippet}",
+                "platform": platform
+            }
+
+        timeout = timeout or settings.GENERATION_TIMEOUT
+        cache_key = GenerationCache.make_key(
+            original_content, platform, tone, brand_voice, self.model
+        )
+        if use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            content = await self.prepare_content(original_content, priority, usage)
+            prompt = self._build_prompt(
+                content,
+                platform,
+                tone,
+                brand_voice
+            )
+
+            async with self.scheduler.slot(priority):
+                response = await self._create_completion(
+                    self._build_messages(prompt),
+                    timeout,
+                    max_tokens=max_output_tokens(platform),
+                    usage=usage
+                )
+
+            content = response.choices[0].message.content
+            result = self._parse_response(content, platform)
+            await self.cache.set(cache_key, result)
+            return result
+
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out generating content for {platform} after {timeout}s")
+            return {"error": f"Generation timed out after {timeout:g} seconds"}
+        except Exception as e:
+            logger.error(f"Error generating content for {platform}: {str(e)}")
+            return {"error": str(e)}
+
+    async def stream_for_platform(
+        self,
+        original_content: str,
+        platform: str,
+        tone: str,
+        brand_voice: str = None,
+        timeout: float = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: TokenUsage = None
+    ):
+        """Stream generation for a single platform
+
+        Yields ``("token", text)`` for each delta as it arrives, then exactly
+        one ``("result", parsed_dict)`` or ``("error", message)``. A cache hit
+        yields the result straight away. Tokens spent are added to
+        ``usage`` when given.
+        """
+        if not self.client:
+            result = await self.generate_for_platform(original_content, platform, tone, brand_voice)
+            yield "token", result["content"]
+            yield "result", result
+            return
+
+        timeout = timeout or settings.GENERATION_TIMEOUT
+        cache_key = GenerationCache.make_key(
+            original_content, platform, tone, brand_voice, self.model
+        )
+        if use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield "result", cached
+                return
+
+        loop = asyncio.get_running_loop()
+        chunks = []
+        stream_usage = None
+        reserved = None
+        try:
+            content = await self.prepare_content(original_content, priority, usage)
+            prompt = self._build_prompt(content, platform, tone, brand_voice)
+            messages = self._build_messages(prompt)
+            max_tokens = max_output_tokens(platform)
+            # Hold a scheduler slot for the whole stream, not just the request
+            async with self.scheduler.slot(priority):
+                deadline = loop.time() + timeout
+                stream = await self._create_completion(
+                    messages, timeout, max_tokens=max_tokens, stream=True
+                )
+                reserved = estimate_request_tokens(messages, max_tokens)
+                iterator = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            iterator.__anext__(), timeout=max(0.0, deadline - loop.time())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    # Groq reports usage on the final chunk
+                    x_groq = getattr(chunk, "x_groq", None)
+                    if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                        stream_usage = x_groq.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        chunks.append(delta)
+                        yield "token", delta
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out streaming content for {platform} after {timeout}s")
+            yield "error", f"Generation timed out after {timeout:g} seconds"
+            return
+        except Exception as e:
+            logger.error(f"Error streaming content for {platform}: {str(e)}")
+            yield "error", str(e)
+            return
+        finally:
+            # Also when the stream failed or the client went away. Without a
+            # usage chunk, count what was sent and received so far.
+            if reserved is not None:
+                if stream_usage is not None:
+                    spent = stream_usage.total_tokens
+                else:
+                    spent = count_tokens("".join(message["content"] for message in messages))
+                    spent += count_tokens("".join(chunks))
+                self.scheduler.record_usage(reserved, spent)
+
+        if usage is not None:
+            usage.add_response(
+                stream_usage,
+                prompt="".join(message["content"] for message in messages),
+                completion="".join(chunks)
+            )
+        result = self._parse_response("".join(chunks), platform)
+        await self.cache.set(cache_key, result)
+        yield "result", result
+
+    async def prepare_content(
+        self,
+        content: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: TokenUsage = None
+    ) -> str:
+        """Fit content into the prompt budget
+
+        Long content is condensed first. Anything still over
+        ``settings.MAX_CONTENT_TOKENS`` is truncated, at a sentence boundary
+        where possible.
+        """
+        content = await self.condense_content(content, priority, usage)
+        if settings.MAX_CONTENT_TOKENS:
+            content = await asyncio.to_thread(truncate_to_tokens, content, settings.MAX_CONTENT_TOKENS)
+        return content
+
+    async def condense_content(
+        self,
+        content: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        usage: TokenUsage = None
+    ) -> str:
+        """Map-reduce long content into a digest for the platform prompts
+
+        Content under ``settings.LONG_CONTENT_THRESHOLD_TOKENS`` is returned
+        unchanged. Longer content is split into chunks that are summarized
+        concurrently and joined, repeating if the digest is still too long.
+        Chunk summaries are cached by chunk hash, so after a small edit only
+        the chunks that changed are summarized again. Summary calls made
+        here count towards ``usage``.
+        """
+        threshold = settings.LONG_CONTENT_THRESHOLD_TOKENS
+        if not threshold or not self.client:
+            return content
+        # Tokenizing a whole document would block the event loop
+        if await asyncio.to_thread(count_tokens, content) <= threshold:
+            return content
+        
+        for _ in range(MAX_REDUCE_ROUNDS):
+            chunks = ContentParser.split_into_chunks(content, settings.CHUNK_MAX_TOKENS)
+            summaries = await asyncio.gather(*(
+                self._summarize_chunk(chunk, priority, usage) for chunk in chunks
+            ))
+            content = "\n\n".join(summaries)
+            if await asyncio.to_thread(count_tokens, content) <= threshold:
+                break
+        return content
+
+    async def _summarize_chunk(self, chunk: str, priority: int, usage: TokenUsage = None) -> str:
+        cache_key = GenerationCache.make_chunk_key(chunk, self.model)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached["summary"]
+        
+        # Platforms of the same content condense concurrently; summarize
+        # each chunk once (billed to the first caller) and let the others
+        # wait for it
+        task = self._chunk_summaries.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_chunk_summary(chunk, cache_key, priority, usage))
+            self._chunk_summaries[cache_key] = task
+            task.add_done_callback(lambda _: self._chunk_summaries.pop(cache_key, None))
+        return await asyncio.shield(task)
+
+    async def _run_chunk_summary(self, chunk: str, cache_key: str, priority: int, usage: TokenUsage = None) -> str:
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_MESSAGE},
+            {"role": "user", "content": self._chunk_summary_prompt(chunk)}
+        ]
+        async with self.scheduler.slot(priority):
+            response = await self._create_completion(
+                messages,
+                settings.GENERATION_TIMEOUT,
+                max_tokens=settings.CHUNK_SUMMARY_MAX_TOKENS,
+                temperature=0.2,
+                usage=usage
+            )
+        summary = (response.choices[0].message.content or "").strip()
+        await self.cache.set(cache_key, {"summary": summary})
+        return summary
+
+    def _chunk_summary_prompt(self, chunk: str) -> str:
+        words = settings.CHUNK_SUMMARY_MAX_TOKENS * 3 // 4
+        return f"""Summarize this part of a longer document in at most {words} words.
+Keep key facts, figures, names, quotes and the author's main arguments, in the original order.
+Write plain prose with no preamble or headings.
+
+DOCUMENT PART:
+{chunk}"""
+
+    def _build_messages(self, prompt: str) -> list:
+        """Build the chat messages for a prompt"""
+        return [
+            {
+                "role": "system",
+                "content": SYSTEM_MESSAGE
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
     
     def _build_prompt(
         self,
@@ -91,6 +498,41 @@ ORIGINAL CONTENT:
 
 """
         
+        return base_instructions + self._platform_prompt(platform)
+    
+    def _build_combined_prompt(
+        self,
+        content: str,
+        platforms: list,
+        tone: str,
+        brand_voice: str = None
+    ) -> str:
+        """Build one prompt covering several platforms"""
+        
+        base_instructions = f"""You are helping repurpose content for these platforms: {', '.join(platforms)}. 
+Tone: {tone}
+{f'Brand voice: {brand_voice}' if brand_voice else ''}
+
+ORIGINAL CONTENT:
+{content}
+
+"""
+        
+        sections = "".join(
+            f"## {platform}\n{self._platform_prompt(platform)}\n\n"
+            for platform in platforms
+        )
+        keys = ", ".join(f'"{platform}"' for platform in platforms)
+        return (
+            base_instructions
+            + sections
+            + f"Return ONLY one JSON object with exactly these keys: {keys}. "
+            + "The value of each key is the JSON object described in that platform's section."
+        )
+    
+    def _platform_prompt(self, platform: str) -> str:
+        """Output spec for one platform"""
+        
         platform_prompts = {
             "twitter": self._twitter_prompt,
             "linkedin": self._linkedin_prompt,
@@ -102,7 +544,7 @@ ORIGINAL CONTENT:
         }
         
         prompt_builder = platform_prompts.get(platform, self._default_prompt)
-        return base_instructions + prompt_builder()
+        return prompt_builder()
     
     def _twitter_prompt(self) -> str:
         return """Generate a Twitter thread of 5-8 tweets that:
@@ -177,3 +619,40 @@ ORIGINAL CONTENT:
         except json.JSONDecodeError:
             logger.warning(f"Failed to parse JSON response for {platform}")
             return {"content": response, "platform": platform}
+    
+    def _parse_combined_response(self, response: str, platforms: list) -> dict:
+        """Extract per-platform objects from a combined response
+
+        Accepts a complete JSON object keyed by platform. If the object is
+        truncated or malformed, each platform's value is decoded on its own,
+        so sections that did come back intact are still used. Only non-empty
+        JSON objects count as valid.
+        """
+        decoder = json.JSONDecoder()
+        start = response.find('{')
+        if start == -1:
+            return {}
+        
+        try:
+            data, _ = decoder.raw_decode(response, start)
+        except json.JSONDecodeError:
+            data = None
+        
+        sections = {}
+        if isinstance(data, dict) and any(platform in data for platform in platforms):
+            for platform in platforms:
+                value = data.get(platform)
+                if isinstance(value, dict) and value:
+                    sections[platform] = value
+            return sections
+        
+        for platform in platforms:
+            for match in re.finditer(r'"%s"\s*:\s*' % re.escape(platform), response):
+                try:
+                    value, _ = decoder.raw_decode(response, match.end())
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(value, dict) and value:
+                    sections[platform] = value
+                    break
+        return sections
@@ -1,12 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import settings
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small dedicated pool keeps hashing off the
+# event loop without starving the default executor
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
 
 
 class AuthService:
@@ -22,6 +36,20 @@ class AuthService:
         """Verify password against hash"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash password in the password hashing thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, pwd_context.hash, password)
+    
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """Verify password in the password hashing thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            password_executor, pwd_context.verify, plain_password, hashed_password
+        )
+    
     @staticmethod
     def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
         """Create JWT access token"""
@@ -70,3 +98,116 @@ class AuthService:
         except JWTError as e:
             logger.error(f"Token verification failed: {str(e)}")
             return None
+
+
+class UserSnapshot:
+    """Read-only view of the authenticated user
+
+    Built either from the database row or, in trusted-claims mode, from the
+    signed access token. Fields not carried in the token are None.
+    """
+    
+    def __init__(
+        self,
+        id: int,
+        email: str = None,
+        username: str = None,
+        plan: str = "free",
+        is_active: bool = True,
+        created_at: datetime = None,
+        trusted_claims: bool = False
+    ):
+        self.id = id
+        self.email = email
+        self.username = username
+        self.plan = plan
+        self.is_active = is_active
+        self.created_at = created_at
+        self.trusted_claims = trusted_claims
+    
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            plan=user.plan,
+            is_active=user.is_active,
+            created_at=user.created_at
+        )
+    
+    @classmethod
+    def from_claims(cls, payload: dict) -> "UserSnapshot":
+        return cls(
+            id=int(payload["sub"]),
+            email=payload.get("email"),
+            username=payload.get("username"),
+            plan=payload["plan"],
+            is_active=payload["is_active"],
+            trusted_claims=True
+        )
+
+
+def user_claims(user) -> dict:
+    """Access token claims describing a user"""
+    return {
+        "sub": str(user.id),
+        "email": user.email,
+        "username": user.username,
+        "plan": user.plan,
+        "is_active": user.is_active
+    }
+
+
+class TokenCache:
+    """Short-TTL cache of verified access tokens to user snapshots"""
+    
+    def __init__(self, ttl: float = 60, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._tokens_by_user = {}
+    
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if time.monotonic() >= expires_at:
+            self._discard(token)
+            return None
+        return snapshot
+    
+    def set(self, token: str, snapshot: UserSnapshot, token_exp: float = None) -> None:
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_exp:
+            # Never cache a token past its own expiry
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        if len(self._entries) >= self.max_entries:
+            self._discard(next(iter(self._entries)))
+        self._entries[token] = (time.monotonic() + ttl, snapshot)
+        self._tokens_by_user.setdefault(snapshot.id, set()).add(token)
+    
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached token of a user after their record changes"""
+        for token in self._tokens_by_user.pop(user_id, set()):
+            self._entries.pop(token, None)
+    
+    def _discard(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[1].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[1].id]
+
+
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES
+)
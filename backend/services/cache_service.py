@@ -0,0 +1,262 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with TTL and a maximum entry count"""
+
+    # Fast enough to call from the event loop
+    executor = None
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache stored in a local SQLite file, evicted by TTL and LRU
+
+    Calls block on file I/O, so GenerationCache runs them on the backend's
+    own single ``executor`` thread. The entry count is tracked in memory;
+    expired entries are swept, and the count re-read (other processes may
+    share the file), at most every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 86400, sweep_interval: float = 60):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation-cache")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generation_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_generation_cache_accessed_at"
+            " ON generation_cache (accessed_at)"
+        )
+        self._count = self._read_count()
+        self._swept_at = time.monotonic()
+
+    def _read_count(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM generation_cache").fetchone()
+        return count
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM generation_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl and now - stored_at > self.ttl:
+                self._delete(key)
+                return None
+            self._conn.execute(
+                "UPDATE generation_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        data = json.dumps(value)
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE generation_cache SET value = ?, stored_at = ?, accessed_at = ? WHERE key = ?",
+                (data, now, now, key)
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO generation_cache (key, value, stored_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, data, now, now)
+                )
+                self._count += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if time.monotonic() - self._swept_at > self.sweep_interval:
+            if self.ttl:
+                self._conn.execute(
+                    "DELETE FROM generation_cache WHERE stored_at < ?", (now - self.ttl,)
+                )
+            self._count = self._read_count()
+            self._swept_at = time.monotonic()
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._count -= self._conn.execute(
+                "DELETE FROM generation_cache WHERE key IN ("
+                " SELECT key FROM generation_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            ).rowcount
+
+    def _delete(self, key: str) -> None:
+        self._count -= self._conn.execute(
+            "DELETE FROM generation_cache WHERE key = ?", (key,)
+        ).rowcount
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM generation_cache")
+            self._count = 0
+
+    def __len__(self) -> int:
+        return max(self._count, 0)
+
+
+def content_hash(content: str) -> str:
+    """Stable hash of a piece of content"""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Content-addressed cache of parsed generation results
+
+    Backends with an ``executor`` do blocking I/O and are called on it,
+    off the event loop.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(
+        content: str,
+        platform: str,
+        tone: str,
+        brand_voice: str = None,
+        model: str = None
+    ) -> str:
+        """Build the cache key for one platform generation"""
+        parts = [model or "", platform, tone.lower(), brand_voice or "", content_hash(content)]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_chunk_key(chunk: str, model: str = None) -> str:
+        """Build the cache key for the summary of one content chunk"""
+        parts = ["chunk-summary", model or "", content_hash(chunk)]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    async def _call(self, method, *args):
+        if self.backend.executor is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.backend.executor, method, *args)
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        try:
+            value = await self._call(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"Generation cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self._call(self.backend.set, key, value)
+        except Exception as e:
+            logger.warning(f"Generation cache write failed: {e}")
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.enabled else None,
+            "entries": len(self.backend) if self.enabled else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def create_generation_cache() -> GenerationCache:
+    """Create the generation cache configured in settings"""
+    backend_name = settings.GENERATION_CACHE_BACKEND
+    if backend_name == "memory":
+        backend = MemoryCacheBackend(
+            max_entries=settings.GENERATION_CACHE_MAX_ENTRIES,
+            ttl=settings.GENERATION_CACHE_TTL
+        )
+    elif backend_name == "sqlite":
+        backend = SQLiteCacheBackend(
+            settings.GENERATION_CACHE_PATH,
+            max_entries=settings.GENERATION_CACHE_MAX_ENTRIES,
+            ttl=settings.GENERATION_CACHE_TTL
+        )
+    else:
+        backend = None
+    return GenerationCache(backend)
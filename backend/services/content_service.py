@@ -1,10 +1,48 @@
 import os
+import hashlib
+import re
+import uuid
+import zlib
+from functools import lru_cache
 from pathlib import Path
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from services.extraction_service import extract_docx, extract_pdf_pages
+from services.token_service import CHARS_PER_TOKEN
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# A sentence whose CRC is divisible by this ends a chunk once the chunk is
+# past its minimum size (see ContentParser.split_into_chunks)
+CHUNK_ANCHOR_MODULUS = 16
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+@lru_cache(maxsize=None)
+def _fastest_html_parser() -> str:
+    """Pick the fastest installed HTML parser backend"""
+    for parser, module in (("selectolax", "selectolax.lexbor"), ("lxml", "lxml")):
+        try:
+            __import__(module)
+            return parser
+        except ImportError:
+            continue
+    return "html.parser"
+
+
+class FileTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File exceeds maximum upload size of {max_size} bytes")
+
 
 class FileHandler:
     """Handle file uploads and content extraction"""
@@ -13,6 +51,135 @@ class FileHandler:
         self.upload_dir = upload_dir
         Path(self.upload_dir).mkdir(exist_ok=True)
     
+    async def save_upload_stream(
+        self,
+        upload,
+        subdir: str,
+        extension: str,
+        max_size: int,
+        chunk_size: int = UPLOAD_CHUNK_SIZE
+    ) -> Tuple[str, int, str]:
+        """Copy an UploadFile to disk in chunks and return (path, size, sha256)
+
+        Starlette has already spooled the upload (in memory up to 1 MB, then
+        to a temporary file); the request size limit is enforced before
+        that by BodySizeLimitMiddleware. The file is stored under its
+        content hash, so re-uploading identical bytes reuses the existing
+        file. Memory use is bounded by ``chunk_size``; the copy is aborted
+        as soon as it passes ``max_size``.
+        """
+        import aiofiles
+        
+        dest_dir = os.path.join(self.upload_dir, subdir)
+        os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = os.path.join(dest_dir, f".upload-{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        size = 0
+        
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = await upload.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(max_size)
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        content_hash = digest.hexdigest()
+        full_path = os.path.join(dest_dir, f"{content_hash}{extension}")
+        if os.path.exists(full_path):
+            # Same bytes already stored for this user
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, full_path)
+        
+        return full_path, size, content_hash
+    
+    def unpack_zip(
+        self,
+        zip_path: str,
+        subdir: str,
+        allowed_extensions: List[str],
+        max_members: int,
+        max_total_size: int,
+        max_member_size: int,
+        chunk_size: int = UPLOAD_CHUNK_SIZE
+    ) -> List[dict]:
+        """Unpack a zip archive into content-addressed files
+
+        Returns one ``{"filename", "path", "error"}`` dict per file member.
+        Member names are never used as paths. Sizes are enforced on the
+        decompressed bytes rather than the sizes declared in the archive.
+        Raises ValueError for an archive with too many members and
+        FileTooLargeError once ``max_total_size`` is exceeded.
+        """
+        import zipfile
+        
+        dest_dir = os.path.join(self.upload_dir, subdir)
+        os.makedirs(dest_dir, exist_ok=True)
+        
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith("__MACOSX/")
+                and not Path(info.filename).name.startswith(".")
+            ]
+            if len(members) > max_members:
+                raise ValueError(f"Archive contains more than {max_members} files")
+            
+            results = []
+            total = 0
+            for info in members:
+                extension = Path(info.filename).suffix.lower()
+                if extension not in allowed_extensions:
+                    results.append({"filename": info.filename, "path": None, "error": "Unsupported file type"})
+                    continue
+                
+                tmp_path = os.path.join(dest_dir, f".unzip-{uuid.uuid4().hex}.part")
+                digest = hashlib.sha256()
+                size = 0
+                try:
+                    with archive.open(info) as src, open(tmp_path, 'wb') as dst:
+                        while True:
+                            chunk = src.read(chunk_size)
+                            if not chunk:
+                                break
+                            size += len(chunk)
+                            total += len(chunk)
+                            if total > max_total_size:
+                                raise FileTooLargeError(max_total_size)
+                            if size > max_member_size:
+                                raise ValueError(f"File exceeds maximum upload size of {max_member_size} bytes")
+                            digest.update(chunk)
+                            dst.write(chunk)
+                except ValueError as e:
+                    os.remove(tmp_path)
+                    if isinstance(e, FileTooLargeError):
+                        raise
+                    results.append({"filename": info.filename, "path": None, "error": str(e)})
+                    continue
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                
+                full_path = os.path.join(dest_dir, f"{digest.hexdigest()}{extension}")
+                if os.path.exists(full_path):
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, full_path)
+                results.append({"filename": info.filename, "path": full_path, "error": None})
+        
+        return results
+    
     async def save_uploaded_file(self, file_path: str, content: bytes) -> str:
         """Save uploaded file and return path"""
         try:
@@ -43,13 +210,7 @@ class FileHandler:
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
         try:
-            import PyPDF2
-            text = ""
-            with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-            return text
+            return extract_pdf_pages(file_path)
         except Exception as e:
             logger.error(f"Error reading PDF: {str(e)}")
             raise
@@ -57,12 +218,7 @@ class FileHandler:
     def extract_text_from_docx(self, file_path: str) -> str:
         """Extract text from .docx file"""
         try:
-            from docx import Document
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return extract_docx(file_path)
         except Exception as e:
             logger.error(f"Error reading DOCX: {str(e)}")
             raise
@@ -90,19 +246,44 @@ class ContentParser:
     
     @staticmethod
     def extract_from_url(url: str) -> Optional[str]:
-        """Extract content from URL"""
+        """Extract content from URL (blocking; the API uses UrlFetcher)"""
         try:
             import requests
-            from bs4 import BeautifulSoup
             
             headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+                'User-Agent': USER_AGENT
             }
             
             response = requests.get(url, headers=headers, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            return ContentParser.html_to_text(response.content)
+        except Exception as e:
+            logger.error(f"Error extracting from URL: {str(e)}")
+            raise
+    
+    @staticmethod
+    def html_to_text(html, parser: str = "auto") -> str:
+        """Extract readable text from an HTML document
+
+        ``parser`` is "selectolax", "lxml", "html.parser" or "auto" (the
+        fastest one installed).
+        """
+        if parser == "auto":
+            parser = _fastest_html_parser()
+        
+        if parser == "selectolax":
+            from selectolax.lexbor import LexborHTMLParser
+            
+            tree = LexborHTMLParser(html)
+            for node in tree.css("script, style"):
+                node.decompose()
+            root = tree.body or tree.root
+            text = root.text(separator="\n") if root is not None else ""
+        else:
+            from bs4 import BeautifulSoup
+            
+            soup = BeautifulSoup(html, parser)
             
             # Remove script and style elements
             for script in soup(["script", "style"]):
@@ -110,16 +291,11 @@ class ContentParser:
             
             # Get text
             text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            return text
-        except Exception as e:
-            logger.error(f"Error extracting from URL: {str(e)}")
-            raise
+        
+        # Clean up text
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        return '\n'.join(chunk for chunk in chunks if chunk)
     
     @staticmethod
     def clean_content(content: str) -> str:
@@ -133,6 +309,46 @@ class ContentParser:
         """Count words in content"""
         return len(content.split())
     
+    @staticmethod
+    def split_into_chunks(content: str, max_tokens: int) -> List[str]:
+        """Split content into chunks of at most ``max_tokens`` (estimated)
+
+        Chunks end on sentence boundaries. Past half of ``max_tokens`` a
+        chunk also ends after any "anchor" sentence, chosen by a hash of
+        the sentence text. Boundaries therefore depend on local content
+        rather than on offsets from the start, so an edit only changes the
+        chunks around it and the rest keep their hashes.
+        """
+        max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+        min_chars = max_chars // 2
+        
+        sentences = []
+        for sentence in SENTENCE_BOUNDARY.split(content.strip()):
+            # Hard-split run-on text with no sentence punctuation
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                sentences.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                sentences.append(sentence)
+        
+        chunks = []
+        current = []
+        size = 0
+        for sentence in sentences:
+            if current and size + len(sentence) + 1 > max_chars:
+                chunks.append(' '.join(current))
+                current, size = [], 0
+            current.append(sentence)
+            size += len(sentence) + 1
+            if size >= min_chars and zlib.crc32(sentence.encode('utf-8')) % CHUNK_ANCHOR_MODULUS == 0:
+                chunks.append(' '.join(current))
+                current, size = [], 0
+        if current:
+            chunks.append(' '.join(current))
+        return chunks
+    
     @staticmethod
     def extract_key_points(content: str, max_points: int = 5) -> list:
         """Extract key points from content (simple extraction)"""
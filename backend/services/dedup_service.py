@@ -0,0 +1,286 @@
+import logging
+import random
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models import Content, ContentSignature
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Universal hashing (a * x + b) mod P over 32-bit shingle hashes. a < 2**31
+# keeps a * x + b below 2**64, so numpy can compute it in uint64 and both
+# paths produce identical signatures.
+HASH_PRIME = 4294967291  # largest prime below 2**32
+SEED = 1
+
+# How far back incremental loads look past the previous one. Ids are not
+# committed in order, so rows are picked up by creation time; the overlap
+# covers transactions still open at the last load and worker clock skew.
+RELOAD_OVERLAP = timedelta(minutes=5)
+
+
+def minhash_permutations(num_perm: int) -> Tuple[List[int], List[int]]:
+    """Fixed hash coefficients, identical in every process"""
+    rng = random.Random(SEED)
+    a = [rng.randrange(1, 1 << 31) for _ in range(num_perm)]
+    b = [rng.randrange(0, HASH_PRIME) for _ in range(num_perm)]
+    return a, b
+
+
+def shingle_hashes(text: str, size: int) -> List[int]:
+    """32-bit hashes of the distinct ``size``-word shingles of a text"""
+    words = text.lower().split()
+    if not words:
+        return []
+    if len(words) <= size:
+        return [zlib.crc32(" ".join(words).encode())]
+    return list({
+        zlib.crc32(" ".join(words[i:i + size]).encode())
+        for i in range(len(words) - size + 1)
+    })
+
+
+def band_rows(num_perm: int, threshold: float) -> int:
+    """Rows per LSH band for a similarity threshold
+
+    Picks the largest band size whose S-curve midpoint (1/b)^(1/r) stays
+    below the threshold, so pairs above it almost always share a band.
+    Candidates are verified against the full signature afterwards.
+    """
+    best = 1
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) < threshold:
+            best = rows
+    return best
+
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures
+
+    Signatures are split into bands; keys whose signatures agree on every
+    row of any band are candidates. ``query`` returns candidates with
+    their estimated Jaccard similarity. Buckets hold a bare key until a
+    second key lands in them, which keeps large indexes compact.
+    """
+
+    def __init__(self, num_perm: int, rows: int):
+        self.rows = rows
+        self.bands = num_perm // rows
+        self._tables: List[dict] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[object, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key) -> bool:
+        return key in self._signatures
+
+    def _band_keys(self, signature: array):
+        rows = self.rows
+        for band in range(self.bands):
+            yield band, hash(signature[band * rows:(band + 1) * rows].tobytes())
+
+    def add(self, key, signature: array) -> None:
+        if key in self._signatures:
+            self.remove(key)
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            table = self._tables[band]
+            bucket = table.get(band_key)
+            if bucket is None:
+                table[band_key] = key
+            elif isinstance(bucket, list):
+                bucket.append(key)
+            else:
+                table[band_key] = [bucket, key]
+
+    def remove(self, key) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            table = self._tables[band]
+            bucket = table.get(band_key)
+            if isinstance(bucket, list):
+                if key in bucket:
+                    bucket.remove(key)
+                if len(bucket) == 1:
+                    table[band_key] = bucket[0]
+            elif bucket == key:
+                del table[band_key]
+
+    def query(self, signature: array, threshold: float) -> List[Tuple[object, float]]:
+        """Keys at or above ``threshold`` similarity, most similar first"""
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            bucket = self._tables[band].get(band_key)
+            if isinstance(bucket, list):
+                candidates.update(bucket)
+            elif bucket is not None:
+                candidates.add(bucket)
+        matches = []
+        for key in candidates:
+            similarity = jaccard(signature, self._signatures[key])
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+
+def jaccard(a: array, b: array) -> float:
+    """Jaccard similarity estimated from two MinHash signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class DedupIndex:
+    """Near-duplicate detection over each user's stored content
+
+    Content is reduced to a MinHash signature of its word shingles.
+    Signatures are stored in ``content_signatures`` and loaded into a
+    per-user LSH index the first time a user is checked; later checks only
+    load content created since the previous load, less ``RELOAD_OVERLAP``
+    (e.g. rows added by other workers). Up to ``max_users``
+    indexes are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        max_users: int = 1000
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_users = max_users
+        self.rows = band_rows(num_perm, threshold) if threshold else num_perm
+        self._a, self._b = minhash_permutations(num_perm)
+        if numpy is not None:
+            self._np_a = numpy.array(self._a, dtype=numpy.uint64)
+            self._np_b = numpy.array(self._b, dtype=numpy.uint64)
+        self._users: "OrderedDict[int, Tuple[LSHIndex, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.threshold)
+
+    def signature(self, text: str) -> Optional[array]:
+        """MinHash signature of a cleaned text, or None if it has no words
+
+        CPU bound; run it in a thread for long texts.
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not hashes:
+            return None
+        if numpy is not None:
+            values = numpy.array(hashes, dtype=numpy.uint64)[:, None]
+            minimums = ((values * self._np_a + self._np_b) % HASH_PRIME).min(axis=0)
+            return array("I", minimums.astype(numpy.uint32).tobytes())
+        return array("I", (
+            min((a * x + b) % HASH_PRIME for x in hashes)
+            for a, b in zip(self._a, self._b)
+        ))
+
+    def _from_bytes(self, data: bytes) -> Optional[array]:
+        signature = array("I")
+        signature.frombytes(data)
+        # Signatures from a different DEDUP_NUM_PERM can't be compared
+        return signature if len(signature) == self.num_perm else None
+
+    async def _user_index(self, db: AsyncSession, user_id: int) -> LSHIndex:
+        with self._lock:
+            index, loaded_at = self._users.get(user_id, (None, None))
+        query = select(ContentSignature.content_id, ContentSignature.signature).where(
+            ContentSignature.user_id == user_id
+        )
+        if index is None:
+            index = LSHIndex(self.num_perm, self.rows)
+        else:
+            query = query.join(Content, Content.id == ContentSignature.content_id).where(
+                Content.user_id == user_id,
+                Content.created_at >= loaded_at - RELOAD_OVERLAP
+            )
+
+        loaded_at = datetime.utcnow()
+        for content_id, data in (await db.execute(query)).all():
+            if content_id in index:
+                continue
+            signature = self._from_bytes(data)
+            if signature is not None:
+                index.add(content_id, signature)
+
+        with self._lock:
+            self._users[user_id] = (index, loaded_at)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return index
+
+    async def find_duplicate(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        signature: Optional[array]
+    ) -> Optional[Tuple[int, float]]:
+        """The user's most similar stored content at or above the threshold"""
+        if not self.enabled or signature is None:
+            return None
+        index = await self._user_index(db, user_id)
+        matches = index.query(signature, self.threshold)
+        if not matches:
+            return None
+
+        # Another worker may have deleted a match since it was indexed
+        existing = set((await db.scalars(
+            select(Content.id).where(Content.id.in_([content_id for content_id, _ in matches]))
+        )).all())
+        for content_id, similarity in matches:
+            if content_id in existing:
+                return content_id, similarity
+            index.remove(content_id)
+        return None
+
+    def add(self, user_id: int, content_id: int, signature: Optional[array]) -> None:
+        """Index newly committed content (users not loaded yet pick it up later)"""
+        if signature is None:
+            return
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is not None:
+            entry[0].add(content_id, signature)
+
+    def remove(self, user_id: int, content_id: int) -> None:
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is not None:
+            entry[0].remove(content_id)
+
+    def new_index(self) -> LSHIndex:
+        """Empty index with this configuration, e.g. for one bulk request"""
+        return LSHIndex(self.num_perm, self.rows)
+
+
+dedup_index = DedupIndex(
+    threshold=settings.DEDUP_THRESHOLD,
+    num_perm=settings.DEDUP_NUM_PERM,
+    shingle_size=settings.DEDUP_SHINGLE_SIZE,
+    max_users=settings.DEDUP_MAX_USERS
+)
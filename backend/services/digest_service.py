@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import math
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import Content, ContentDigest
+from services.cache_service import content_hash
+from services.content_service import ContentParser
+from services.token_service import count_tokens
+
+logger = logging.getLogger(__name__)
+
+READING_WORDS_PER_MINUTE = 238
+MAX_KEY_POINTS = 5
+
+# Frequent function words used to guess the language when langdetect is
+# not installed
+STOPWORDS = {
+    "en": {"the", "and", "is", "of", "to", "in", "that", "it", "for", "with", "this", "are", "was"},
+    "es": {"el", "la", "de", "que", "y", "en", "los", "las", "por", "con", "para", "una", "es"},
+    "fr": {"le", "la", "les", "de", "et", "est", "des", "un", "une", "pour", "que", "dans", "pas"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "ein", "eine", "zu", "den", "mit", "von", "sie"},
+    "pt": {"o", "a", "de", "que", "e", "do", "da", "em", "um", "para", "com", "os", "uma", "não"},
+    "it": {"il", "di", "che", "e", "la", "per", "un", "una", "sono", "con", "non", "del", "gli"},
+}
+
+
+def detect_language(text: str) -> str:
+    """Guess the ISO 639-1 language of a text, or "und" if unsure"""
+    sample = text[:5000]
+    try:
+        from langdetect import detect
+        return detect(sample)
+    except ImportError:
+        pass
+    except Exception:
+        return "und"
+
+    words = Counter(word.strip('.,;:!?"\'()').lower() for word in sample.split())
+    scores = {
+        language: sum(words[word] for word in stopwords)
+        for language, stopwords in STOPWORDS.items()
+    }
+    language, score = max(scores.items(), key=lambda item: item[1])
+    return language if score >= 3 else "und"
+
+
+def compute_digest(text: str) -> dict:
+    """Compute the digest fields for a piece of content"""
+    word_count = ContentParser.count_words(text)
+    return {
+        "key_points": list(dict.fromkeys(ContentParser.extract_key_points(text, max_points=50)))[:MAX_KEY_POINTS],
+        "token_count": count_tokens(text),
+        "language": detect_language(text),
+        "reading_time_minutes": max(1, math.ceil(word_count / READING_WORDS_PER_MINUTE)),
+        "content_hash": content_hash(text),
+    }
+
+
+async def store_digests(content_ids: Iterable[int]) -> None:
+    """Compute and save digests for the given content rows
+
+    Meant to run as a background task after the rows are committed.
+    Digests whose content hash is unchanged are left alone.
+    """
+    content_ids = list(content_ids)
+    if not content_ids:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            contents = (await db.scalars(
+                select(Content).where(Content.id.in_(content_ids))
+            )).all()
+
+            texts = [content.original_content for content in contents]
+            all_fields = await asyncio.to_thread(lambda: [compute_digest(text) for text in texts])
+
+            for content, fields in zip(contents, all_fields):
+                digest = content.digest
+                if digest is None:
+                    db.add(ContentDigest(content_id=content.id, **fields))
+                elif digest.content_hash != fields["content_hash"]:
+                    for name, value in fields.items():
+                        setattr(digest, name, value)
+
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Computing content digests failed: {str(e)}")
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionTimeoutError(TimeoutError):
+    """Raised when a document takes longer than the extraction timeout"""
+
+
+# Worker-side functions. They run in child processes, so they must stay
+# importable at module level and only take picklable arguments.
+
+def _limit_memory(max_bytes: int) -> None:
+    """Cap the address space of an extraction worker"""
+    if not max_bytes:
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not apply extraction memory limit: {e}")
+
+
+def pdf_page_count(file_path: str) -> int:
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> str:
+    """Extract text from pages [start, end) of a PDF"""
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        pages = PyPDF2.PdfReader(f).pages
+        end = len(pages) if end is None else min(end, len(pages))
+        return "\n".join(pages[i].extract_text() or "" for i in range(start, end))
+
+
+def extract_docx(file_path: str) -> str:
+    from docx import Document
+    doc = Document(file_path)
+    return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def extract_plain(file_path: str) -> str:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _worker_main(conn, memory_limit: int) -> None:
+    """Run (fn, args) calls received over ``conn`` until told to stop"""
+    _limit_memory(memory_limit)
+    while True:
+        try:
+            call = conn.recv()
+        except EOFError:
+            return
+        if call is None:
+            return
+        fn, args = call
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    """One extraction process and its end of the pipe"""
+
+    def __init__(self, memory_limit: int):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit),
+            name="document-extraction",
+            daemon=True
+        )
+        self._child_conn = child_conn
+
+    def start(self) -> None:
+        self.process.start()
+        # Only the child uses its end; closing ours lets recv() see EOF
+        # if the child dies
+        self._child_conn.close()
+
+    def call(self, fn, args):
+        """Run fn(*args) in the worker and wait for the result (blocking)"""
+        self.conn.send((fn, args))
+        try:
+            ok, value = self.conn.recv()
+        except (EOFError, OSError):
+            raise BrokenProcessPool(
+                f"Extraction worker exited with code {self.process.exitcode}"
+            )
+        if not ok:
+            raise value
+        return value
+
+    def kill(self) -> None:
+        if self.process.pid is not None:
+            self.process.kill()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+
+
+class DocumentExtractor:
+    """Run document parsers in worker processes with timeouts and memory caps
+
+    PDF and DOCX parsing is CPU bound, so it runs outside the event loop
+    in up to ``max_workers`` child processes. Each call holds one worker,
+    so a document that times out, or whose worker dies (e.g. killed at
+    its memory cap), only takes down the workers running its own calls;
+    they are replaced and other extractions carry on. PDFs with more than
+    ``parallel_page_threshold`` pages are split into page ranges that are
+    extracted in parallel and joined in order.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        timeout: float = 60,
+        memory_limit_mb: int = 1024,
+        parallel_page_threshold: int = 50,
+        pages_per_task: int = 25
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.parallel_page_threshold = parallel_page_threshold
+        self.pages_per_task = pages_per_task
+        self._idle: List[_Worker] = []
+        self._busy: Set[_Worker] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _acquire(self) -> _Worker:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        await self._slots.acquire()
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.kill()
+
+        worker = _Worker(self.memory_limit)
+        # Spawning takes a while, so it runs in a thread; if the caller
+        # gives up meanwhile, the process is stopped once it has started
+        starting = asyncio.ensure_future(asyncio.to_thread(worker.start))
+        try:
+            await asyncio.shield(starting)
+        except BaseException:
+            starting.add_done_callback(lambda _: worker.kill())
+            self._slots.release()
+            raise
+        return worker
+
+    async def _submit(self, fn, *args):
+        worker = await self._acquire()
+        self._busy.add(worker)
+        healthy = False
+        try:
+            result = await asyncio.to_thread(worker.call, fn, args)
+            healthy = True
+            return result
+        except (asyncio.CancelledError, BrokenProcessPool):
+            # Abandoned mid-call (timeout) or dead: a running call cannot be
+            # interrupted, so this worker is replaced, and only this one
+            raise
+        except BaseException:
+            # The parser raised; the worker itself is fine
+            healthy = True
+            raise
+        finally:
+            self._busy.discard(worker)
+            if healthy:
+                self._idle.append(worker)
+            else:
+                worker.kill()
+            self._slots.release()
+
+    async def _with_timeout(self, coro, file_path: str):
+        try:
+            return await asyncio.wait_for(coro, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # The calls still running were cancelled, which stops their workers
+            logger.error(f"Extraction of {file_path} timed out after {self.timeout}s")
+            raise ExtractionTimeoutError(
+                f"Document extraction timed out after {self.timeout:g} seconds"
+            )
+
+    async def extract(self, file_path: str) -> str:
+        """Extract text from a file based on its extension"""
+        ext = Path(file_path).suffix.lower()
+
+        if ext in ('.txt', '.md'):
+            return await asyncio.to_thread(extract_plain, file_path)
+        if ext == '.pdf':
+            return await self._with_timeout(self._extract_pdf(file_path), file_path)
+        if ext == '.docx':
+            return await self._with_timeout(self._submit(extract_docx, file_path), file_path)
+
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    async def extract_pdf_range(self, file_path: str, start: int = 0, end: int = None) -> str:
+        """Extract text from pages [start, end) of a PDF"""
+        return await self._with_timeout(
+            self._submit(extract_pdf_pages, file_path, start, end),
+            file_path
+        )
+
+    async def _extract_pdf(self, file_path: str) -> str:
+        page_count = await self._submit(pdf_page_count, file_path)
+
+        if page_count <= self.parallel_page_threshold:
+            return await self._submit(extract_pdf_pages, file_path, 0, page_count)
+
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        parts = await asyncio.gather(*(
+            self._submit(extract_pdf_pages, file_path, start, end)
+            for start, end in ranges
+        ))
+        return "\n".join(parts)
+
+    def shutdown(self) -> None:
+        """Stop the idle workers and kill the busy ones"""
+        idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+        busy, self._busy = self._busy, set()
+        for worker in busy:
+            worker.kill()
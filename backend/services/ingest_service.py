@@ -0,0 +1,239 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models import Content, ContentSignature
+from services.content_service import ContentParser
+
+logger = logging.getLogger(__name__)
+
+
+class IngestItem:
+    """One piece of content in a bulk ingest request"""
+
+    def __init__(
+        self,
+        index: int,
+        content_type: str,
+        source: Optional[str],
+        title: str = None,
+        error: str = None,
+        allow_duplicate: bool = False
+    ):
+        self.index = index
+        self.content_type = content_type  # text, url, file
+        self.source = source  # raw text, URL or path on disk
+        self.title = title
+        self.error = error
+        self.allow_duplicate = allow_duplicate
+
+
+class BulkIngestor:
+    """Extract many content items concurrently and insert them in batches
+
+    Up to ``concurrency`` items are extracted at a time. Items that finish
+    together are inserted with one multi-row INSERT of up to ``batch_size``
+    rows. With a ``dedup_index``, items that nearly duplicate the user's
+    stored content, or an earlier item of the same request, are reported
+    as duplicates instead of inserted. ``run`` yields one status dict per
+    item as it finishes, followed by a summary. Digests of the saved
+    content are left to the caller.
+    """
+
+    def __init__(
+        self,
+        url_fetcher,
+        document_extractor,
+        concurrency: int = 8,
+        batch_size: int = 100,
+        dedup_index=None
+    ):
+        self.url_fetcher = url_fetcher
+        self.document_extractor = document_extractor
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.dedup_index = dedup_index if dedup_index is not None and dedup_index.enabled else None
+
+    async def _extract(self, item: IngestItem) -> str:
+        if item.content_type == "url":
+            return await self.url_fetcher.extract(item.source)
+        if item.content_type == "file":
+            return await self.document_extractor.extract(item.source)
+        return item.source
+
+    async def run(self, user_id: int, items: List[IngestItem]) -> AsyncIterator[dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def extract(item: IngestItem):
+            if item.error:
+                return item, None, None, item.error
+            async with semaphore:
+                try:
+                    text = await self._extract(item)
+                    text = ContentParser.clean_content(text)
+                except Exception as e:
+                    return item, None, None, str(e) or type(e).__name__
+            if not text:
+                return item, None, None, "No text could be extracted"
+            signature = None
+            if self.dedup_index is not None:
+                signature = await asyncio.to_thread(self.dedup_index.signature, text)
+            return item, text, signature, None
+
+        created = 0
+        failed = 0
+        duplicates = 0
+        # Content ids of saved items, for duplicates of items in their batch
+        created_ids = {}
+        pending = {asyncio.create_task(extract(item)) for item in items}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                # Everything that finished since the last wake-up is saved
+                # together, so inserts batch up naturally under load
+                ready = []
+                for item, text, signature, error in sorted((task.result() for task in done), key=lambda r: r[0].index):
+                    if error:
+                        failed += 1
+                        yield {"type": "item", "index": item.index, "status": "failed", "error": error}
+                    else:
+                        ready.append((item, text, signature))
+
+                if self.dedup_index is not None:
+                    ready, found = await self._find_duplicates(user_id, ready)
+                else:
+                    found = []
+
+                for start in range(0, len(ready), self.batch_size):
+                    for result in await self._insert(user_id, ready[start:start + self.batch_size]):
+                        if result["status"] == "created":
+                            created += 1
+                            created_ids[result["index"]] = result["content_id"]
+                        else:
+                            failed += 1
+                        yield result
+
+                for item, match, similarity in found:
+                    # Matches within the batch are items until they are saved
+                    content_id = created_ids.get(match.index) if isinstance(match, IngestItem) else match
+                    if content_id is None:
+                        failed += 1
+                        yield {"type": "item", "index": item.index, "status": "failed", "error": "Could not save content"}
+                        continue
+                    duplicates += 1
+                    yield {
+                        "type": "item",
+                        "index": item.index,
+                        "status": "duplicate",
+                        "content_id": content_id,
+                        "similarity": round(similarity, 2),
+                        "title": item.title,
+                    }
+        finally:
+            # Client went away: stop outstanding extractions
+            for task in pending:
+                task.cancel()
+
+        yield {
+            "type": "summary",
+            "total": len(items),
+            "created": created,
+            "duplicates": duplicates,
+            "failed": failed,
+        }
+
+    async def _find_duplicates(self, user_id: int, ready: list):
+        """Split extracted items into ones to insert and near-duplicates
+
+        Duplicates come back as ``(item, match, similarity)`` where ``match``
+        is a stored content id or an earlier item of the same batch.
+        Items saved by earlier batches are already in the user's index.
+        """
+        unique = []
+        found = []
+        batch_index = self.dedup_index.new_index()
+        batch_items = {}
+        async with AsyncSessionLocal() as db:
+            for item, text, signature in ready:
+                if item.allow_duplicate or signature is None:
+                    unique.append((item, text, signature))
+                    continue
+                match = await self.dedup_index.find_duplicate(db, user_id, signature)
+                if match is None:
+                    earlier = batch_index.query(signature, self.dedup_index.threshold)
+                    if earlier:
+                        index, similarity = earlier[0]
+                        match = (batch_items[index], similarity)
+                if match is None:
+                    batch_index.add(item.index, signature)
+                    batch_items[item.index] = item
+                    unique.append((item, text, signature))
+                else:
+                    found.append((item, *match))
+        return unique, found
+
+    async def _insert(self, user_id: int, batch: list) -> List[dict]:
+        """Insert a batch with one multi-row INSERT ... RETURNING
+
+        sort_by_parameter_order would fall back to one INSERT per row on
+        SQLite, so each row gets its own ``created_at``, a microsecond
+        apart in batch order, and the returned ids are matched up by it.
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id,
+                "created_at": now + timedelta(microseconds=position),
+                "updated_at": now,
+                "title": item.title,
+                "original_content": text,
+                "content_type": item.content_type,
+                "source_url": item.source if item.content_type == "url" else None,
+                "word_count": ContentParser.count_words(text),
+            }
+            for position, (item, text, _) in enumerate(batch)
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                returned = (await db.execute(
+                    insert(Content).returning(Content.id, Content.created_at),
+                    rows
+                )).all()
+                by_created_at = {created_at: content_id for content_id, created_at in returned}
+                ids = [by_created_at[row["created_at"]] for row in rows]
+                signatures = [
+                    {"content_id": content_id, "user_id": user_id, "signature": signature.tobytes()}
+                    for (_, _, signature), content_id in zip(batch, ids)
+                    if signature is not None
+                ]
+                if signatures:
+                    await db.execute(insert(ContentSignature), signatures)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Bulk content insert failed: {str(e)}")
+            return [
+                {"type": "item", "index": item.index, "status": "failed", "error": "Could not save content"}
+                for item, _, _ in batch
+            ]
+
+        if self.dedup_index is not None:
+            for (_, _, signature), content_id in zip(batch, ids):
+                self.dedup_index.add(user_id, content_id, signature)
+
+        return [
+            {
+                "type": "item",
+                "index": item.index,
+                "status": "created",
+                "content_id": content_id,
+                "title": item.title,
+                "word_count": row["word_count"],
+            }
+            for (item, _, _), row, content_id in zip(batch, rows, ids)
+        ]
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal
+from models import Generation
+from services.llm_scheduler import PRIORITY_BATCH
+from services.token_service import TokenUsage
+from services.usage_service import Reservation, usage_meter
+
+logger = logging.getLogger(__name__)
+
+# Max generations written by one INSERT
+SAVE_BATCH_SIZE = 100
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+async def insert_generations(db: AsyncSession, rows: List[dict]) -> List[Generation]:
+    """Insert generations with one multi-row INSERT ... RETURNING
+
+    The returned objects are loaded from RETURNING, so responses can be
+    built from them without a refresh SELECT per row. They are in the
+    order of ``rows``, which must not repeat a (content_id, platform) pair:
+    sort_by_parameter_order would fall back to one INSERT per row on
+    SQLite, so rows are matched up by that pair instead.
+    """
+    if not rows:
+        return []
+    generations = (await db.scalars(insert(Generation).returning(Generation), rows)).all()
+    by_key = {(generation.content_id, generation.platform): generation for generation in generations}
+    return [by_key[row["content_id"], row["platform"]] for row in rows]
+
+
+class JobTask:
+    """One (content, platform) generation inside a job"""
+
+    def __init__(self, content_id: int, platform: str):
+        self.content_id = content_id
+        self.platform = platform
+        self.status = "pending"
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.generation_id: Optional[int] = None
+        self.usage = TokenUsage()
+
+
+class Job:
+    """A queued repurposing request and its per-task progress
+
+    ``contents`` maps content ids to their text; every content is generated
+    for every platform. At most ``concurrency`` tasks of the job run at once
+    (default ``settings.GENERATION_CONCURRENCY``). In "combined"
+    ``generation_mode`` each content's platforms are generated together and
+    count as one running unit.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        contents: Dict[int, str],
+        platforms: List[str],
+        tone: str,
+        brand_voice_id: int = None,
+        brand_voice: str = None,
+        use_cache: bool = True,
+        generation_mode: str = None,
+        concurrency: int = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.contents = contents
+        self.tone = tone
+        self.brand_voice_id = brand_voice_id
+        self.brand_voice = brand_voice
+        self.use_cache = use_cache
+        self.generation_mode = generation_mode or settings.GENERATION_MODE
+        self.concurrency = max(1, concurrency or settings.GENERATION_CONCURRENCY)
+        # One task per (content, platform) pair; see insert_generations()
+        self.tasks = [
+            JobTask(content_id, platform)
+            for content_id in contents
+            for platform in dict.fromkeys(platforms)
+        ]
+        # Set when the job's generations are counted against the user's quota
+        self.reservation: Optional[Reservation] = None
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def completed(self) -> int:
+        return sum(1 for task in self.tasks if task.status == "completed")
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for task in self.tasks if task.status == "failed")
+
+    @property
+    def total(self) -> int:
+        return len(self.tasks)
+
+    @property
+    def elapsed_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        end = self.finished_at or datetime.utcnow()
+        return round((end - self.started_at).total_seconds(), 3)
+
+    @property
+    def generations_per_minute(self) -> Optional[float]:
+        elapsed = self.elapsed_seconds
+        if not elapsed:
+            return None
+        return round(self.completed / elapsed * 60, 2)
+
+
+class JobQueue:
+    """In-process job queue drained by a pool of asyncio workers
+
+    Jobs and their results live in memory only; they are dropped
+    ``settings.JOB_RESULT_TTL`` seconds after finishing and are lost on
+    restart.
+    """
+
+    def __init__(self, ai_service, workers: int = None, max_size: int = None):
+        self.ai_service = ai_service
+        self.worker_count = workers or settings.JOB_WORKERS
+        self.max_size = max_size or settings.JOB_QUEUE_MAX_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, Job] = {}
+
+    async def start(self) -> None:
+        """Start the worker pool"""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.worker_count)
+        ]
+        logger.info(f"Started {self.worker_count} generation job workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers; queued jobs fail and their reservations are released"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            for task in job.tasks:
+                task.status = "failed"
+                task.error = "The server shut down before the job started"
+            if job.reservation is not None:
+                usage_meter.settle(job.reservation, job.total, 0, (task.usage for task in job.tasks))
+            self._queue.task_done()
+
+    def submit(self, job: Job) -> Job:
+        """Queue a job for processing"""
+        if self._queue is None:
+            raise JobQueueFull("Job workers are not running")
+        self._prune()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Too many queued jobs, try again later")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[Job]:
+        """Get a job owned by the given user"""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self) -> None:
+        cutoff = time.time() - settings.JOB_RESULT_TTL
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and job.finished_at.timestamp() < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.status = "failed"
+                for task in job.tasks:
+                    if task.status in ("pending", "running"):
+                        task.status = "failed"
+                        task.error = str(e)
+            finally:
+                job.finished_at = datetime.utcnow()
+                if job.reservation is not None:
+                    usage_meter.settle(
+                        job.reservation, job.total, job.completed, (task.usage for task in job.tasks)
+                    )
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        semaphore = asyncio.Semaphore(job.concurrency)
+        unsaved: List[JobTask] = []
+        flushing = False
+
+        async def flush() -> None:
+            # One writer at a time; tasks finishing during a write are
+            # picked up by the next batch
+            nonlocal flushing, unsaved
+            if flushing:
+                return
+            flushing = True
+            try:
+                while unsaved:
+                    batch, unsaved = unsaved[:SAVE_BATCH_SIZE], unsaved[SAVE_BATCH_SIZE:]
+                    await self._save_generations(job, batch)
+            finally:
+                flushing = False
+
+        async def finish(task: JobTask, result: dict) -> None:
+            if "error" in result:
+                task.status = "failed"
+                task.error = result["error"]
+                return
+            task.result = result
+            unsaved.append(task)
+            await flush()
+
+        async def run_task(task: JobTask) -> None:
+            async with semaphore:
+                task.status = "running"
+                result = await self.ai_service.generate_for_platform(
+                    job.contents[task.content_id],
+                    task.platform,
+                    job.tone,
+                    job.brand_voice,
+                    use_cache=job.use_cache,
+                    priority=PRIORITY_BATCH,
+                    usage=task.usage
+                )
+            await finish(task, result)
+
+        async def run_content(tasks: List[JobTask]) -> None:
+            async with semaphore:
+                for task in tasks:
+                    task.status = "running"
+                results = await self.ai_service.generate_repurposed_content(
+                    job.contents[tasks[0].content_id],
+                    [task.platform for task in tasks],
+                    job.tone,
+                    job.brand_voice,
+                    use_cache=job.use_cache,
+                    mode="combined",
+                    priority=PRIORITY_BATCH,
+                    usage={task.platform: task.usage for task in tasks}
+                )
+            for task in tasks:
+                await finish(task, results[task.platform])
+
+        if job.generation_mode == "combined":
+            by_content: Dict[int, List[JobTask]] = {}
+            for task in job.tasks:
+                by_content.setdefault(task.content_id, []).append(task)
+            await asyncio.gather(*(run_content(tasks) for tasks in by_content.values()))
+        else:
+            await asyncio.gather(*(run_task(task) for task in job.tasks))
+        if job.completed == 0:
+            job.status = "failed"
+        elif job.failed:
+            job.status = "completed_with_errors"
+        else:
+            job.status = "completed"
+
+    async def _save_generations(self, job: Job, tasks: List[JobTask]) -> None:
+        """Insert generations for finished tasks with one multi-row INSERT"""
+        rows = [
+            {
+                "content_id": task.content_id,
+                "user_id": job.user_id,
+                "platform": task.platform,
+                "output": task.result,
+                "tone": job.tone,
+                "brand_voice_id": job.brand_voice_id,
+                **task.usage.as_dict(),
+            }
+            for task in tasks
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                generations = await insert_generations(db, rows)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Saving generations for job {job.id} failed: {str(e)}")
+            for task in tasks:
+                task.status = "failed"
+                task.error = "Could not save generation"
+            return
+
+        for task, generation in zip(tasks, generations):
+            task.generation_id = generation.id
+            task.status = "completed"
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from services.token_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+try:
+    from groq import APIConnectionError, InternalServerError, RateLimitError
+    RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+except ImportError:
+    class RateLimitError(Exception):
+        pass
+    RETRYABLE_ERRORS = (RateLimitError,)
+
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    """Upper-bound token cost of a chat request: its prompt plus ``max_tokens``"""
+    return sum(estimate_tokens(message.get("content") or "") for message in messages) + max_tokens
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the retry-after header from an API error, if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        value = response.headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``capacity`` per minute
+
+    ``reserve`` always succeeds and may leave the bucket in debt; it
+    returns how long the caller must wait before spending what it took.
+    A capacity of 0 disables the bucket.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Give back part of a reservation (e.g. an overestimated cost)"""
+        if not self.capacity:
+            return
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    """Admission control for model calls shared by the whole process
+
+    - At most ``max_concurrency`` calls hold a slot at once. Waiting
+      callers get slots in priority order, then FIFO.
+    - Requests-per-minute and tokens-per-minute budgets are token buckets.
+      Each call reserves its estimated token cost before it is sent.
+    - Rate limit responses, 5xx errors and connection errors are retried
+      with jittered exponential backoff. A ``retry-after`` header is
+      honoured and, for 429s, pauses every caller.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.active = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        """Hold one concurrency slot, e.g. for the length of a stream"""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    async def _wait_for_budget(self, estimated_tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        while self._paused_until > loop.time():
+            await asyncio.sleep(self._paused_until - loop.time())
+        delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        if isinstance(error, RateLimitError):
+            self.rate_limited += 1
+            loop = asyncio.get_running_loop()
+            self._paused_until = max(self._paused_until, loop.time() + delay)
+        return delay
+
+    async def call(self, request: Callable[[], Awaitable], estimated_tokens: int):
+        """Send a request within the rate budgets, retrying transient errors
+
+        ``request`` is called once per attempt. The caller must hold a slot.
+        """
+        attempt = 0
+        while True:
+            await self._wait_for_budget(estimated_tokens)
+            try:
+                return await request()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    f"Model call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def run(
+        self,
+        request: Callable[[], Awaitable],
+        estimated_tokens: int,
+        priority: int = PRIORITY_INTERACTIVE
+    ):
+        """Wait for a slot by priority, then ``call`` the request"""
+        async with self.slot(priority):
+            return await self.call(request, estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Return unused tokens to the budget once real usage is known"""
+        if actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+            "max_concurrency": self.max_concurrency,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import Select, func, tuple_
+
+# Characters of a text column returned as ``excerpt`` in list responses
+EXCERPT_CHARS = 200
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a (created_at, id) position"""
+    return _encode([created_at.isoformat(), row_id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def encode_rank_cursor(score: float, row_id: int) -> str:
+    """Opaque cursor pointing just past a (score, id) position"""
+    return _encode([score, row_id])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, row_id = _decode(cursor)
+        return float(score), int(row_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def excerpt(column, length: int = EXCERPT_CHARS):
+    """SQL expression for the first ``length`` characters of a text column"""
+    return func.substr(column, 1, length).label("excerpt")
+
+
+def keyset_page(
+    query: Select,
+    created_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int
+) -> Select:
+    """Newest-first page of ``query`` after ``cursor``
+
+    Ordering on (created_at, id) makes pages deterministic, and seeking
+    with a row comparison lets a (..., created_at, id) index serve any page
+    without scanning the ones before it. One extra row is fetched so
+    ``next_cursor`` can tell whether another page exists.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(created_column, id_column) < (created_at, row_id))
+    return query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def next_cursor(rows: Sequence, limit: int) -> Tuple[Sequence, Optional[str]]:
+    """Trim the extra row fetched by ``keyset_page`` and build the next cursor"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
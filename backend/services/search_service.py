@@ -0,0 +1,288 @@
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import column, func, literal_column, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import async_engine
+from services.pagination import decode_rank_cursor, encode_rank_cursor
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TERM = re.compile(r'"[^"]+"|\w+', re.UNICODE)
+
+# Searchable text of a generation: the string values of its JSON output,
+# plus the legacy text column, which only rows not yet migrated still fill
+POSTGRES_GENERATION_TEXT = (
+    "concat_ws(' ', nullif(generations.generated_text, ''), "
+    "(SELECT string_agg(value #>> '{}', ' ') FROM jsonb_path_query(generations.output, 'strict $.**') AS value "
+    "WHERE jsonb_typeof(value) = 'string'))"
+)
+SQLITE_GENERATION_TEXT = (
+    "coalesce((SELECT group_concat(value, ' ') FROM json_tree({row}.output) WHERE type = 'text'), "
+    "{row}.generated_text)"
+)
+
+
+class PostgresSearchBackend:
+    """tsvector expressions with GIN indexes
+
+    Content and generations are indexed on expressions over their text, so
+    Postgres keeps the indexes up to date on every insert and update and no
+    column has to be added (and every row rewritten) for them. The indexes
+    are built by ``create_schema``, run from migrate_search_index.py;
+    without them searches still work but scan the tables. ``language`` is
+    a text search configuration; the indexes are created with it, so
+    changing it later means dropping the indexes to have them recreated.
+    """
+
+    def __init__(self, language: str = "english"):
+        if not re.fullmatch(r"[a-z_]+", language):
+            raise ValueError(f"Invalid text search configuration: {language}")
+        self.language = language
+        regconfig = f"'{language}'::regconfig"
+        # Must match the indexed expression exactly for the index to be used
+        self._vectors = {
+            "content": (
+                f"(setweight(to_tsvector({regconfig}, coalesce(content.title, '')), 'A') || "
+                f"setweight(to_tsvector({regconfig}, content.original_content), 'B'))"
+            ),
+            "generations": (
+                f"(to_tsvector({regconfig}, generations.generated_text) || "
+                f"jsonb_to_tsvector({regconfig}, coalesce(generations.output, '{{}}'::jsonb), '[\"string\"]'))"
+            ),
+        }
+        self._texts = {"generations": POSTGRES_GENERATION_TEXT}
+        self.indexes = {
+            "ix_content_text_search": "content",
+            "ix_generations_output_search": "generations",
+        }
+
+    def create_schema(self, connection) -> None:
+        """Build the GIN indexes without blocking writes
+
+        Uses CREATE INDEX CONCURRENTLY, which cannot run inside a
+        transaction: ``connection`` must be in autocommit mode. Valid
+        indexes are left alone; ones left invalid by an interrupted build
+        are dropped and built again.
+        """
+        # Earlier versions kept tsvector columns; dropping them only
+        # updates the catalog (and takes the old content index with it)
+        for table_name in ("content", "generations"):
+            connection.exec_driver_sql(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS search_vector")
+
+        for name, table_name in self.indexes.items():
+            valid = connection.exec_driver_sql(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = %(name)s",
+                {"name": name}
+            ).scalar()
+            if valid:
+                continue
+            if valid is not None:
+                logger.warning(f"Rebuilding invalid search index {name}")
+                connection.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            connection.exec_driver_sql(
+                f"CREATE INDEX CONCURRENTLY {name} ON {table_name} USING GIN ({self._vectors[table_name]})"
+            )
+            logger.info(f"Built search index {name}")
+
+    def _tsquery(self, text: str):
+        return func.websearch_to_tsquery(literal_column(f"'{self.language}'::regconfig"), text)
+
+    def match(self, query, model, text: str):
+        """Restrict ``query`` to matching rows and add a ``score`` column"""
+        vector = literal_column(self._vectors[model.__tablename__])
+        tsquery = self._tsquery(text)
+        return query.add_columns(
+            func.ts_rank_cd(vector, tsquery).label("score")
+        ).where(vector.op("@@")(tsquery))
+
+    def snippets(self, query, model, text_column, text: str):
+        """Add a highlighted ``snippet`` of ``text_column`` to ``query``"""
+        text_sql = self._texts.get(model.__tablename__)
+        return query.add_columns(func.ts_headline(
+            literal_column(f"'{self.language}'::regconfig"),
+            text_column if text_sql is None else literal_column(text_sql),
+            self._tsquery(text),
+            "MaxFragments=2, MaxWords=20, MinWords=8"
+        ).label("snippet"))
+
+
+class FTSTable(NamedTuple):
+    fts: str  # FTS5 table
+    source: str  # table or view it indexes (FTS5 external content)
+    columns: Dict[str, str]  # FTS column -> SQL over a source row ({row})
+    watched: Tuple[str, ...]  # source table columns the text depends on
+    weights: Tuple[float, ...]  # bm25 weight of each FTS column
+
+
+class SQLiteSearchBackend:
+    """External-content FTS5 tables kept in sync by triggers
+
+    Used for local and test databases. Derived text (a generation's JSON
+    output) is exposed through a view that serves as the FTS content.
+    Queries are reduced to words and quoted phrases that must all match.
+    """
+
+    TABLES = {
+        "content": FTSTable(
+            "content_fts",
+            "content",
+            {"title": "{row}.title", "original_content": "{row}.original_content"},
+            ("title", "original_content"),
+            (10.0, 1.0)
+        ),
+        "generations": FTSTable(
+            "generations_fts",
+            "generations_search",
+            {"output": SQLITE_GENERATION_TEXT},
+            ("output", "generated_text"),
+            (1.0,)
+        ),
+    }
+
+    def create_schema(self, connection) -> None:
+        for table_name, (fts, source, columns, watched, _) in self.TABLES.items():
+            names = ", ".join(columns)
+            definition = (
+                f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                f"{names}, content='{source}', content_rowid='id', tokenize='porter unicode61')"
+            )
+            existing = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).scalar()
+            if existing is not None and existing != definition:
+                # Indexed columns changed: rebuild the table and its triggers
+                for suffix in ("ai", "ad", "au"):
+                    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+                connection.exec_driver_sql(f"DROP TABLE {fts}")
+                existing = None
+
+            if source != table_name:
+                selected = ", ".join(f"{sql.format(row=table_name)} AS {name}" for name, sql in columns.items())
+                connection.exec_driver_sql(f"DROP VIEW IF EXISTS {source}")
+                connection.exec_driver_sql(f"CREATE VIEW {source} AS SELECT id, {selected} FROM {table_name}")
+
+            new_values = ", ".join(sql.format(row="new") for sql in columns.values())
+            old_values = ", ".join(sql.format(row="old") for sql in columns.values())
+            if existing is None:
+                connection.exec_driver_sql(definition)
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+                f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {', '.join(watched)} ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+            if existing is None:
+                # Index the rows that predate the table. Not 'rebuild', which
+                # fails on views that use json_tree()
+                connection.exec_driver_sql(f"INSERT INTO {fts}(rowid, {names}) SELECT id, {names} FROM {source}")
+                logger.info(f"Built search index {fts}")
+
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        # Quote every word and phrase so FTS5 operators in user input are
+        # matched literally
+        return " ".join('"{}"'.format(term.strip('"')) for term in SEARCH_TERM.findall(text))
+
+    def _match(self, query, model, text: str):
+        fts, _, _, _, weights = self.TABLES[model.__tablename__]
+        fts_table = table(fts, column("rowid"))
+        return query.join(fts_table, fts_table.c.rowid == model.id).where(
+            literal_column(fts).op("MATCH")(self._fts_query(text))
+        ), fts, weights
+
+    def match(self, query, model, text: str):
+        query, fts, weights = self._match(query, model, text)
+        # bm25 is lower for better matches
+        return query.add_columns((-func.bm25(literal_column(fts), *weights)).label("score"))
+
+    def snippets(self, query, model, text_column, text: str):
+        query, fts, _ = self._match(query, model, text)
+        columns = list(self.TABLES[model.__tablename__].columns)
+        return query.add_columns(func.snippet(
+            literal_column(fts), columns.index(text_column.key), "<b>", "</b>", "…", 24
+        ).label("snippet"))
+
+
+class SearchService:
+    """Ranked full-text search over a user's content and generations
+
+    Results are ordered by relevance, then id, and paginated with a
+    (score, id) cursor. Snippets are only computed for the rows of the
+    returned page.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def search(
+        self,
+        db: AsyncSession,
+        model,
+        text_column,
+        columns: Sequence,
+        filters: Sequence,
+        text: str,
+        cursor: Optional[str],
+        limit: int
+    ) -> Tuple[List, Optional[str]]:
+        """Return one page of matching rows and the cursor of the next page
+
+        Rows have ``columns`` plus ``score`` and ``snippet``.
+        """
+        if not SEARCH_TERM.search(text):
+            return [], None
+
+        ranked = self.backend.match(select(model.id), model, text).where(*filters).subquery()
+        page = select(ranked.c.id, ranked.c.score)
+        if cursor:
+            score, row_id = decode_rank_cursor(cursor)
+            page = page.where(tuple_(ranked.c.score, ranked.c.id) < (score, row_id))
+        page = (await db.execute(
+            page.order_by(ranked.c.score.desc(), ranked.c.id.desc()).limit(limit + 1)
+        )).all()
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_rank_cursor(page[-1].score, page[-1].id)
+        if not page:
+            return [], None
+
+        scores = {row.id: row.score for row in page}
+        rows = (await db.execute(
+            self.backend.snippets(select(*columns), model, text_column, text).where(model.id.in_(scores))
+        )).all()
+        by_id = {row.id: row for row in rows}
+        results = [
+            {**by_id[row_id]._mapping, "score": score}
+            for row_id, score in scores.items() if row_id in by_id
+        ]
+        return results, next_cursor
+
+
+def create_search_backend(dialect_name: str):
+    """Search backend for a database dialect, or None if unsupported"""
+    if dialect_name == "postgresql":
+        return PostgresSearchBackend(settings.SEARCH_LANGUAGE)
+    if dialect_name == "sqlite":
+        return SQLiteSearchBackend()
+    return None
+
+
+search_service = SearchService(create_search_backend(async_engine.dialect.name))
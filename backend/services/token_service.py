@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from config import settings
+from utils import create_platform_guidelines
+
+logger = logging.getLogger(__name__)
+
+# Heuristic estimate when no tokenizer is available
+CHARS_PER_TOKEN = 4
+TOKENS_PER_WORD = 1.3
+
+# Output is JSON wrapped around the platform text; allow for keys, quotes,
+# escapes and hashtags on top of the text itself
+JSON_OVERHEAD = 1.25
+OUTPUT_EXTRA_TOKENS = 100
+MIN_OUTPUT_TOKENS = 256
+MAX_OUTPUT_TOKENS = 2000
+
+# Pieces of char_limit length in one platform output (a thread has up to 8
+# tweets), and output sizes for formats create_platform_guidelines() does
+# not cover or whose char_limit describes something else
+OUTPUT_PIECES = {"twitter": 8}
+OUTPUT_CHARS = {
+    "tiktok": 1000,  # 60 second script; char_limit is the caption
+    "summary": 2000,  # TL;DR + executive summary + takeaways
+}
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The configured tiktoken encoding, or None to use the heuristic"""
+    name = settings.TOKENIZER_ENCODING
+    if not name or name == "none":
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning(f"tiktoken is not installed, estimating token counts instead of using {name}")
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Tokenizer {name} unavailable, estimating token counts: {e}")
+        return None
+
+
+def load_tokenizer() -> bool:
+    """Load the tokenizer ahead of the first count; True if counts are exact
+
+    tiktoken downloads an encoding's file on first use (cached under
+    TIKTOKEN_CACHE_DIR), so call this off the event loop.
+    """
+    return _encoding() is not None
+
+
+class TokenCounter:
+    """Token counts memoized by text, bounded LRU
+
+    Keys are BLAKE2b digests of the text, so cached counts don't keep
+    large texts alive and different texts never share a count.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+
+        encoding = _encoding()
+        if encoding is not None:
+            count = len(encoding.encode(text, disallowed_special=()))
+        else:
+            count = estimate_tokens(text, exact_words=True)
+
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+
+token_counter = TokenCounter()
+
+
+def estimate_tokens(text: str, exact_words: bool = False) -> int:
+    """Cheap token estimate; O(1) unless ``exact_words`` is set"""
+    if not text:
+        return 0
+    estimate = len(text) / CHARS_PER_TOKEN
+    if exact_words:
+        estimate = max(estimate, len(text.split()) * TOKENS_PER_WORD)
+    return math.ceil(estimate)
+
+
+def count_tokens(text: str) -> int:
+    """Token count from the local tokenizer, or an estimate without one"""
+    return token_counter.count(text)
+
+
+@lru_cache(maxsize=None)
+def max_output_tokens(platform: str) -> int:
+    """Completion budget for one platform, sized from its character limits"""
+    guidelines = create_platform_guidelines().get(platform, {})
+    chars = OUTPUT_CHARS.get(platform)
+    if chars is None and "char_limit" in guidelines:
+        chars = guidelines["char_limit"] * OUTPUT_PIECES.get(platform, 1)
+    if chars is None:
+        return MAX_OUTPUT_TOKENS
+    tokens = math.ceil(chars / CHARS_PER_TOKEN * JSON_OVERHEAD) + OUTPUT_EXTRA_TOKENS
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, tokens))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most ``max_tokens``, preferring a sentence boundary
+
+    The cut point only depends on the text and the budget, so the same
+    input always yields the same prompt (and generation cache key).
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _encoding()
+    if encoding is not None:
+        truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        # Scale by the estimate so the cut lands inside the budget
+        ratio = max_tokens / count_tokens(text)
+        truncated = text[:int(len(text) * ratio)]
+
+    # Back up to the last sentence end if it doesn't cost too much text
+    sentence_end = max(truncated.rfind(". "), truncated.rfind("! "), truncated.rfind("? "))
+    if sentence_end > len(truncated) * 0.8:
+        truncated = truncated[:sentence_end + 1]
+    return truncated.rstrip()
+
+
+class TokenUsage:
+    """Accumulates prompt and completion tokens across model calls"""
+
+    def __init__(self, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+
+    def add_response(self, usage, prompt: str = "", completion: str = "") -> None:
+        """Add an API usage object, or estimate from the texts when missing"""
+        if usage is not None:
+            self.add(usage.prompt_tokens, usage.completion_tokens)
+        else:
+            self.add(count_tokens(prompt), count_tokens(completion))
+
+    def share(self, parts: int) -> "TokenUsage":
+        """An even share of this usage, for calls that served several outputs"""
+        parts = max(1, parts)
+        return TokenUsage(
+            math.ceil(self.prompt_tokens / parts),
+            math.ceil(self.completion_tokens / parts)
+        )
+
+    def as_dict(self) -> dict:
+        return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from services.content_service import ContentParser, USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseTooLargeError(ValueError):
+    """Raised when a fetched page exceeds the configured size cap"""
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL used as a cache key
+
+    Lowercases the scheme and host, drops default ports and the fragment,
+    and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{userinfo}@{host}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def parse_cache_control(value: str) -> dict:
+    """Directives of a Cache-Control header, lowercased; valueless ones map to None"""
+    directives = {}
+    for part in value.split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def shared_max_age(directives: dict) -> Optional[float]:
+    """Seconds a shared cache may serve a response without revalidating
+
+    ``s-maxage`` takes precedence over ``max-age`` and ``no-cache`` means
+    always revalidate. ``None`` when the origin does not say.
+    """
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        value = directives.get(name)
+        if value is not None:
+            return max(int(value), 0) if value.isdigit() else 0
+    return None
+
+
+class UrlCacheEntry:
+    """Extracted text of a page plus its validators"""
+
+    def __init__(
+        self,
+        text: str,
+        etag: str = None,
+        last_modified: str = None,
+        max_age: Optional[float] = None
+    ):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.max_age = max_age
+        self.fetched_at = time.time()
+        self.size = len(text.encode("utf-8"))
+
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class UrlCache:
+    """In-process LRU cache of extracted page text, bounded by total bytes
+
+    Entries younger than ``freshness`` seconds (or the origin's shorter
+    ``max-age``) are served as is; older ones are kept for conditional
+    revalidation until evicted. The cache is shared by all users, so
+    ``private`` and ``no-store`` responses are never stored.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, freshness: float = 300):
+        self.max_bytes = max_bytes
+        self.freshness = freshness
+        self.size = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[UrlCacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: UrlCacheEntry) -> bool:
+        freshness = self.freshness
+        if entry.max_age is not None:
+            freshness = min(freshness, entry.max_age)
+        return time.time() - entry.fetched_at < freshness
+
+    def set(self, key: str, entry: UrlCacheEntry) -> None:
+        if not self.enabled or entry.size > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+        }
+
+
+class UrlFetcher:
+    """Fetch web pages over a shared async connection pool and extract text
+
+    Bodies are streamed (and transparently decompressed) and the fetch is
+    aborted once ``max_bytes`` of decoded content have been read. HTML
+    parsing runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_connections: int = 20,
+        parser: str = "auto",
+        cache: UrlCache = None
+    ):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_connections = max_connections
+        self.parser = parser
+        self.cache = cache or UrlCache(max_bytes=0)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={'User-Agent': USER_AGENT},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def fetch(self, url: str) -> str:
+        """Fetch a page and return its decoded body"""
+        _, body, _ = await self._fetch(url)
+        return body
+
+    async def _fetch(self, url: str, headers: dict = None) -> Tuple[int, Optional[str], httpx.Headers]:
+        """GET a page; returns (status, decoded body or None on 304, headers)
+
+        A 304 is only accepted when conditional ``headers`` were sent.
+        """
+        async with self._get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                if headers:
+                    return 304, None, response.headers
+                raise httpx.HTTPStatusError(
+                    "Unexpected 304 Not Modified for an unconditional request",
+                    request=response.request,
+                    response=response
+                )
+            response.raise_for_status()
+            
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise ResponseTooLargeError(f"Page exceeds {self.max_bytes} bytes")
+            
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ResponseTooLargeError(f"Page exceeds {self.max_bytes} bytes")
+                chunks.append(chunk)
+            
+            body = b"".join(chunks)
+            text = body.decode(response.charset_encoding or "utf-8", errors="replace")
+            return response.status_code, text, response.headers
+
+    async def extract(self, url: str) -> str:
+        """Fetch a page and extract its readable text"""
+        try:
+            return await self._extract(url)
+        except Exception as e:
+            logger.error(f"Error extracting from URL: {str(e)}")
+            raise
+
+    async def _extract(self, url: str) -> str:
+        if not self.cache.enabled:
+            html = await self.fetch(url)
+            return await asyncio.to_thread(ContentParser.html_to_text, html, self.parser)
+        
+        key = normalize_url(url)
+        cached = self.cache.get(key)
+        if cached is not None and self.cache.is_fresh(cached):
+            self.cache.hits += 1
+            return cached.text
+        
+        validators = cached.validators() if cached is not None else None
+        status, html, headers = await self._fetch(url, validators)
+        directives = parse_cache_control(headers.get("cache-control", ""))
+        if status == 304:
+            self.cache.revalidated += 1
+            cached.fetched_at = time.time()
+            cached.etag = headers.get("etag", cached.etag)
+            if "max-age" in directives or "s-maxage" in directives or "no-cache" in directives:
+                cached.max_age = shared_max_age(directives)
+            return cached.text
+        
+        self.cache.misses += 1
+        text = await asyncio.to_thread(ContentParser.html_to_text, html, self.parser)
+        
+        if "no-store" in directives or "private" in directives:
+            self.cache.delete(key)
+        else:
+            self.cache.set(key, UrlCacheEntry(
+                text,
+                etag=headers.get("etag"),
+                last_modified=headers.get("last-modified"),
+                max_age=shared_max_age(directives)
+            ))
+        return text
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
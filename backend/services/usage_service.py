@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import settings
+from database import AsyncSessionLocal, async_engine
+from models import UsageCounter
+from services.token_service import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+# INSERT ... ON CONFLICT DO UPDATE constructs by dialect
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+class PlanQuota(NamedTuple):
+    generations: int  # per window, 0 = unlimited
+    tokens: int  # prompt + completion tokens per window, 0 = unlimited
+
+
+class UsageTotals(NamedTuple):
+    generations: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def __add__(self, other: "UsageTotals") -> "UsageTotals":
+        return UsageTotals(*(a + b for a, b in zip(self, other)))
+
+
+class Reservation(NamedTuple):
+    """Generations counted against a user's quota, and the window they count in"""
+    user_id: int
+    window_start: datetime
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user's plan quota for the current window is used up"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_plan_quotas(spec: str) -> Dict[str, PlanQuota]:
+    """Parse "plan:generations:tokens,..." (0 = unlimited)"""
+    quotas = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        plan, generations, tokens = entry.split(":")
+        quotas[plan.strip()] = PlanQuota(int(generations), int(tokens))
+    return quotas
+
+
+class _Stored(NamedTuple):
+    window_start: datetime
+    totals: UsageTotals
+    loaded_at: float
+
+
+class UsageMeter:
+    """Per-user generation and token counters with plan quotas
+
+    Usage is counted in fixed windows of ``window_seconds``. Counts are
+    kept in memory and added to the ``usage_counters`` table by a
+    background task every ``flush_interval`` seconds, all users in one
+    statement. Quota checks read the memory counters; a user's stored
+    total is loaded once per window and reloaded after
+    ``refresh_interval`` seconds to pick up other workers' usage, so
+    several workers together can overshoot a quota by what they serve
+    within that interval.
+
+    Generations are reserved before the model is called and released if
+    they fail; tokens are recorded once known. Both go to the window the
+    reservation was made in, even if it has ended since. Plans missing from
+    ``quotas`` get ``default_plan``'s quota.
+    """
+
+    def __init__(
+        self,
+        quotas: Dict[str, PlanQuota],
+        default_plan: str = "free",
+        window_seconds: int = 86400,
+        flush_interval: float = 10,
+        refresh_interval: float = 60
+    ):
+        self.quotas = quotas
+        self.default_plan = default_plan
+        self.window_seconds = window_seconds
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._stored: Dict[int, _Stored] = {}
+        # Counts not yet written, and counts being written, by (user, window)
+        self._pending: Dict[Tuple[int, datetime], UsageTotals] = {}
+        self._flushing: Dict[Tuple[int, datetime], UsageTotals] = {}
+        # Orders loads against flushes so no flushed count is lost or doubled
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def quota(self, plan: str) -> PlanQuota:
+        """A plan's quota; no quota at all means unlimited"""
+        return self.quotas.get(plan) or self.quotas.get(self.default_plan) or PlanQuota(0, 0)
+
+    def window_start(self, now: float = None) -> datetime:
+        now = time.time() if now is None else now
+        return datetime.utcfromtimestamp(now - now % self.window_seconds)
+
+    def _retry_after(self) -> int:
+        now = time.time()
+        return int(self.window_seconds - now % self.window_seconds) + 1
+
+    async def start(self) -> None:
+        """Start the periodic flush task"""
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _load(self, user_id: int, window: datetime) -> UsageTotals:
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                row = (await db.execute(
+                    select(
+                        UsageCounter.generations,
+                        UsageCounter.prompt_tokens,
+                        UsageCounter.completion_tokens
+                    ).where(
+                        UsageCounter.user_id == user_id,
+                        UsageCounter.window_start == window
+                    )
+                )).first()
+            totals = UsageTotals(*row) if row else UsageTotals()
+            self._stored[user_id] = _Stored(window, totals, time.monotonic())
+            return totals
+
+    async def usage(self, user_id: int, window: datetime = None) -> UsageTotals:
+        """The user's usage in the current window"""
+        window = window or self.window_start()
+        stored = self._stored.get(user_id)
+        if (
+            stored is None
+            or stored.window_start != window
+            or time.monotonic() - stored.loaded_at > self.refresh_interval
+        ):
+            totals = await self._load(user_id, window)
+        else:
+            totals = stored.totals
+        key = (user_id, window)
+        return totals + self._flushing.get(key, UsageTotals()) + self._pending.get(key, UsageTotals())
+
+    async def reserve(self, user_id: int, plan: str, generations: int = 1) -> Reservation:
+        """Count ``generations`` against the user's quota before running them
+
+        Raises QuotaExceeded if they don't fit in the plan's quota.
+        """
+        reservation = Reservation(user_id, self.window_start())
+        quota = self.quota(plan)
+        if quota.generations or quota.tokens:
+            used = await self.usage(user_id, reservation.window_start)
+            if quota.generations and used.generations + generations > quota.generations:
+                raise QuotaExceeded(
+                    f"The {plan} plan allows {quota.generations} generations per window "
+                    f"({used.generations} used)",
+                    self._retry_after()
+                )
+            if quota.tokens and used.total_tokens >= quota.tokens:
+                raise QuotaExceeded(
+                    f"The {plan} plan allows {quota.tokens} tokens per window ({used.total_tokens} used)",
+                    self._retry_after()
+                )
+        self.record(user_id, generations=generations, window=reservation.window_start)
+        return reservation
+
+    def release(self, reservation: Reservation, generations: int) -> None:
+        """Give back reserved generations that did not complete"""
+        if generations:
+            self.record(reservation.user_id, generations=-generations, window=reservation.window_start)
+
+    def settle(
+        self,
+        reservation: Reservation,
+        reserved: int,
+        completed: int,
+        usages: Iterable[TokenUsage]
+    ) -> None:
+        """Release the reserved generations that did not complete and record the tokens spent"""
+        self.release(reservation, reserved - completed)
+        total = TokenUsage()
+        for usage in usages:
+            total.add(usage.prompt_tokens, usage.completion_tokens)
+        self.record(reservation.user_id, total, window=reservation.window_start)
+
+    def record(
+        self,
+        user_id: int,
+        usage: TokenUsage = None,
+        generations: int = 0,
+        window: datetime = None
+    ) -> None:
+        """Add generations and/or token usage to ``window``, by default the current one"""
+        delta = UsageTotals(
+            generations,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0
+        )
+        if not any(delta):
+            return
+        key = (user_id, window or self.window_start())
+        self._pending[key] = self._pending.get(key, UsageTotals()) + delta
+
+    async def flush(self) -> None:
+        """Add the pending counts to the usage table with one upsert"""
+        if not self._pending:
+            return
+        async with self._lock:
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await self._upsert(self._flushing)
+            except Exception as e:
+                logger.error(f"Flushing usage counters failed: {str(e)}")
+                # Keep the counts for the next flush
+                for key, totals in self._flushing.items():
+                    self._pending[key] = self._pending.get(key, UsageTotals()) + totals
+                self._flushing = {}
+                return
+
+            for (user_id, window), totals in self._flushing.items():
+                stored = self._stored.get(user_id)
+                if stored is not None and stored.window_start == window:
+                    self._stored[user_id] = stored._replace(totals=stored.totals + totals)
+            self._flushing = {}
+
+            # Forget users whose window has ended
+            current = self.window_start()
+            for user_id in [user_id for user_id, stored in self._stored.items() if stored.window_start != current]:
+                del self._stored[user_id]
+
+    async def _upsert(self, counts: Dict[Tuple[int, datetime], UsageTotals]) -> None:
+        upsert_insert = UPSERT_INSERTS[async_engine.dialect.name]
+        now = datetime.utcnow()
+        statement = upsert_insert(UsageCounter).values([
+            {
+                "user_id": user_id,
+                "window_start": window,
+                "generations": totals.generations,
+                "prompt_tokens": totals.prompt_tokens,
+                "completion_tokens": totals.completion_tokens,
+                "updated_at": now,
+            }
+            for (user_id, window), totals in counts.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[UsageCounter.user_id, UsageCounter.window_start],
+            set_={
+                "generations": UsageCounter.generations + statement.excluded.generations,
+                "prompt_tokens": UsageCounter.prompt_tokens + statement.excluded.prompt_tokens,
+                "completion_tokens": UsageCounter.completion_tokens + statement.excluded.completion_tokens,
+                "updated_at": statement.excluded.updated_at,
+            }
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def snapshot(self, user_id: int, plan: str) -> dict:
+        """Current window usage and the plan's limits"""
+        used = await self.usage(user_id)
+        quota = self.quota(plan)
+        window = self.window_start()
+        return {
+            "window_start": window,
+            "window_end": window + timedelta(seconds=self.window_seconds),
+            **used._asdict(),
+            "generation_limit": quota.generations or None,
+            "token_limit": quota.tokens or None,
+        }
+
+
+usage_meter = UsageMeter(
+    parse_plan_quotas(settings.PLAN_QUOTAS),
+    window_seconds=settings.USAGE_WINDOW_SECONDS,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL,
+    refresh_interval=settings.USAGE_REFRESH_INTERVAL
+)
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# Settings and engines are created at import time, so point them at a
+# throwaway database before any application module is imported
+_data_dir = tempfile.mkdtemp(prefix="repurpose-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_data_dir}/test.db")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_data_dir, "uploads"))
+os.environ.setdefault("GENERATION_CACHE_PATH", os.path.join(_data_dir, "generation_cache.sqlite3"))
+os.environ["GROQ_API_KEY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the schema in the throwaway database, as the app does on startup"""
+    from database import Base, engine
+    from migrations import upgrade
+    import models  # noqa: F401  registers the tables
+
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        upgrade(connection)
+    return engine
+
+
+@pytest.fixture
+def user(database):
+    """A freshly created user"""
+    from database import SessionLocal
+    from models import User
+
+    name = uuid.uuid4().hex[:12]
+    with SessionLocal() as db:
+        user = User(email=f"{name}@example.com", username=name, password_hash="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    return user
+
+
+@pytest.fixture
+def run(database):
+    """Run a coroutine on a fresh event loop
+
+    Pooled connections are tied to the loop that opened them, so the
+    async engine is disposed before the loop closes.
+    """
+    from database import async_engine
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return run
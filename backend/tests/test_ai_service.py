@@ -0,0 +1,232 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from config import settings
+from services import ai_service
+from services.ai_service import AIService
+from services.cache_service import GenerationCache, MemoryCacheBackend
+from services.llm_scheduler import LLMScheduler
+from services.content_service import ContentParser
+from services.token_service import count_tokens
+
+REPLY = ['{"content": ', '"Short post about the article", ', '"hashtags": []}']
+
+
+def chunk(text=None, usage=None):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else [],
+        x_groq=SimpleNamespace(usage=usage) if usage is not None else None
+    )
+
+
+class StreamingClient:
+    """Chat client whose streams yield ``chunks``, with no usage chunk unless given"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        async def stream():
+            for item in self.chunks:
+                yield item
+        return stream()
+
+
+class RecordingScheduler(LLMScheduler):
+    def __init__(self):
+        super().__init__(tokens_per_minute=100_000)
+        self.settled = []
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        self.settled.append((estimated_tokens, actual_tokens))
+        super().record_usage(estimated_tokens, actual_tokens)
+
+
+def make_service(chunks):
+    service = AIService()
+    service.client = StreamingClient(chunks)
+    service.scheduler = RecordingScheduler()
+    service.cache = GenerationCache(None)
+    return service
+
+
+async def collect(service, stop_after=None):
+    events = []
+    stream = service.stream_for_platform("An article about testing.", "linkedin", "casual", use_cache=False)
+    async for event in stream:
+        events.append(event)
+        if stop_after is not None and len(events) == stop_after:
+            await stream.aclose()
+            break
+    return events
+
+
+def test_stream_without_usage_chunk_settles_on_counted_tokens():
+    service = make_service([chunk(text) for text in REPLY])
+    events = asyncio.run(collect(service))
+
+    assert events[-1][0] == "result"
+    [(estimated, spent)] = service.scheduler.settled
+    # The estimate includes the whole max_tokens completion budget
+    assert count_tokens("".join(REPLY)) < spent < estimated
+
+
+def test_stream_usage_chunk_is_what_gets_spent():
+    usage = SimpleNamespace(prompt_tokens=300, completion_tokens=20, total_tokens=320)
+    service = make_service([chunk(text) for text in REPLY] + [chunk(usage=usage)])
+    asyncio.run(collect(service))
+
+    assert [spent for _, spent in service.scheduler.settled] == [320]
+
+
+def test_abandoned_stream_settles_its_reservation():
+    service = make_service([chunk(text) for text in REPLY])
+    events = asyncio.run(collect(service, stop_after=1))
+
+    assert events == [("token", REPLY[0])]
+    [(estimated, spent)] = service.scheduler.settled
+    assert 0 < spent < estimated
+
+
+def test_combined_response_is_split_by_platform():
+    service = AIService()
+    response = 'Here you go:\n' + json.dumps({
+        "twitter": {"tweets": ["Hi"]},
+        "linkedin": {},
+        "email": "not an object",
+    }) + "\nThanks"
+
+    assert service._parse_combined_response(response, ["twitter", "linkedin", "email"]) == {
+        "twitter": {"tweets": ["Hi"]}
+    }
+    assert service._parse_combined_response("No JSON at all", ["twitter"]) == {}
+
+
+def test_truncated_combined_response_keeps_intact_sections():
+    service = AIService()
+    response = '{"twitter": {"tweets": ["Hi", "there"]}, "linkedin": {"post": "Long post that was cut'
+
+    assert service._parse_combined_response(response, ["twitter", "linkedin"]) == {
+        "twitter": {"tweets": ["Hi", "there"]}
+    }
+
+
+class CombinedClient:
+    """Answers the combined prompt with only some platforms, and single prompts with a post"""
+
+    def __init__(self, combined_reply):
+        self.combined_reply = combined_reply
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        combined = "twitter" in messages[-1]["content"] and "linkedin" in messages[-1]["content"]
+        self.calls.append("combined" if combined else "single")
+        content = self.combined_reply if combined else json.dumps({"post": "Single post"})
+        usage = SimpleNamespace(prompt_tokens=300, completion_tokens=30, total_tokens=330)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def test_combined_mode_generates_missing_platforms_individually():
+    service = make_service([])
+    service.client = CombinedClient(json.dumps({"twitter": {"tweets": ["Combined tweet"]}}))
+    usage = {}
+
+    results = asyncio.run(service.generate_repurposed_content(
+        "An article about testing.", ["twitter", "linkedin"], "casual",
+        use_cache=False, mode="combined", usage=usage
+    ))
+
+    assert results == {"twitter": {"tweets": ["Combined tweet"]}, "linkedin": {"post": "Single post"}}
+    assert service.client.calls == ["combined", "single"]
+    # The combined call is shared by both platforms; LinkedIn also pays for its own call
+    assert usage["twitter"].total_tokens == 165
+    assert usage["linkedin"].total_tokens == 165 + 330
+
+
+class SlowClient:
+    """Answers after a short wait, failing for email, and tracks calls in flight"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if "email" in messages[-1]["content"].lower():
+                raise RuntimeError("email model down")
+            content = json.dumps({"post": "Post"})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+        finally:
+            self.in_flight -= 1
+
+
+def test_platforms_run_concurrently_up_to_the_limit_and_fail_alone():
+    service = make_service([])
+    service.client = SlowClient()
+    platforms = ["twitter", "email", "linkedin", "facebook", "instagram"]
+
+    results = asyncio.run(service.generate_repurposed_content(
+        "An article about testing.", platforms, "casual",
+        max_concurrency=2, use_cache=False, mode="per_platform"
+    ))
+
+    assert list(results) == platforms
+    assert results["email"] == {"error": "email model down"}
+    assert all(results[platform] == {"post": "Post"} for platform in platforms if platform != "email")
+    assert service.client.peak == 2
+
+
+class SummaryClient:
+    """Summarizes each chunk to one short line, counting the chunks it was sent"""
+
+    def __init__(self):
+        self.chunks = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        chunk = messages[-1]["content"].split("DOCUMENT PART:\n", 1)[1]
+        self.chunks.append(chunk)
+        await asyncio.sleep(0.01)
+        content = f"Summary {len(self.chunks)}."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def test_long_content_is_condensed_once_per_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "LONG_CONTENT_THRESHOLD_TOKENS", 300)
+    monkeypatch.setattr(settings, "CHUNK_MAX_TOKENS", 150)
+    service = make_service([])
+    service.client = SummaryClient()
+    service.cache = GenerationCache(MemoryCacheBackend())
+    counted_on = set()
+
+    def counting(text):
+        counted_on.add(threading.current_thread() is threading.main_thread())
+        return count_tokens(text)
+
+    monkeypatch.setattr(ai_service, "count_tokens", counting)
+    article = " ".join(f"Paragraph {i} explains one more detail of the long article." for i in range(150))
+    chunks = ContentParser.split_into_chunks(article, 150)
+    assert len(chunks) > 3
+
+    async def condense_for_two_platforms(text):
+        return await asyncio.gather(service.condense_content(text), service.condense_content(text))
+
+    first, second = asyncio.run(condense_for_two_platforms(article))
+    assert first == second and count_tokens(first) <= 300
+    assert sorted(service.client.chunks) == sorted(chunks)
+
+    # After an edit at the end only the chunks around it are summarized again
+    service.client.chunks = []
+    edited = article.replace("Paragraph 149 explains", "Paragraph 149 now explains")
+    asyncio.run(service.condense_content(edited))
+    assert 0 < len(service.client.chunks) <= 2
+    # Documents are tokenized off the event loop
+    assert counted_on == {False}
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from api.auth import get_current_user
+from config import settings
+from database import AsyncSessionLocal, SessionLocal
+from models import User
+from services import auth_service
+from services.auth_service import AuthService, TokenCache, UserSnapshot, token_cache, user_claims
+
+USER = SimpleNamespace(id=7, email="a@example.com", username="a", plan="pro", is_active=True)
+
+
+def test_claims_round_trip_to_a_snapshot():
+    snapshot = UserSnapshot.from_claims(user_claims(USER))
+    assert (snapshot.id, snapshot.email, snapshot.plan, snapshot.is_active) == (7, "a@example.com", "pro", True)
+    assert snapshot.trusted_claims and snapshot.created_at is None
+
+
+def test_token_cache_expires_and_is_invalidated_per_user(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth_service.time, "monotonic", lambda: now[0])
+    cache = TokenCache(ttl=60)
+    alice, bob = UserSnapshot(1), UserSnapshot(2)
+
+    cache.set("a1", alice)
+    cache.set("a2", alice)
+    cache.set("b1", bob)
+    assert cache.get("a1") is alice
+
+    cache.invalidate_user(1)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") is bob
+
+    now[0] += 60
+    assert cache.get("b1") is None
+    assert cache._entries == {} and cache._tokens_by_user == {}
+
+
+def test_token_cache_never_outlives_the_token():
+    cache = TokenCache(ttl=60)
+    cache.set("expired", UserSnapshot(1), token_exp=time.time() - 1)
+    cache.set("expiring", UserSnapshot(1), token_exp=time.time() + 0.05)
+    assert cache.get("expired") is None
+    assert cache.get("expiring") is not None
+    time.sleep(0.06)
+    assert cache.get("expiring") is None
+
+    disabled = TokenCache(ttl=0)
+    disabled.set("token", UserSnapshot(1))
+    assert disabled.get("token") is None
+
+
+def test_token_cache_evicts_the_oldest_entry_when_full():
+    cache = TokenCache(ttl=60, max_entries=2)
+    for token, user_id in [("t1", 1), ("t2", 2), ("t3", 2)]:
+        cache.set(token, UserSnapshot(user_id))
+    assert cache.get("t1") is None
+    assert cache.get("t2") is not None and cache.get("t3") is not None
+    assert 1 not in cache._tokens_by_user
+
+
+def test_password_hashing_runs_in_its_own_pool(monkeypatch):
+    threads = []
+
+    class RecordingContext:
+        def hash(self, password):
+            threads.append(threading.current_thread().name)
+            return f"hashed:{password}"
+
+        def verify(self, password, hashed):
+            threads.append(threading.current_thread().name)
+            return hashed == f"hashed:{password}"
+
+    monkeypatch.setattr(auth_service, "pwd_context", RecordingContext())
+
+    async def main():
+        hashed = await AuthService.hash_password_async("secret")
+        return await AuthService.verify_password_async("secret", hashed)
+
+    assert asyncio.run(main()) is True
+    assert len(threads) == 2
+    assert all(name.startswith("password-hash") for name in threads)
+
+
+@pytest.mark.parametrize("trust_claims", [False, True])
+def test_inactive_users_are_refused_and_not_cached(user, run, monkeypatch, trust_claims):
+    monkeypatch.setattr(settings, "AUTH_TRUST_TOKEN_CLAIMS", trust_claims)
+    with SessionLocal() as db:
+        db.get(User, user.id).is_active = False
+        db.commit()
+    user.is_active = False
+    token = AuthService.create_access_token(user_claims(user))
+
+    async def authenticate():
+        async with AsyncSessionLocal() as db:
+            return await get_current_user(f"Bearer {token}", db)
+
+    with pytest.raises(HTTPException) as refused:
+        run(authenticate())
+    assert refused.value.status_code == 403
+    assert token_cache.get(token) is None
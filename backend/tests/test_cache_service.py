@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+from services.cache_service import GenerationCache, MemoryCacheBackend, SQLiteCacheBackend
+
+
+def test_sqlite_backend_tracks_count_across_replace_and_eviction(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=10, ttl=100)
+    for i in range(25):
+        backend.set(f"k{i}", {"v": i})
+    backend.set("k24", {"v": "replaced"})
+
+    assert len(backend) == backend._read_count() == 10
+    # Least recently used entries went first
+    assert backend.get("k0") is None
+    assert backend.get("k24") == {"v": "replaced"}
+
+    backend.delete("k24")
+    backend.delete("missing")
+    assert len(backend) == backend._read_count() == 9
+
+
+def test_sqlite_backend_sweep_resyncs_count_and_expires(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteCacheBackend(path, max_entries=100, ttl=100, sweep_interval=0)
+    backend.set("a", {"v": 1})
+    # Another process writing to the same file
+    SQLiteCacheBackend(path, max_entries=100, ttl=100).set("b", {"v": 2})
+    backend._conn.execute("UPDATE generation_cache SET stored_at = 0 WHERE key = 'a'")
+    backend.set("c", {"v": 3})
+
+    assert backend.get("a") is None
+    assert len(backend) == 2
+
+
+def test_generation_cache_runs_sqlite_calls_off_the_event_loop(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    cache = GenerationCache(backend)
+    threads = []
+    original_get = backend.get
+
+    def recording_get(key):
+        threads.append(threading.current_thread())
+        return original_get(key)
+
+    backend.get = recording_get
+
+    async def run():
+        await cache.set("key", {"post": "hello"})
+        return await cache.get("key"), await cache.get("other")
+
+    assert asyncio.run(run()) == ({"post": "hello"}, None)
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
+    assert cache.stats() == {
+        "backend": "SQLiteCacheBackend",
+        "entries": 1,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_memory_backend_is_called_inline():
+    cache = GenerationCache(MemoryCacheBackend(max_entries=2))
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await cache.set(key, {"key": key})
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [None, {"key": "b"}, {"key": "c"}]
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import main
+from config import settings
+from database import (
+    Histogram, InstrumentedAsyncPool, PoolMetrics, async_engine, get_db, pool_metrics, pool_options, to_async_url
+)
+from models import User
+
+
+def test_urls_map_to_async_drivers():
+    url = to_async_url("postgresql://u:p@db:5432/app?sslmode=require")
+    assert url.drivername == "postgresql+asyncpg"
+    assert dict(url.query) == {"ssl": "require"}
+    assert to_async_url("sqlite:///./app.db").drivername == "sqlite+aiosqlite"
+
+
+def test_request_sessions_are_async_and_usable_after_commit(user, run):
+    async def rename():
+        sessions = get_db()
+        db = await anext(sessions)
+        try:
+            loaded = await db.get(User, user.id)
+            loaded.username = loaded.username.upper()
+            await db.commit()
+            # Reading after commit must not trigger a lazy (blocking) refresh
+            return loaded.username
+        finally:
+            await sessions.aclose()
+
+    assert async_engine.dialect.driver in ("aiosqlite", "asyncpg")
+    assert run(rename()) == user.username.upper()
+
+
+def test_pool_options_leave_sqlite_alone():
+    assert pool_options("sqlite:///./app.db") == {}
+    options = pool_options("postgresql://u:p@db/app")
+    assert options["poolclass"] is InstrumentedAsyncPool
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram()
+    for value in [0.5, 1, 3, 6000]:
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"]["le_1ms"] == 2
+    assert snapshot["buckets"]["le_5ms"] == 1
+    assert snapshot["buckets"]["gt_5000ms"] == 1
+    assert (snapshot["count"], snapshot["max_ms"]) == (4, 6000)
+
+
+def test_pool_metrics_count_checkouts_holds_and_timeouts(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.db",
+        poolclass=InstrumentedAsyncPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05
+    )
+    metrics = PoolMetrics()
+    metrics.attach(engine.sync_engine.pool)
+    timeouts = pool_metrics.timeouts
+
+    async def checkouts():
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                with pytest.raises(PoolTimeoutError):
+                    async with engine.connect():
+                        pass
+            return metrics.snapshot(engine.sync_engine.pool)
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(checkouts())
+    assert (stats["pool_size"], stats["checked_out"]) == (1, 0)
+    assert (stats["connects"], stats["checkouts"]) == (1, 1)
+    assert stats["hold"]["count"] == 1
+    assert pool_metrics.timeouts == timeouts + 1
+
+
+def test_pool_stats_need_the_internal_token(database, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "secret")
+    with TestClient(main.app) as client:
+        assert client.get("/api/internal/db-pool").status_code == 404
+        assert client.get("/api/internal/db-pool", headers={"X-Internal-Token": "wrong"}).status_code == 404
+        response = client.get("/api/internal/db-pool", headers={"X-Internal-Token": "secret"})
+    assert response.status_code == 200
+    assert {"pool_class", "checkouts", "wait", "hold"} <= set(response.json())
@@ -0,0 +1,70 @@
+from database import AsyncSessionLocal, SessionLocal
+from models import Content, ContentSignature
+from services.dedup_service import DedupIndex, LSHIndex, band_rows, jaccard
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def test_band_rows_keeps_the_s_curve_midpoint_below_the_threshold():
+    for num_perm, threshold in [(128, 0.85), (128, 0.5), (64, 0.9), (100, 0.7)]:
+        rows = band_rows(num_perm, threshold)
+        assert num_perm % rows == 0
+        assert (rows / num_perm) ** (1 / rows) < threshold
+    # A larger band would push the midpoint past the threshold
+    assert band_rows(128, 0.85) == 8
+    assert (1 / 8) ** (1 / 16) > 0.85
+    assert band_rows(128, 0.01) == 1
+
+
+def test_lsh_index_finds_near_duplicates_and_forgets_removed_keys():
+    dedup = DedupIndex(threshold=0.8)
+    original = dedup.signature(TEXT)
+    edited = dedup.signature(TEXT.replace("word100", "changed"))
+    unrelated = dedup.signature(" ".join(f"other{i}" for i in range(200)))
+
+    index = LSHIndex(dedup.num_perm, dedup.rows)
+    index.add("original", original)
+    index.add("unrelated", unrelated)
+
+    matches = index.query(edited, 0.8)
+    assert [key for key, _ in matches] == ["original"]
+    assert matches[0][1] == jaccard(edited, original) >= 0.8
+
+    index.add("copy", original)
+    assert [key for key, _ in index.query(original, 0.8)] in (["original", "copy"], ["copy", "original"])
+    index.remove("original")
+    index.remove("missing")
+    assert "original" not in index and len(index) == 2
+    assert [key for key, _ in index.query(original, 0.8)] == ["copy"]
+
+
+def test_rows_committed_out_of_id_order_are_loaded(user, run):
+    dedup = DedupIndex(threshold=0.8)
+    signature = dedup.signature(TEXT)
+
+    def create_content():
+        with SessionLocal() as db:
+            content = Content(user_id=user.id, title="t", original_content=TEXT, content_type="text")
+            db.add(content)
+            db.commit()
+            return content.id
+
+    def store_signature(content_id):
+        with SessionLocal() as db:
+            db.add(ContentSignature(content_id=content_id, user_id=user.id, signature=signature.tobytes()))
+            db.commit()
+
+    async def find():
+        async with AsyncSessionLocal() as db:
+            return await dedup.find_duplicate(db, user.id, signature)
+
+    # The earlier id's transaction is still open when the later one is loaded
+    earlier, later = create_content(), create_content()
+    store_signature(later)
+    assert run(find())[0] == later
+    with SessionLocal() as db:
+        db.delete(db.get(Content, later))
+        db.commit()
+    store_signature(earlier)
+
+    assert run(find())[0] == earlier
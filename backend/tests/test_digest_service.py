@@ -0,0 +1,48 @@
+from database import SessionLocal
+from models import Content, ContentDigest
+from services.cache_service import content_hash
+from services.digest_service import compute_digest, detect_language, store_digests
+
+ENGLISH = "The cat is in the garden and it is happy. " * 40
+SPANISH = "El perro está en la casa y los niños juegan con la pelota para el día. " * 20
+
+
+def test_digest_fields():
+    digest = compute_digest(ENGLISH)
+    assert digest["content_hash"] == content_hash(ENGLISH)
+    assert digest["reading_time_minutes"] == 2
+    assert digest["token_count"] > 0
+    assert len(digest["key_points"]) == len(set(digest["key_points"])) <= 5
+    assert detect_language(SPANISH) in ("es", "und") and detect_language("Hi") == "und"
+
+
+def test_digests_are_stored_and_only_recomputed_when_the_text_changes(user, run):
+    with SessionLocal() as db:
+        contents = [
+            Content(user_id=user.id, title=str(i), original_content=text, content_type="text")
+            for i, text in enumerate([ENGLISH, SPANISH])
+        ]
+        db.add_all(contents)
+        db.commit()
+        ids = [content.id for content in contents]
+
+    def digests():
+        with SessionLocal() as db:
+            rows = db.query(ContentDigest).filter(ContentDigest.content_id.in_(ids)).all()
+            return {row.content_id: (row.content_hash, row.updated_at) for row in rows}
+
+    run(store_digests(ids))
+    stored = digests()
+    assert {content_id: digest_hash for content_id, (digest_hash, _) in stored.items()} == {
+        ids[0]: content_hash(ENGLISH), ids[1]: content_hash(SPANISH)
+    }
+
+    with SessionLocal() as db:
+        db.get(Content, ids[1]).original_content = ENGLISH
+        db.commit()
+    run(store_digests(ids))
+    restored = digests()
+
+    assert restored[ids[0]] == stored[ids[0]]
+    assert restored[ids[1]][0] == content_hash(ENGLISH)
+    assert run(store_digests([])) is None
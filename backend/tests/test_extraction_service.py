@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services.extraction_service import DocumentExtractor, ExtractionTimeoutError
+
+
+# Run in the worker processes, so they must be importable module-level functions
+
+def sleep_then_return(seconds: float, value):
+    time.sleep(seconds)
+    return value
+
+
+def exit_worker():
+    os._exit(3)
+
+
+def fail(message: str):
+    raise ValueError(message)
+
+
+def worker_pid():
+    return os.getpid()
+
+
+@pytest.fixture
+def extractor():
+    extractor = DocumentExtractor(max_workers=2, timeout=1, memory_limit_mb=0)
+    yield extractor
+    extractor.shutdown()
+
+
+def test_timeout_only_stops_its_own_worker(extractor):
+    extractor.timeout = 2
+
+    async def other_document():
+        await asyncio.sleep(1)
+        # Still running when the slow document times out at 2 s
+        return await extractor._with_timeout(extractor._submit(sleep_then_return, 1.5, "other"), "other.pdf")
+
+    async def run():
+        slow = extractor._with_timeout(extractor._submit(sleep_then_return, 30, "slow"), "slow.pdf")
+        results = await asyncio.gather(slow, other_document(), return_exceptions=True)
+        # The surviving worker and a replacement serve the next calls
+        results.append(await asyncio.gather(*(extractor._submit(sleep_then_return, 0, i) for i in range(2))))
+        return results
+
+    slow_result, other_result, next_results = asyncio.run(run())
+
+    assert isinstance(slow_result, ExtractionTimeoutError)
+    assert other_result == "other"
+    assert next_results == [0, 1]
+
+
+def test_dead_worker_is_replaced(extractor):
+    async def run():
+        first = await extractor._submit(worker_pid)
+        with pytest.raises(BrokenProcessPool):
+            await extractor._submit(exit_worker)
+        return first, await extractor._submit(worker_pid)
+
+    first, second = asyncio.run(run())
+    assert first != second
+
+
+def test_parser_errors_keep_the_worker(extractor):
+    async def run():
+        first = await extractor._submit(worker_pid)
+        with pytest.raises(ValueError, match="bad document"):
+            await extractor._submit(fail, "bad document")
+        return first, await extractor._submit(worker_pid)
+
+    first, second = asyncio.run(run())
+    assert first == second
+
+
+def test_plain_text_is_read_without_a_worker(extractor, tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text("hello", encoding="utf-8")
+
+    assert asyncio.run(extractor.extract(str(path))) == "hello"
+    assert not extractor._idle
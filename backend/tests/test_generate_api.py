@@ -0,0 +1,249 @@
+import asyncio
+import json
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from api import generate
+from schemas import GenerationCreate
+from services.job_service import JobQueueFull
+from services.usage_service import PlanQuota, UsageMeter
+
+
+class ChatClient:
+    """Chat completions client answering with a fixed post, or failing"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, stream=False, **kwargs):
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        reply = json.dumps({"post": "A fresh post", "hashtags": []})
+        if stream:
+            return self.stream(reply)
+        message = SimpleNamespace(content=reply)
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def stream(self, reply):
+        for start in range(0, len(reply), 10):
+            delta = SimpleNamespace(content=reply[start:start + 10])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], x_groq=None)
+
+
+@pytest.fixture
+def api(database, monkeypatch):
+    monkeypatch.setattr(generate.ai_service, "client", ChatClient())
+    with TestClient(main.app) as client:
+        name = uuid.uuid4().hex[:12]
+        credentials = {"email": f"{name}@example.com", "password": "password123"}
+        client.post("/api/auth/register", json={**credentials, "username": name})
+        token = client.post("/api/auth/login", json=credentials).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+
+def generations_used(api):
+    return api.get("/api/user/usage").json()["generations"]
+
+
+def upload(api, text="Some text worth repurposing. " * 20):
+    return api.post("/api/content/upload", json={
+        "title": "T", "original_content": text, "content_type": "text"
+    }).json()["id"]
+
+
+def wait_for_job(api, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = api.get(f"/api/generate/jobs/{job_id}").json()
+        if job["finished_at"] or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_batch_job_generates_every_pair_and_counts_what_completed(api, fail):
+    content_ids = [upload(api), upload(api, "Another text to repurpose. " * 20)]
+    used = generations_used(api)
+    generate.ai_service.client.fail = fail
+
+    response = api.post("/api/generate/batch", json={
+        "content_ids": content_ids, "platforms": ["linkedin", "twitter", "linkedin"],
+        "tone": "casual", "use_cache": False
+    })
+    assert response.status_code == 202
+    job = wait_for_job(api, response.json()["job_id"])
+
+    assert [(task["content_id"], task["platform"]) for task in job["tasks"]] == [
+        (content_id, platform) for content_id in content_ids for platform in ["linkedin", "twitter"]
+    ]
+    if fail:
+        assert job["status"] == "failed" and job["failed"] == 4
+        assert generations_used(api) == used
+    else:
+        assert job["status"] == "completed" and job["completed"] == 4
+        for task in job["tasks"]:
+            stored = api.get(f"/api/generate/{task['generation_id']}").json()
+            assert (stored["content_id"], stored["platform"]) == (task["content_id"], task["platform"])
+        assert generations_used(api) == used + 4
+
+
+def test_batch_with_unknown_content_is_refused_without_counting(api):
+    used = generations_used(api)
+    response = api.post("/api/generate/batch", json={
+        "content_ids": [upload(api), 10 ** 9], "platforms": ["linkedin"], "tone": "casual"
+    })
+    assert response.status_code == 404
+    assert str(10 ** 9) in response.json()["detail"]
+    assert generations_used(api) == used
+
+
+def sse_events(response):
+    return [
+        (event.split("\n")[0][len("event: "):], json.loads(event.split("\n")[1][len("data: "):]))
+        for event in response.text.strip().split("\n\n")
+    ]
+
+
+def test_stream_sends_tokens_then_saved_results(api):
+    content_id = upload(api)
+    used = generations_used(api)
+
+    response = api.post("/api/generate/repurpose/stream", json={
+        "content_id": content_id, "platforms": ["linkedin", "twitter", "linkedin"],
+        "tone": "casual", "use_cache": False
+    })
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response)
+
+    assert events[-1] == ("done", {"content_id": content_id})
+    results = {data["platform"]: data for kind, data in events if kind == "result"}
+    assert set(results) == {"linkedin", "twitter"}
+    for platform, result in results.items():
+        tokens = "".join(data["delta"] for kind, data in events if kind == "token" and data["platform"] == platform)
+        assert json.loads(tokens) == result["result"]
+        stored = api.get(f"/api/generate/{result['generation_id']}").json()
+        assert stored["platform"] == platform and stored["output"] == result["result"]
+    assert generations_used(api) == used + 2
+
+
+def test_stream_reports_generations_that_could_not_be_saved(api, monkeypatch):
+    content_id = upload(api)
+    used = generations_used(api)
+    save_generation = generate._save_generation
+
+    async def save_all_but_twitter(content_id, user_id, platform, *args):
+        if platform == "twitter":
+            raise RuntimeError("database is gone")
+        return await save_generation(content_id, user_id, platform, *args)
+
+    monkeypatch.setattr(generate, "_save_generation", save_all_but_twitter)
+    response = api.post("/api/generate/repurpose/stream", json={
+        "content_id": content_id, "platforms": ["linkedin", "twitter"], "tone": "casual", "use_cache": False
+    })
+    events = sse_events(response)
+
+    assert [data["platform"] for kind, data in events if kind == "result"] == ["linkedin"]
+    assert [data["platform"] for kind, data in events if kind == "error"] == ["twitter"]
+    assert events[-1] == ("done", {"content_id": content_id})
+    assert generations_used(api) == used + 1
+
+
+def test_failed_save_releases_the_reservation(api, monkeypatch):
+    content_id = upload(api)
+    used = generations_used(api)
+
+    async def insert_generations(db, rows):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(generate, "insert_generations", insert_generations)
+    with pytest.raises(RuntimeError):
+        api.post("/api/generate/repurpose", json={
+            "content_id": content_id, "platforms": ["linkedin", "twitter"], "tone": "casual", "use_cache": False
+        })
+
+    assert generations_used(api) == used
+
+
+def test_full_job_queue_answers_503_and_releases_the_reservation(api, monkeypatch):
+    content_id = upload(api)
+    used = generations_used(api)
+
+    def submit(job):
+        raise JobQueueFull("Too many queued jobs, try again later")
+
+    monkeypatch.setattr(generate.job_queue, "submit", submit)
+    response = api.post("/api/generate/jobs", json={
+        "content_id": content_id, "platforms": ["linkedin", "twitter"], "tone": "casual"
+    })
+
+    assert response.status_code == 503
+    assert generations_used(api) == used
+
+
+def test_failed_regeneration_keeps_the_output_and_is_not_counted(api):
+    content_id = upload(api)
+    generation = api.post("/api/generate/repurpose", json={
+        "content_id": content_id, "platforms": ["linkedin"], "tone": "casual", "use_cache": False
+    }).json()["generations"][0]
+    used = generations_used(api)
+
+    generate.ai_service.client.fail = True
+    response = api.post(
+        f"/api/generate/regenerate/{generation['id']}",
+        json={"generation_id": generation["id"], "tone": "formal"}
+    )
+
+    assert response.status_code == 502
+    assert "model unavailable" in response.json()["detail"]
+    stored = api.get(f"/api/generate/{generation['id']}").json()
+    assert stored["output"] == generation["output"] and stored["tone"] == "casual"
+    assert generations_used(api) == used
+
+
+def stream_for_platform(original_content, platform, tone, brand_voice=None, use_cache=True, usage=None):
+    """Finishes LinkedIn at once; other platforms write one token and then stall"""
+    async def stream():
+        usage.add(100, 10)
+        if platform == "linkedin":
+            yield "result", {"post": "Done"}
+            return
+        yield "token", "Hel"
+        await asyncio.Event().wait()
+    return stream()
+
+
+@pytest.mark.parametrize("events_read, completed", [(0, 0), (3, 1)])
+def test_cancelled_stream_settles_the_reservation(user, run, monkeypatch, events_read, completed):
+    meter = UsageMeter({"free": PlanQuota(10, 0)})
+    monkeypatch.setattr(generate, "usage_meter", meter)
+    monkeypatch.setattr(generate.ai_service, "stream_for_platform", stream_for_platform)
+
+    async def save_generation(*args):
+        return 1
+
+    monkeypatch.setattr(generate, "_save_generation", save_generation)
+    request = GenerationCreate(content_id=1, platforms=["linkedin", "twitter", "instagram"], tone="casual")
+
+    async def disconnect_after_events():
+        reservation = await meter.reserve(user.id, "free", 3)
+        events, producer = generate._start_generations(
+            reservation, content_id=1, original_content="Text", request=request
+        )
+        for _ in range(events_read):
+            await events.get()
+        # What the response's background task does once the client is gone
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        return await meter.usage(user.id)
+
+    used = run(disconnect_after_events())
+    assert used.generations == completed
+    assert used.total_tokens == 110 * (3 if events_read else 0)
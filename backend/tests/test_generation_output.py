@@ -0,0 +1,53 @@
+from database import SessionLocal
+from migrate_generation_output import legacy_output, migrate
+from models import Content, Generation
+from utils import render_output
+
+OUTPUT = {
+    "tweets": [{"text": "First tweet"}, "Second tweet"],
+    "hashtags": ["#a", "#b"],
+    "best_times": ["9am"],
+}
+
+
+def test_render_output_shows_the_platforms_fields_in_order():
+    assert render_output("twitter", OUTPUT) == "First tweet\n\nSecond tweet\n\n#a #b"
+    assert render_output("email", {"body": "Hi", "subject_lines": [{"text": "News"}, "More"]}) == (
+        "Subject: News\nSubject: More\n\nHi"
+    )
+    # Unparsable model text, and shapes the platform's fields don't match
+    assert render_output("linkedin", {"content": " raw text ", "platform": "linkedin"}) == "raw text"
+    assert render_output("myspace", {"intro": "Hello", "points": ["one", "two"]}) == "Hello\n\n- one\n- two"
+    assert render_output("twitter", None) == ""
+
+
+def test_legacy_output_prefers_metadata_then_the_repr():
+    assert legacy_output("twitter", "ignored", OUTPUT) == OUTPUT
+    assert legacy_output("twitter", repr(OUTPUT), None) == OUTPUT
+    assert legacy_output("twitter", "Plain old text", {}) == {"content": "Plain old text", "platform": "twitter"}
+
+
+def test_migration_moves_legacy_rows_to_output(user):
+    with SessionLocal() as db:
+        content = Content(user_id=user.id, title="t", original_content="x", content_type="text")
+        db.add(content)
+        db.flush()
+        legacy = [
+            Generation(content_id=content.id, user_id=user.id, platform="twitter", tone="casual",
+                       legacy_text=repr(OUTPUT)),
+            Generation(content_id=content.id, user_id=user.id, platform="linkedin", tone="casual",
+                       legacy_text="Plain old text"),
+        ]
+        db.add_all(legacy)
+        db.commit()
+        ids = [generation.id for generation in legacy]
+        assert legacy[1].generated_text == "Plain old text"
+
+    assert migrate(batch_size=1, pause=0) >= 2
+    assert migrate(batch_size=1, pause=0) == 0
+
+    with SessionLocal() as db:
+        twitter, linkedin = (db.get(Generation, generation_id) for generation_id in ids)
+        assert twitter.output == OUTPUT and twitter.legacy_text == "" and twitter.platform_metadata is None
+        assert twitter.generated_text == render_output("twitter", OUTPUT)
+        assert linkedin.output == {"content": "Plain old text", "platform": "linkedin"}
@@ -0,0 +1,55 @@
+from sqlalchemy import event, select
+
+from database import SessionLocal, async_engine
+from models import Content
+from services.ingest_service import BulkIngestor, IngestItem
+
+
+def ingest(run, user_id, items, batch_size=100):
+    ingestor = BulkIngestor(url_fetcher=None, document_extractor=None, batch_size=batch_size)
+
+    async def collect():
+        return [result async for result in ingestor.run(user_id, items)]
+    return run(collect())
+
+
+def test_batch_ids_match_their_items_with_one_insert(user, run):
+    texts = [f"Item number {i} talks about topic {i * 7}" for i in range(20)]
+    # Identical titles and word counts, so only the match key tells rows apart
+    items = [IngestItem(i, "text", text, title="Same title") for i, text in enumerate(texts)]
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO CONTENT "):
+            inserts.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_inserts)
+    try:
+        results = ingest(run, user.id, items)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_inserts)
+
+    created = {result["index"]: result["content_id"] for result in results if result["type"] == "item"}
+    assert results[-1] == {"type": "summary", "total": 20, "created": 20, "duplicates": 0, "failed": 0}
+    assert len(inserts) == 1
+
+    with SessionLocal() as db:
+        stored = dict(db.execute(
+            select(Content.id, Content.original_content).where(Content.user_id == user.id)
+        ).all())
+    assert {index: stored[content_id] for index, content_id in created.items()} == dict(enumerate(texts))
+
+
+def test_failed_items_are_reported_alongside_created_ones(user, run):
+    items = [
+        IngestItem(0, "text", "Some text to keep"),
+        IngestItem(1, "text", None, error="content_type must be text or url"),
+        IngestItem(2, "text", "   "),
+    ]
+    results = ingest(run, user.id, items, batch_size=1)
+
+    by_index = {result["index"]: result for result in results if result["type"] == "item"}
+    assert by_index[0]["status"] == "created"
+    assert by_index[1] == {"type": "item", "index": 1, "status": "failed", "error": "content_type must be text or url"}
+    assert by_index[2]["error"] == "No text could be extracted"
+    assert results[-1]["failed"] == 2
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Content
+from services import job_service
+from services.job_service import Job, JobQueue, JobQueueFull, insert_generations
+from services.usage_service import Reservation
+
+
+def test_inserted_generations_come_back_in_row_order_with_one_insert(user, run):
+    with SessionLocal() as db:
+        contents = [
+            Content(user_id=user.id, title=str(i), original_content="x", content_type="text")
+            for i in range(2)
+        ]
+        db.add_all(contents)
+        db.commit()
+        first, second = (content.id for content in contents)
+
+    # Interleaved so neither content ids nor platforms are in insertion order
+    pairs = [(second, "twitter"), (first, "linkedin"), (first, "twitter"), (second, "email"), (first, "email")]
+    rows = [
+        {
+            "content_id": content_id,
+            "user_id": user.id,
+            "platform": platform,
+            "output": {"post": f"{content_id}-{platform}"},
+            "tone": "casual",
+        }
+        for content_id, platform in pairs
+    ]
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO GENERATIONS "):
+            inserts.append(statement)
+
+    async def insert():
+        async with AsyncSessionLocal() as db:
+            generations = await insert_generations(db, rows)
+            await db.commit()
+            return [(g.id, g.content_id, g.platform, g.output, g.created_at) for g in generations]
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_inserts)
+    try:
+        generations = run(insert())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_inserts)
+
+    assert len(inserts) == 1
+    assert [(content_id, platform) for _, content_id, platform, _, _ in generations] == pairs
+    assert [output for _, _, _, output, _ in generations] == [row["output"] for row in rows]
+    assert all(generation_id and created_at for generation_id, _, _, _, created_at in generations)
+    assert run(insert_generations(None, [])) == []
+
+
+class StalledAIService:
+    """Generation that never finishes, so jobs stay running"""
+
+    async def generate_for_platform(self, *args, **kwargs):
+        await asyncio.Event().wait()
+
+
+class RecordingMeter:
+    def __init__(self):
+        self.settled = []
+
+    def settle(self, reservation, reserved, completed, usages):
+        self.settled.append((reservation, reserved, completed))
+
+
+def test_full_queue_refuses_jobs_and_jobs_are_private(monkeypatch):
+    meter = RecordingMeter()
+    monkeypatch.setattr(job_service, "usage_meter", meter)
+    queue = JobQueue(StalledAIService(), workers=1, max_size=1)
+    with pytest.raises(JobQueueFull):
+        queue.submit(Job(1, {1: "text"}, ["linkedin"], "casual"))
+
+    async def main():
+        await queue.start()
+        try:
+            running = queue.submit(Job(1, {1: "text"}, ["linkedin"], "casual"))
+            await asyncio.sleep(0.01)
+            queued = Job(1, {2: "text"}, ["linkedin", "twitter"], "casual")
+            queued.reservation = Reservation(1, datetime(2026, 1, 1))
+            queue.submit(queued)
+            assert queued.status == "queued"
+            with pytest.raises(JobQueueFull):
+                queue.submit(Job(1, {3: "text"}, ["linkedin"], "casual"))
+            return running, queued
+        finally:
+            await queue.stop()
+
+    running, queued = asyncio.run(main())
+    assert running.status == "running"
+    # Abandoned on shutdown: failed, with its generations given back
+    assert queued.status == "failed" and queued.finished_at is not None
+    assert {task.status for task in queued.tasks} == {"failed"}
+    assert meter.settled == [(queued.reservation, 2, 0)]
+    assert queue.get(running.id, 1) is running
+    assert queue.get(running.id, 2) is None
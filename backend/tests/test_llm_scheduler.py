@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+from groq import APIConnectionError
+
+from services.llm_scheduler import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, LLMScheduler, TokenBucket, estimate_request_tokens
+)
+from services.token_service import estimate_tokens
+
+
+def test_request_estimate_is_prompt_estimate_plus_completion_budget():
+    messages = [
+        {"role": "system", "content": "You are helpful."},
+        {"role": "user", "content": "Summarize this article " * 40},
+        {"role": "assistant", "content": None},
+    ]
+    prompt = sum(estimate_tokens(message["content"]) for message in messages[:2])
+    assert estimate_request_tokens(messages, 500) == prompt + 500
+    assert estimate_request_tokens([], 0) == 0
+
+
+def test_token_bucket_refund_never_exceeds_capacity():
+    bucket = TokenBucket(600)
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(500) > 0
+    bucket.refund(10_000)
+    assert bucket.level == 600
+
+
+def test_waiting_interactive_calls_get_slots_before_batch_calls():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def call(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with scheduler.slot():
+            waiters = [
+                asyncio.create_task(call("batch 1", PRIORITY_BATCH)),
+                asyncio.create_task(call("batch 2", PRIORITY_BATCH)),
+                asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)),
+            ]
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert order == ["interactive", "batch 1", "batch 2"]
+    assert scheduler.active == 0
+
+
+def test_cancelled_waiter_does_not_keep_its_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def main():
+        async with scheduler.slot():
+            waiter = asyncio.create_task(scheduler._acquire(PRIORITY_INTERACTIVE))
+            await asyncio.sleep(0)
+        # The slot was handed to the waiter, which is cancelled before it runs
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(main())
+    assert scheduler.active == 0 and not scheduler._waiters
+
+
+def test_connection_errors_are_retried():
+    scheduler = LLMScheduler(max_retries=2, base_delay=0.001)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise APIConnectionError(request=httpx.Request("POST", "https://api.example.com"))
+        return "ok"
+
+    assert asyncio.run(scheduler.run(request, 10)) == "ok"
+    assert scheduler.retries == 2
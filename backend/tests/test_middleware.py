@@ -0,0 +1,77 @@
+import asyncio
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from middleware import BodySizeLimitMiddleware
+
+LIMIT = 64 * 1024
+
+
+def make_client():
+    app = FastAPI()
+    handled = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        data = await file.read()
+        handled.append(len(data))
+        return {"size": len(data)}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(BodySizeLimitMiddleware, limits={"/upload": LIMIT})
+    return TestClient(app), handled
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    client, handled = make_client()
+    app = client.app
+    chunk = b"x" * 8192
+    pulled = []
+    sent = []
+
+    preamble = (
+        b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+    )
+
+    async def receive():
+        # A file part that never ends, sent without Content-Length
+        body = chunk if pulled else preamble
+        pulled.append(len(body))
+        return {"type": "http.request", "body": body, "more_body": True}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/upload",
+        "raw_path": b"/upload",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=b")],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]["status"] == 413
+    assert handled == []
+    # Reading stopped at the limit instead of draining the endless body
+    assert LIMIT < sum(pulled) <= LIMIT + len(chunk)
+
+
+def test_uploads_under_the_limit_and_other_paths_pass():
+    client, handled = make_client()
+
+    assert client.post("/upload", files={"file": ("a.txt", b"x" * 1000)}).json() == {"size": 1000}
+    assert client.post("/other", files={"file": ("a.txt", b"x" * (LIMIT * 2))}).json() == {"size": LIMIT * 2}
+    assert handled == [1000]
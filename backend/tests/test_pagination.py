@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Content
+from services.pagination import (
+    InvalidCursorError, decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor,
+    keyset_page, next_cursor
+)
+
+
+def test_cursors_round_trip():
+    created_at = datetime(2026, 3, 4, 5, 6, 7, 890123)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+    assert decode_rank_cursor(encode_rank_cursor(0.125, 7)) == (0.125, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_rank_cursor(0.5, 1), "W10"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once_including_ties(user):
+    tied = datetime(2026, 1, 1, 12)
+    with SessionLocal() as db:
+        contents = [
+            Content(user_id=user.id, title=str(i), original_content="x", content_type="text",
+                    created_at=tied if i % 2 else datetime(2026, 1, 1, i))
+            for i in range(7)
+        ]
+        db.add_all(contents)
+        db.commit()
+        expected = [
+            content.id for content in
+            sorted(contents, key=lambda content: (content.created_at, content.id), reverse=True)
+        ]
+
+        query = select(Content.id, Content.created_at).where(Content.user_id == user.id)
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows = db.execute(keyset_page(query, Content.created_at, Content.id, cursor, 2)).all()
+            rows, cursor = next_cursor(rows, 2)
+            seen += [row.id for row in rows]
+            pages += 1
+            if cursor is None:
+                break
+
+    assert seen == expected
+    assert pages == 4
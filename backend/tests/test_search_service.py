@@ -0,0 +1,113 @@
+import os
+import uuid
+from typing import NamedTuple
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from api.content import CONTENT_SUMMARY_COLUMNS
+from database import AsyncSessionLocal, Base, SessionLocal, to_async_url
+from migrations import upgrade
+from models import Content, User
+from services.pagination import InvalidCursorError
+from services.search_service import PostgresSearchBackend, SearchService, search_service
+
+TEXTS = [
+    "Composting at home: compost bins, compost heaps and why compost needs air.",
+    "A short note that mentions compost once among many other garden topics.",
+    "Nothing relevant here, just notes about bicycles and their maintenance.",
+]
+
+# The suite runs on DATABASE_URL (SQLite by default); set this to also run
+# these tests against Postgres' tsvector backend
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+class SearchDatabase(NamedTuple):
+    sessions: sessionmaker
+    async_sessions: async_sessionmaker
+    service: SearchService
+
+
+@pytest.fixture(scope="module", params=["configured", "postgresql"])
+def search_db(request, database):
+    if request.param == "configured":
+        yield SearchDatabase(SessionLocal, AsyncSessionLocal, search_service)
+        return
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+
+    engine = create_engine(POSTGRES_URL)
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        upgrade(connection)
+    backend = PostgresSearchBackend()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        backend.create_schema(connection)
+    # Not pooled: every test runs on its own event loop
+    async_engine = create_async_engine(to_async_url(POSTGRES_URL), poolclass=NullPool)
+    yield SearchDatabase(
+        sessionmaker(bind=engine),
+        async_sessionmaker(async_engine, expire_on_commit=False),
+        SearchService(backend)
+    )
+    engine.dispose()
+
+
+@pytest.fixture
+def contents(search_db):
+    """A user and their contents, in the database under test"""
+    name = uuid.uuid4().hex[:12]
+    with search_db.sessions() as db:
+        user = User(email=f"{name}@example.com", username=name, password_hash="x")
+        db.add(user)
+        db.flush()
+        rows = [
+            Content(user_id=user.id, title=f"Article {i}", original_content=text, content_type="text")
+            for i, text in enumerate(TEXTS)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return user.id, [row.id for row in rows]
+
+
+def search(search_db, run, user_id, text, cursor=None, limit=10):
+    async def main():
+        async with search_db.async_sessions() as db:
+            return await search_db.service.search(
+                db, Content, Content.original_content, CONTENT_SUMMARY_COLUMNS,
+                [Content.user_id == user_id], text, cursor, limit
+            )
+    return run(main())
+
+
+def test_matches_are_ranked_and_limited_to_the_user(search_db, contents, run):
+    user_id, ids = contents
+    results, cursor = search(search_db, run, user_id, "composting")
+
+    assert [result["id"] for result in results] == ids[:2]
+    assert results[0]["score"] > results[1]["score"]
+    assert "compost" in results[0]["snippet"].lower()
+    assert cursor is None
+    assert search(search_db, run, user_id + 10 ** 6, "compost") == ([], None)
+
+
+def test_pages_follow_the_rank_cursor(search_db, contents, run):
+    user_id, ids = contents
+    first, cursor = search(search_db, run, user_id, "compost", limit=1)
+    second, last = search(search_db, run, user_id, "compost", cursor=cursor, limit=1)
+
+    assert [result["id"] for result in first + second] == ids[:2]
+    assert last is None
+
+
+def test_queries_without_terms_and_bad_cursors(search_db, contents, run):
+    user_id, ids = contents
+    assert search(search_db, run, user_id, "&& ** !!") == ([], None)
+    # Search syntax in the query is treated as plain words
+    assert [result["id"] for result in search(search_db, run, user_id, 'bicycles: "maintenance*')[0]] == [ids[2]]
+    with pytest.raises(InvalidCursorError):
+        search(search_db, run, user_id, "compost", cursor="nonsense")
@@ -0,0 +1,65 @@
+import pytest
+
+from services import token_service
+from services.token_service import (
+    MAX_OUTPUT_TOKENS, MIN_OUTPUT_TOKENS, TokenCounter, TokenUsage, count_tokens, max_output_tokens,
+    truncate_to_tokens
+)
+
+TEXT = " ".join(f"Sentence number {i} says something about the topic." for i in range(200))
+
+
+def test_output_budgets_follow_platform_limits():
+    budgets = {platform: max_output_tokens(platform) for platform in ["twitter", "linkedin", "email", "tiktok"]}
+    assert all(MIN_OUTPUT_TOKENS <= budget <= MAX_OUTPUT_TOKENS for budget in budgets.values())
+    # A thread of tweets needs more room than one LinkedIn post
+    assert budgets["twitter"] > budgets["linkedin"]
+    assert max_output_tokens("not-a-platform") == MAX_OUTPUT_TOKENS
+
+
+def test_truncation_fits_the_budget_at_a_sentence_end():
+    truncated = truncate_to_tokens(TEXT, 300)
+
+    assert count_tokens(truncated) <= 300
+    assert count_tokens(truncated) > 240
+    assert TEXT.startswith(truncated) and truncated.endswith(".")
+    assert truncate_to_tokens(TEXT, 300) == truncated
+    assert truncate_to_tokens("Short.", 300) == "Short."
+
+
+def test_token_counter_is_bounded_and_memoizes():
+    counter = TokenCounter(max_entries=2)
+    counts = [counter.count(text) for text in ["one two", "three four five", "six"]]
+
+    assert counts == [count_tokens(text) for text in ["one two", "three four five", "six"]]
+    assert len(counter._counts) == 2
+    assert counter.count("") == 0
+
+
+def test_token_counter_keys_on_the_text_not_its_hash(monkeypatch):
+    # Force every text to the same hash; counts must still not be shared
+    monkeypatch.setattr("builtins.hash", lambda value: 0)
+    counter = TokenCounter()
+    assert counter.count("aaaa") == count_tokens("aaaa")
+    assert counter.count("a b c d e f") != counter.count("aaaaaaaaaaa")
+
+
+def test_usage_share_covers_the_whole_call():
+    share = TokenUsage(301, 31).share(3)
+    assert (share.prompt_tokens, share.completion_tokens) == (101, 11)
+    assert TokenUsage(10, 0).share(0).prompt_tokens == 10
+
+
+def test_counts_and_truncation_use_the_tokenizer(monkeypatch):
+    tiktoken = pytest.importorskip("tiktoken")
+    # One token per byte, so exact counts are easy to check without a download
+    encoding = tiktoken.Encoding(
+        name="bytes", pat_str=r".+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+    )
+    monkeypatch.setattr(token_service, "_encoding", lambda: encoding)
+    monkeypatch.setattr(token_service, "token_counter", TokenCounter())
+
+    assert token_service.load_tokenizer()
+    assert token_service.count_tokens("Hello, world") == 12
+    truncated = truncate_to_tokens(TEXT, 300)
+    assert len(truncated.encode()) <= 300 and truncated.endswith(".")
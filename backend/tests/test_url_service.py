@@ -0,0 +1,154 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.url_service import (
+    ResponseTooLargeError, UrlCache, UrlFetcher, normalize_url, parse_cache_control, shared_max_age
+)
+
+URL = "https://example.com/article"
+PAGE = "<html><body><p>Hello from the origin</p></body></html>"
+
+
+def fetcher_for(handler, freshness=300):
+    fetcher = UrlFetcher(parser="html.parser", cache=UrlCache(freshness=freshness))
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher
+
+
+def run(fetcher, times=1):
+    async def go():
+        try:
+            return [await fetcher.extract(URL) for _ in range(times)]
+        finally:
+            await fetcher.close()
+    return asyncio.run(go())
+
+
+def test_cache_control_parsing():
+    directives = parse_cache_control('Public, Max-Age=60, s-maxage="30", no-transform')
+    assert directives == {"public": None, "max-age": "60", "s-maxage": "30", "no-transform": None}
+    assert shared_max_age(directives) == 30
+    assert shared_max_age(parse_cache_control("max-age=60")) == 60
+    assert shared_max_age(parse_cache_control("max-age=60, no-cache")) == 0
+    assert shared_max_age(parse_cache_control("max-age=soon")) == 0
+    assert shared_max_age(parse_cache_control("public")) is None
+
+
+def test_unconditional_304_is_an_error():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(304)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(fetcher_for(handler))
+    assert "if-none-match" not in requests[0].headers
+
+
+def test_revalidates_with_etag_once_max_age_expires():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"cache-control": "max-age=0"})
+        return httpx.Response(200, text=PAGE, headers={"etag": '"v1"', "cache-control": "max-age=0"})
+
+    fetcher = fetcher_for(handler)
+    texts = run(fetcher, times=2)
+
+    assert texts[0] == texts[1] and "Hello from the origin" in texts[0]
+    assert len(requests) == 2
+    assert requests[1].headers["if-none-match"] == '"v1"'
+    assert fetcher.cache.revalidated == 1
+
+
+def test_fresh_entries_are_served_without_a_request():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text=PAGE, headers={"cache-control": "max-age=60"})
+
+    fetcher = fetcher_for(handler)
+    run(fetcher, times=3)
+
+    assert len(requests) == 1
+    assert fetcher.cache.hits == 2
+
+
+@pytest.mark.parametrize("cache_control", ["private, max-age=60", "no-store"])
+def test_private_and_no_store_responses_are_not_shared(cache_control):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text=PAGE, headers={"etag": '"v1"', "cache-control": cache_control})
+
+    fetcher = fetcher_for(handler)
+    run(fetcher, times=2)
+
+    assert len(requests) == 2
+    assert all("if-none-match" not in request.headers for request in requests)
+    assert fetcher.cache.stats()["entries"] == 0
+
+
+def test_urls_are_normalized_for_cache_keys():
+    assert normalize_url("HTTPS://Example.COM:443/a?b=2&a=1#top") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+@pytest.mark.parametrize("declare_length", [True, False])
+def test_oversized_pages_are_cut_off(declare_length):
+    async def body():
+        for _ in range(4):
+            yield b"x" * 400
+
+    def handler(request):
+        if declare_length:
+            return httpx.Response(200, content=b"x" * 1600)
+        return httpx.Response(200, content=body())
+
+    fetcher = fetcher_for(handler)
+    fetcher.max_bytes = 1000
+    with pytest.raises(ResponseTooLargeError):
+        run(fetcher)
+
+
+def test_body_is_decoded_with_the_declared_charset():
+    def handler(request):
+        return httpx.Response(
+            200, content="<p>Café crème</p>".encode("latin-1"),
+            headers={"content-type": "text/html; charset=iso-8859-1"}
+        )
+
+    assert run(fetcher_for(handler)) == ["Café crème"]
+
+
+def test_pages_are_fetched_concurrently_over_one_client():
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(request)
+        return httpx.Response(200, text=f"<p>{request.url.path}</p>")
+
+    fetcher = fetcher_for(handler)
+
+    async def go():
+        client = fetcher._get_client()
+        try:
+            texts = await asyncio.gather(*(fetcher.extract(f"https://example.com/{i}") for i in range(5)))
+            return texts, fetcher._get_client() is client
+        finally:
+            await fetcher.close()
+
+    texts, same_client = asyncio.run(go())
+    assert texts == [f"/{i}" for i in range(5)]
+    assert same_client and max(peak) == 5
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+
+from schemas import UserUpdate
+from services.token_service import TokenUsage
+from services.usage_service import PlanQuota, QuotaExceeded, UsageMeter, UsageTotals, parse_plan_quotas
+
+QUOTAS = {"free": PlanQuota(2, 0), "pro": PlanQuota(0, 0)}
+
+
+def test_parse_plan_quotas():
+    assert parse_plan_quotas(" free:100:300000, pro:0:0 ,") == {
+        "free": PlanQuota(100, 300000),
+        "pro": PlanQuota(0, 0),
+    }
+    assert parse_plan_quotas("") == {}
+    with pytest.raises(ValueError):
+        parse_plan_quotas("free:100")
+
+
+def test_unknown_plans_get_the_default_plans_quota():
+    meter = UsageMeter(QUOTAS)
+    assert meter.quota("pro") == PlanQuota(0, 0)
+    assert meter.quota("enterprise-trial") == meter.quota("free") == PlanQuota(2, 0)
+    assert UsageMeter({}).quota("anything") == PlanQuota(0, 0)
+
+
+def test_unknown_plan_cannot_exceed_the_default_quota(user, run):
+    meter = UsageMeter(QUOTAS)
+
+    async def reserve_three():
+        await meter.reserve(user.id, "made-up", 2)
+        await meter.reserve(user.id, "made-up", 1)
+
+    with pytest.raises(QuotaExceeded):
+        run(reserve_three())
+
+
+def test_profile_update_cannot_change_the_plan():
+    assert UserUpdate(username="new", plan="pro").model_dump() == {"username": "new"}
+
+
+def test_settling_after_the_window_ends_counts_in_the_reserved_window(user, run):
+    meter = UsageMeter(QUOTAS)
+    windows = [datetime(2026, 1, 1), datetime(2026, 1, 2)]
+    meter.window_start = lambda now=None: windows[0]
+
+    async def reserve_then_settle_next_window():
+        reservation = await meter.reserve(user.id, "free", 2)
+        windows.pop(0)
+        meter.settle(reservation, 2, 1, [TokenUsage(prompt_tokens=30, completion_tokens=5)])
+        await meter.flush()
+        return await meter.usage(user.id, reservation.window_start), await meter.usage(user.id)
+
+    reserved_window, next_window = run(reserve_then_settle_next_window())
+    assert reserved_window == UsageTotals(1, 30, 5)
+    assert next_window == UsageTotals()
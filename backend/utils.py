@@ -171,6 +171,51 @@ def create_platform_guidelines():
     }
 
 
+# Output fields shown, in order, when a generation is rendered as text;
+# the rest (engagement tips, timings, ...) stay in the JSON only
+RENDERED_FIELDS = {
+    "twitter": ["tweets", "hashtags"],
+    "linkedin": ["post", "cta", "hashtags"],
+    "instagram": ["caption", "cta", "hashtags", "carousel_script"],
+    "facebook": ["post", "cta", "hashtags"],
+    "tiktok": ["hook", "script", "cta", "hashtags"],
+    "email": ["subject_lines", "preview_text", "body", "cta", "ps"],
+    "summary": ["tldr", "executive_summary", "summary", "key_takeaways", "action_items"],
+}
+
+
+def _render_value(field: str, value) -> str:
+    if isinstance(value, str):
+        return value.strip()
+    if not isinstance(value, list):
+        return ""
+    if field == "hashtags":
+        return " ".join(str(tag) for tag in value)
+    if field == "tweets":
+        return "\n\n".join(
+            tweet.get("text", "") if isinstance(tweet, dict) else str(tweet) for tweet in value
+        )
+    if field == "subject_lines":
+        lines = [line.get("text", "") if isinstance(line, dict) else str(line) for line in value]
+        return "\n".join(f"Subject: {line}" for line in lines)
+    return "\n".join(f"- {item}" for item in value if isinstance(item, (str, int, float)))
+
+
+def render_output(platform: str, output: dict) -> str:
+    """Plain-text rendering of a platform's generated JSON output"""
+    if not isinstance(output, dict):
+        return "" if output is None else str(output)
+    fields = RENDERED_FIELDS.get(platform)
+    if "content" in output:
+        # Model text that could not be parsed as JSON
+        fields = ["content"]
+    elif fields is None or fields[0] not in output:
+        # Unknown platform or unexpected shape: every top-level field
+        fields = list(output)
+    parts = (_render_value(field, output[field]) for field in fields if field in output)
+    return "\n\n".join(part for part in parts if part)
+
+
 # Setup instructions for developers
 SETUP_INSTRUCTIONS = """
 AI Content Repurposing Tool - Setup Instructions
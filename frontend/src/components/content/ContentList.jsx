@@ -5,7 +5,9 @@ import toast from 'react-hot-toast'
 
 export default function ContentList() {
   const [contents, setContents] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   
   useEffect(() => {
     fetchContents()
@@ -15,6 +17,7 @@ export default function ContentList() {
     try {
       const response = await contentService.listContent()
       setContents(response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
     } catch (error) {
       toast.error('Failed to load content')
     } finally {
@@ -22,6 +25,19 @@ export default function ContentList() {
     }
   }
   
+  const loadMore = async () => {
+    setLoadingMore(true)
+    try {
+      const response = await contentService.listContent(20, nextCursor)
+      setContents((prev) => [...prev, ...response.data])
+      setNextCursor(response.headers['x-next-cursor'] || null)
+    } catch (error) {
+      toast.error('Failed to load content')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+  
   const handleDelete = async (contentId) => {
     if (!window.confirm('Are you sure?')) return
     
@@ -62,7 +78,7 @@ export default function ContentList() {
                       {new Date(content.created_at).toLocaleDateString()}
                     </p>
                     <p className="text-sm text-gray-700 mt-2 line-clamp-2">
-                      {content.original_content}
+                      {content.excerpt}
                     </p>
                   </div>
                   <button
@@ -74,6 +90,16 @@ export default function ContentList() {
                 </div>
               </div>
             ))}
+            
+            {nextCursor && (
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="w-full py-2 px-4 border border-blue-600 text-blue-600 rounded-lg hover:bg-blue-50 transition font-medium disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            )}
           </div>
         )}
       </div>
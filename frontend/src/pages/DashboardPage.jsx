@@ -18,8 +18,8 @@ export default function DashboardPage() {
 
   const fetchDashboard = async () => {
     try {
-      const contentRes = await contentService.listContent(0, 5)
-      const historyRes = await contentService.getGenerationHistory(0, 5)
+      const contentRes = await contentService.listContent(5)
+      const historyRes = await contentService.getGenerationHistory(5)
 
       setStats({
         contentCount: contentRes.data.length,
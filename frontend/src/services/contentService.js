@@ -17,8 +17,10 @@ export const contentService = {
     })
   },
 
-  listContent: (skip = 0, limit = 20) =>
-    apiClient.get('/api/content/', { params: { skip, limit } }),
+  // Pages are newest first; pass the X-Next-Cursor header of a response as
+  // cursor to get the next page
+  listContent: (limit = 20, cursor = null) =>
+    apiClient.get('/api/content/', { params: { limit, cursor } }),
 
   getContent: (contentId) =>
     apiClient.get(`/api/content/${contentId}`),
@@ -34,8 +36,8 @@ export const contentService = {
       brand_voice_id: brandVoiceId,
     }),
 
-  getGenerationHistory: (skip = 0, limit = 50) =>
-    apiClient.get('/api/generate/history', { params: { skip, limit } }),
+  getGenerationHistory: (limit = 50, cursor = null) =>
+    apiClient.get('/api/generate/history', { params: { limit, cursor } }),
 
   regenerateContent: (generationId, tone) =>
     apiClient.post(`/api/generate/regenerate/${generationId}`, { tone }),